@@ -0,0 +1,59 @@
+"""photo files
+
+Revision ID: 109f0b7d3429
+Revises: 0a32093e0454
+Create Date: 2026-10-18 07:12:33.669186
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '109f0b7d3429'
+down_revision: Union[str, Sequence[str], None] = '0a32093e0454'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # новые строки без статуса сразу идут в очередь; старые переводит
+    # src.scripts.backfill_photo_status пачками - не одним UPDATE всей таблицы
+    op.alter_column('photos', 'status', server_default='pending')
+
+    # photos пишется ботом: индексы строим без блокировки записи.
+    # Прерванный CONCURRENTLY оставляет INVALID-индекс - удаляем его заранее
+    with op.get_context().autocommit_block():
+        for name in ('ix_photos_local_path', 'ix_photos_pending'):
+            op.drop_index(
+                name, table_name='photos', postgresql_concurrently=True, if_exists=True
+            )
+        op.create_index(
+            'ix_photos_local_path',
+            'photos',
+            ['local_path'],
+            unique=False,
+            postgresql_where=sa.text('local_path IS NOT NULL'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_photos_pending',
+            'photos',
+            ['id'],
+            unique=False,
+            postgresql_where=sa.text("status = 'pending'"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in ('ix_photos_pending', 'ix_photos_local_path'):
+            op.drop_index(
+                name, table_name='photos', postgresql_concurrently=True, if_exists=True
+            )
+    op.alter_column('photos', 'status', server_default=None)
@@ -0,0 +1,78 @@
+"""unique blacklist
+
+Revision ID: 74d2b54e395e
+Revises: 9e8e72c871b6
+Create Date: 2026-10-18 06:53:11.105872
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '74d2b54e395e'
+down_revision: Union[str, Sequence[str], None] = '9e8e72c871b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # дубликаты копились, пока на blacklist не было уникальности
+    op.execute(
+        """
+        DELETE FROM blacklist b
+        USING blacklist d
+        WHERE b.tg_user_id = d.tg_user_id
+          AND b.vk_profile_id = d.vk_profile_id
+          AND b.id > d.id
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        # прерванный CREATE INDEX CONCURRENTLY оставляет INVALID-индекс,
+        # который IF NOT EXISTS принял бы за готовый - удаляем его заранее
+        op.drop_index(
+            'uq_blacklist_tg_user_id_vk_profile_id',
+            table_name='blacklist',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.create_index(
+            'uq_blacklist_tg_user_id_vk_profile_id',
+            'blacklist',
+            ['tg_user_id', 'vk_profile_id'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_blacklist_tg_user_id_vk_profile_id',
+            table_name='blacklist',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_blacklist_tg_user_id_vk_profile_id',
+            table_name='blacklist',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.create_index(
+            'ix_blacklist_tg_user_id_vk_profile_id',
+            'blacklist',
+            ['tg_user_id', 'vk_profile_id'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'uq_blacklist_tg_user_id_vk_profile_id',
+            table_name='blacklist',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,48 @@
+"""queue position index
+
+Revision ID: 7af39f8f2089
+Revises: 620c17140cdd
+Create Date: 2026-10-18 06:46:31.626416
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7af39f8f2089'
+down_revision: Union[str, Sequence[str], None] = '620c17140cdd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # queue - самая большая таблица: строим без блокировки записи.
+    # Прерванный CONCURRENTLY оставляет INVALID-индекс - удаляем его заранее
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_queue_tg_user_id_position',
+            table_name='queue',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.create_index(
+            'ix_queue_tg_user_id_position',
+            'queue',
+            ['tg_user_id', 'position'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_queue_tg_user_id_position',
+            table_name='queue',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
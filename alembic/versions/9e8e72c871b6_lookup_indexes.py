@@ -0,0 +1,52 @@
+"""lookup indexes
+
+Revision ID: 9e8e72c871b6
+Revises: 7af39f8f2089
+Create Date: 2026-10-18 06:47:27.908054
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e8e72c871b6'
+down_revision: Union[str, Sequence[str], None] = '7af39f8f2089'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# CREATE INDEX CONCURRENTLY не работает внутри транзакции, поэтому
+# индексы строятся в autocommit_block - миграцию можно катить на живую БД
+INDEXES = [
+    ('ix_blacklist_tg_user_id_vk_profile_id', 'blacklist', ['tg_user_id', 'vk_profile_id']),
+    ('ix_queue_tg_user_id_vk_profile_id', 'queue', ['tg_user_id', 'vk_profile_id']),
+    ('ix_photos_vk_user_id', 'photos', ['vk_user_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,49 @@
+"""favorites keyset index
+
+Revision ID: d952d3900f32
+Revises: 70ffa2ea084d
+Create Date: 2026-10-18 07:26:20.701797
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd952d3900f32'
+down_revision: Union[str, Sequence[str], None] = '70ffa2ea084d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # favorites пишется на каждый лайк: строим без блокировки записи.
+    # Прерванный CONCURRENTLY оставляет INVALID-индекс - удаляем его заранее
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_favorites_tg_user_id_id',
+            table_name='favorites',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.create_index(
+            'ix_favorites_tg_user_id_id',
+            'favorites',
+            ['tg_user_id', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_favorites_tg_user_id_id',
+            table_name='favorites',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,76 @@
+"""
+Рендер списка избранного: N+1 (get_profile + get_photos на каждый id)
+против get_cards. Считаются запросы к БД и время.
+
+Запуск: python -m src.benchmarks.bench_batch_reads
+"""
+import asyncio
+
+from sqlalchemy import event
+
+from src.benchmarks.common import measure, print_row
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import PhotoDTO, ProfileDTO
+from src.infrastructure.db.session import SessionLocal, engine
+
+TG_USER_ID = 900_000_006
+BASE_VK = 900_006_000
+SIZES = (50, 500)
+REPEAT = 10
+
+
+async def render_n_plus_one(repo: PostgresUserRepository) -> None:
+    for vk_id in await repo.list_favorites(TG_USER_ID):
+        await repo.get_profile(vk_id)
+        await repo.get_photos(vk_id)
+
+
+async def render_batched(repo: PostgresUserRepository) -> None:
+    await repo.get_cards(await repo.list_favorites(TG_USER_ID))
+
+
+async def seed(repo: PostgresUserRepository, size: int) -> None:
+    for vk_id in await repo.list_favorites(TG_USER_ID):
+        await repo.remove_favorite(TG_USER_ID, vk_id)
+
+    async with repo.transaction():
+        for vk_id in range(BASE_VK, BASE_VK + size):
+            await repo.upsert_profile(ProfileDTO(vk_id, "Имя", "Фамилия", f"id{vk_id}"))
+            await repo.set_photos(vk_id, [
+                PhotoDTO(n, vk_id, f"https://vk.test/{vk_id}_{n}.jpg", n)
+                for n in range(3)
+            ])
+            await repo.add_favorite(TG_USER_ID, vk_id)
+
+
+async def main() -> None:
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        await repo.get_or_create_user(TG_USER_ID)
+
+        for size in SIZES:
+            await seed(repo, size)
+
+            for name, render in (
+                ("N+1", render_n_plus_one),
+                ("get_cards", render_batched),
+            ):
+                event.listen(engine.sync_engine, "before_cursor_execute", count)
+                statements = 0
+                samples = await measure(lambda: render(repo), REPEAT)
+                event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+                print_row(f"{name}, {size} favorites", samples)
+                print(f"{'':<40} round trips per render: {statements // REPEAT}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+Скорость выгрузки и загрузки src/scripts/bulk_copy на синтетическом наборе.
+
+Набор генерируется на сервере (generate_series) в базе vkt_bulk_bench_0:
+--users пользователей, у каждого очередь 60, избранное 10, чёрный список 5
+и просмотренные 10, плюс 5 профилей и 10 фото на пользователя - около 100
+строк на пользователя (100 000 -> ~10M строк). Загрузка идёт в
+vkt_bulk_bench_1: сначала в пустую базу, потом повторно поверх тех же данных.
+
+Запуск: python -m src.benchmarks.bench_bulk_copy [--users 100000 --jobs 4]
+"""
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import asyncpg
+
+from src.infrastructure.db.invalidation import asyncpg_dsn
+from src.infrastructure.db.models import Base
+from src.infrastructure.db.session import DATABASE_URL
+from src.scripts.bulk_copy import BulkReport, export, import_
+from src.scripts.init_db import create_databases
+
+_FILL = [
+    """
+    INSERT INTO users (tg_user_id, filter_city_name, filter_gender, history_cursor)
+    SELECT u, 'Москва', 1, u % 60 FROM generate_series(1, $1) u
+    """,
+    """
+    INSERT INTO queue (tg_user_id, vk_profile_id, position)
+    SELECT u, (u * 7 + p) % ($1 * 5) + 1, p
+    FROM generate_series(1, $1) u, generate_series(0, 59) p
+    """,
+    """
+    INSERT INTO favorites (tg_user_id, vk_profile_id)
+    SELECT u, (u * 11 + p) % ($1 * 5) + 1
+    FROM generate_series(1, $1) u, generate_series(0, 9) p
+    """,
+    """
+    INSERT INTO blacklist (tg_user_id, vk_profile_id)
+    SELECT u, (u * 13 + p) % ($1 * 5) + 1
+    FROM generate_series(1, $1) u, generate_series(0, 4) p
+    """,
+    """
+    INSERT INTO seen_profiles (tg_user_id, vk_profile_id)
+    SELECT u, (u * 7 + p) % ($1 * 5) + 1
+    FROM generate_series(1, $1) u, generate_series(0, 9) p
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO profiles (vk_user_id, first_name, last_name, domain)
+    SELECT v, 'Имя' || v, 'Фамилия' || v, 'id' || v FROM generate_series(1, $1 * 5) v
+    """,
+    """
+    INSERT INTO photos (vk_user_id, photo_id, owner_id, url, likes_count, status)
+    SELECT v, p, v, 'https://sun.userapi.com/' || v || '/' || p || '.jpg', p * 3, 'done'
+    FROM generate_series(1, $1 * 5) v, generate_series(1, 2) p
+    """,
+]
+
+
+async def fill(url: str, users: int) -> float:
+    conn = await asyncpg.connect(asyncpg_dsn(url))
+    try:
+        await conn.execute(f"TRUNCATE {', '.join(t.name for t in Base.metadata.sorted_tables)}")
+        started = time.perf_counter()
+        for sql in _FILL:
+            await conn.execute(sql, users)
+        await conn.execute("VACUUM ANALYZE")
+        return time.perf_counter() - started
+    finally:
+        await conn.close()
+
+
+async def truncate(url: str) -> None:
+    conn = await asyncpg.connect(asyncpg_dsn(url))
+    try:
+        await conn.execute(f"TRUNCATE {', '.join(t.name for t in Base.metadata.sorted_tables)}")
+    finally:
+        await conn.close()
+
+
+def print_report(name: str, report: BulkReport) -> None:
+    print(
+        f"{name:<28} {report.rows:>10} rows {report.bytes / 2**20:8.1f} MiB "
+        f"{report.seconds:7.2f}s {report.rows_per_second:10.0f} rows/s"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--keep", action="store_true", help="не удалять файлы выгрузки")
+    args = parser.parse_args()
+
+    source, target = await create_databases(DATABASE_URL, "vkt_bulk_bench", 2)
+    seconds = await fill(source, args.users)
+    print(f"generated {args.users} users in {seconds:.1f}s")
+
+    directory = Path(tempfile.mkdtemp(prefix="vkt_bulk_"))
+    try:
+        print_report("export jobs=1", await export(source, directory / "plain", jobs=1))
+        print_report(
+            f"export jobs={args.jobs}", await export(source, directory / "plain", jobs=args.jobs)
+        )
+        print_report(
+            f"export jobs={args.jobs} gzip",
+            await export(source, directory / "gzip", compressed=True, jobs=args.jobs),
+        )
+
+        await truncate(target)
+        print_report(
+            f"import jobs={args.jobs} (empty)",
+            await import_(target, directory / "plain", jobs=args.jobs),
+        )
+        print_report(
+            f"import jobs={args.jobs} (again)",
+            await import_(target, directory / "plain", jobs=args.jobs),
+        )
+        await truncate(target)
+        print_report(
+            f"import jobs={args.jobs} gzip",
+            await import_(target, directory / "gzip", jobs=args.jobs),
+        )
+    finally:
+        if args.keep:
+            print(f"dump: {directory}")
+        else:
+            shutil.rmtree(directory)
+        await truncate(source)
+        await truncate(target)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+"""
+Фильтрация кандидатов перед set_queue: выгрузка blacklist/favorites/seen
+в Python против анти-джойна в БД (set_queue(..., exclude_known=True)).
+Проверка is_excluded_many: запрос на каждый id, один запрос на список и
+фильтр CachedUserRepository (построение и тёплые проверки).
+
+Запуск: python -m src.benchmarks.bench_candidate_filter
+"""
+import asyncio
+import random
+import sys
+
+from sqlalchemy import delete, insert, select
+
+from src.benchmarks.common import measure, print_row
+from src.infrastructure.cache import TTLCache
+from src.infrastructure.db.models import Blacklist, FavoriteProfile, SeenProfile
+from src.infrastructure.db.repositories.cached_repo import CachedUserRepository, excluded_key
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.session import SessionLocal, engine
+
+TG_USER_ID = 900_000_009
+BLACKLIST = 20_000
+FAVORITES = 2_000
+SEEN = 20_000
+CANDIDATES = 1_000
+REPEAT = 20
+# у обычного пользователя чёрный список и избранное - десятки-сотни анкет
+SMALL_TG_USER_ID = 900_000_010
+SMALL = 200
+
+
+async def python_side(repo: PostgresUserRepository, candidates: list[int]) -> int:
+    session = repo.session
+    blacklist = await session.scalars(
+        select(Blacklist.vk_profile_id).where(Blacklist.tg_user_id == TG_USER_ID)
+    )
+    seen = await session.scalars(
+        select(SeenProfile.vk_profile_id).where(SeenProfile.tg_user_id == TG_USER_ID)
+    )
+    known = set(blacklist) | set(seen) | set(await repo.list_favorites(TG_USER_ID))
+    return await repo.set_queue(TG_USER_ID, [c for c in candidates if c not in known])
+
+
+async def query_per_id(repo: PostgresUserRepository, tg_user_id: int, candidates: list[int]) -> set:
+    session = repo.session
+    found = set()
+    for vk_id in candidates:
+        for model in (Blacklist, FavoriteProfile):
+            hit = await session.scalar(
+                select(model.id).where(model.tg_user_id == tg_user_id, model.vk_profile_id == vk_id)
+            )
+            if hit is not None:
+                found.add(vk_id)
+                break
+    return found
+
+
+async def exclusion_rows(repo: PostgresUserRepository, tg_user_id: int, candidates: list[int]):
+    cold = lambda: CachedUserRepository(repo).is_excluded_many(tg_user_id, candidates)  # noqa: E731
+    cached = CachedUserRepository(repo, TTLCache())
+    expected = await repo.is_excluded_many(tg_user_id, candidates)
+    assert await cached.is_excluded_many(tg_user_id, candidates) == expected
+
+    exclusions = cached.cache.peek(excluded_key(tg_user_id))
+    ids = list(exclusions.blacklist) + list(exclusions.favorites)
+    as_set = sys.getsizeof(set(ids)) + sum(sys.getsizeof(v) for v in ids)
+    print(
+        f"{'':<40} filter: {len(ids)} ids, "
+        f"{exclusions.blacklist.nbytes + exclusions.favorites.nbytes} bytes (set: {as_set})"
+    )
+
+    print_row(
+        "is_excluded_many: one query",
+        await measure(lambda: repo.is_excluded_many(tg_user_id, candidates), REPEAT),
+    )
+    print_row("is_excluded_many: filter, cold", await measure(cold, REPEAT))
+    print_row(
+        "is_excluded_many: filter, warm",
+        await measure(lambda: cached.is_excluded_many(tg_user_id, candidates), REPEAT * 10),
+    )
+
+
+async def seed(repo: PostgresUserRepository) -> None:
+    session = repo.session
+    await repo.get_or_create_user(TG_USER_ID)
+    for model in (Blacklist, FavoriteProfile, SeenProfile):
+        await session.execute(delete(model).where(model.tg_user_id == TG_USER_ID))
+    await session.commit()
+
+    await repo.add_blacklist_many(TG_USER_ID, list(range(1, BLACKLIST + 1)))
+    await repo.add_favorites_many(
+        TG_USER_ID, list(range(BLACKLIST + 1, BLACKLIST + FAVORITES + 1))
+    )
+    first_seen = BLACKLIST + FAVORITES + 1
+    await session.execute(
+        insert(SeenProfile),
+        [
+            {"tg_user_id": TG_USER_ID, "vk_profile_id": vk_id}
+            for vk_id in range(first_seen, first_seen + SEEN)
+        ],
+    )
+    await session.commit()
+
+    await repo.get_or_create_user(SMALL_TG_USER_ID)
+    for model in (Blacklist, FavoriteProfile):
+        await session.execute(delete(model).where(model.tg_user_id == SMALL_TG_USER_ID))
+    await session.commit()
+    await repo.add_blacklist_many(SMALL_TG_USER_ID, list(range(1, SMALL * 4, 4)))
+    await repo.add_favorites_many(SMALL_TG_USER_ID, list(range(2, SMALL * 4, 4)))
+
+
+async def main() -> None:
+    rnd = random.Random(42)
+    universe = BLACKLIST + FAVORITES + SEEN
+    candidates = rnd.sample(range(1, universe * 2), CANDIDATES)
+
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        await seed(repo)
+
+        print(
+            f"blacklist={BLACKLIST} favorites={FAVORITES} seen={SEEN} "
+            f"candidates={CANDIDATES}"
+        )
+        print_row(
+            "filter in Python + set_queue",
+            await measure(lambda: python_side(repo, candidates), REPEAT),
+        )
+        print_row(
+            "set_queue(exclude_known=True)",
+            await measure(
+                lambda: repo.set_queue(TG_USER_ID, candidates, exclude_known=True),
+                REPEAT,
+            ),
+        )
+        print(f"{'':<40} surviving: {await repo.set_queue(TG_USER_ID, candidates, True)}")
+
+        print_row(
+            "is_excluded_many: query per id",
+            await measure(lambda: query_per_id(repo, TG_USER_ID, candidates), 3),
+        )
+        await exclusion_rows(repo, TG_USER_ID, candidates)
+        small_candidates = rnd.sample(range(1, SMALL * 8), CANDIDATES)
+        print(f"blacklist={SMALL} favorites={SMALL} candidates={CANDIDATES}")
+        await exclusion_rows(repo, SMALL_TG_USER_ID, small_candidates)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
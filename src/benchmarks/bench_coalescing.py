@@ -0,0 +1,83 @@
+"""
+Двойной тап: два обработчика одного пользователя одновременно вызывают
+get_or_create_user и get_cursor. Без объединения и с
+CoalescingUserRepository: запросы к БД, время и число объединённых вызовов.
+
+Запуск: python -m src.benchmarks.bench_coalescing [--users 200 --taps 2]
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import event, text
+
+from src.infrastructure.db.repositories.coalescing_repo import CoalescingUserRepository
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.session import SessionLocal, engine
+from src.infrastructure.singleflight import SingleFlight
+
+TG_BASE = 900_017_000
+
+
+async def handler(tg_user_id: int, flight) -> None:
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        if flight is not None:
+            repo = CoalescingUserRepository(repo, flight)
+        await repo.get_or_create_user(tg_user_id)
+        await repo.get_cursor(tg_user_id)
+
+
+async def delete_users(users: int) -> None:
+    # только пользователи, которых создаёт прогон
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("DELETE FROM users WHERE tg_user_id BETWEEN :base + 1 AND :base + :users"),
+            {"base": TG_BASE, "users": users},
+        )
+
+
+async def run(name: str, args, flight) -> None:
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    await delete_users(args.users)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    # все пользователи тапают одновременно, каждый - args.taps раз
+    await asyncio.gather(*(
+        handler(TG_BASE + u, flight)
+        for u in range(1, args.users + 1)
+        for _ in range(args.taps)
+    ))
+    wall = time.perf_counter() - started
+    event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+    calls = args.users * args.taps * 2
+    line = f"{name:<12} calls={calls:<5} statements={statements:<5} wall={wall * 1000:8.1f}ms"
+    if flight is not None:
+        stats = flight.stats()
+        line += f"  deduplicated={stats['deduplicated']} ({stats['dedup_rate']:.0%})"
+    print(line)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--taps", type=int, default=2)
+    args = parser.parse_args()
+
+    try:
+        await run("plain", args, None)
+        await run("coalescing", args, SingleFlight())
+    finally:
+        await delete_users(args.users)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,230 @@
+"""
+Горячие чтения через ORM (как было: сущности, identity map, DTO без slots)
+против Core-запросов по явным колонкам с DTO из кортежей строк.
+На вызов считаются CPU клиента (process_time), время и память по
+tracemalloc (отдельным проходом - трассировка сама замедляет код):
+пик сверх пустого SELECT 1 и сколько осталось занято после вызова
+(DTO результата и сущности в identity map).
+
+Запуск: python -m src.benchmarks.bench_core_reads [--repeat 500]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import exists, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from src.benchmarks.common import percentile
+from src.infrastructure.db.models import Photo, Profile, QueueItem, SeenProfile, User
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import PhotoDTO, ProfileDTO
+from src.infrastructure.db.session import SessionLocal, engine
+
+TG_USER_ID = 900_000_018
+VK_ID = 900_018_000
+QUEUE_SIZE = 2_000
+
+
+# DTO до перехода на slots
+@dataclass
+class LegacyUserDTO:
+    tg_user_id: int
+    vk_access_token: Optional[str] = None
+    vk_user_id: Optional[int] = None
+    filter_city_name: Optional[str] = None
+    filter_city_id: Optional[int] = None
+    filter_gender: Optional[int] = None
+    filter_age_from: Optional[int] = None
+    filter_age_to: Optional[int] = None
+    history_cursor: int = 0
+
+
+@dataclass
+class LegacyProfileDTO:
+    vk_user_id: int
+    first_name: str
+    last_name: str
+    domain: str
+
+
+@dataclass
+class LegacyPhotoDTO:
+    photo_id: int
+    owner_id: int
+    url: str
+    likes_count: int
+    local_path: Optional[str] = None
+    status: Optional[str] = None
+
+
+class OrmReadRepository(PostgresUserRepository):
+    """Прежние реализации горячих методов - для сравнения."""
+
+    async def get_or_create_user(self, tg_user_id: int):
+        result = await self.session.execute(
+            select(User)
+            .where(User.tg_user_id == tg_user_id)
+            .execution_options(populate_existing=True)
+        )
+        user = result.scalar_one()
+        return LegacyUserDTO(
+            tg_user_id=user.tg_user_id,
+            vk_access_token=user.vk_access_token,
+            vk_user_id=user.vk_user_id,
+            filter_city_name=user.filter_city_name,
+            filter_city_id=user.filter_city_id,
+            filter_gender=user.filter_gender,
+            filter_age_from=user.filter_age_from,
+            filter_age_to=user.filter_age_to,
+            history_cursor=user.history_cursor,
+        )
+
+    async def get_profile(self, vk_user_id: int):
+        result = await self.session.execute(
+            select(Profile)
+            .where(Profile.vk_user_id == vk_user_id)
+            .execution_options(populate_existing=True)
+        )
+        m = result.scalar_one_or_none()
+        return LegacyProfileDTO(m.vk_user_id, m.first_name, m.last_name, m.domain)
+
+    async def get_photos(self, vk_user_id: int):
+        result = await self.session.execute(
+            select(Photo)
+            .where(Photo.vk_user_id == vk_user_id)
+            .execution_options(populate_existing=True)
+        )
+        return [
+            LegacyPhotoDTO(m.photo_id, m.owner_id, m.url, m.likes_count, m.local_path, m.status)
+            for m in result.scalars().all()
+        ]
+
+    async def move_next(self, tg_user_id: int):
+        # запрос строился на каждый вызов, а insert диалекта postgresql в
+        # CTE не кэшируется - компиляция тоже на каждый вызов
+        locked = (
+            select(User.history_cursor)
+            .where(User.tg_user_id == tg_user_id)
+            .with_for_update()
+            .cte("locked")
+        )
+        cursor = select(locked.c.history_cursor).scalar_subquery()
+        target = (
+            select(QueueItem.tg_user_id, QueueItem.position, QueueItem.vk_profile_id)
+            .where(QueueItem.tg_user_id == tg_user_id, QueueItem.position >= cursor)
+            .order_by(QueueItem.position)
+            .offset(1)
+            .limit(1)
+            .cte("target")
+        )
+        current = (
+            select(QueueItem.tg_user_id, QueueItem.vk_profile_id)
+            .where(QueueItem.tg_user_id == tg_user_id, QueueItem.position >= cursor)
+            .order_by(QueueItem.position)
+            .limit(1)
+            .cte("current_card")
+        )
+        mark_seen = (
+            pg_insert(SeenProfile)
+            .from_select(
+                ["tg_user_id", "vk_profile_id"],
+                select(current.c.tg_user_id, current.c.vk_profile_id)
+                .where(exists(select(target.c.position))),
+            )
+            .on_conflict_do_nothing()
+            .cte("mark_seen")
+        )
+        users = User.__table__
+        result = await self.session.execute(
+            update(users)
+            .where(users.c.tg_user_id == target.c.tg_user_id)
+            .values(history_cursor=target.c.position)
+            .returning(target.c.vk_profile_id)
+            .add_cte(mark_seen)
+        )
+        vk_id = result.scalar_one_or_none()
+        await self._commit()
+        return vk_id
+
+
+CALLS = {
+    # пустой round trip: его пик (буфер чтения драйвера) вычитается из остальных
+    "select 1": lambda repo: repo.session.execute(text("SELECT 1")),
+    "get_or_create_user": lambda repo: repo.get_or_create_user(TG_USER_ID),
+    "get_profile": lambda repo: repo.get_profile(VK_ID),
+    "get_photos": lambda repo: repo.get_photos(VK_ID),
+    "move_next": lambda repo: repo.move_next(TG_USER_ID),
+}
+
+
+async def measure(repo, call, repeat: int) -> tuple[float, float, float, float]:
+    """(CPU мкс на вызов, p50 мс, пик КБ, оставшиеся КБ)."""
+    for _ in range(20):
+        await call(repo)
+
+    walls = []
+    cpu_started = time.process_time()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call(repo)
+        walls.append((time.perf_counter() - started) * 1000)
+    cpu = (time.process_time() - cpu_started) / repeat * 1e6
+
+    peaks, retained = [], []
+    tracemalloc.start()
+    for _ in range(min(repeat, 100)):
+        repo.session.expunge_all()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        result = await call(repo)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append((peak - base) / 1024)
+        retained.append((current - base) / 1024)
+        del result
+    tracemalloc.stop()
+
+    return cpu, percentile(walls, 50), percentile(peaks, 50), percentile(retained, 50)
+
+
+async def seed(repo: PostgresUserRepository) -> None:
+    await repo.get_or_create_user(TG_USER_ID)
+    await repo.upsert_profile(ProfileDTO(VK_ID, "Имя", "Фамилия", "id18"))
+    await repo.set_photos(VK_ID, [
+        PhotoDTO(n, VK_ID, f"https://vk.test/{VK_ID}_{n}.jpg", n) for n in range(3)
+    ])
+    await repo.set_queue(TG_USER_ID, list(range(VK_ID, VK_ID + QUEUE_SIZE)))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    async with SessionLocal() as session:
+        await seed(PostgresUserRepository(session))
+
+    print(f"{'method':<20} {'path':<5} {'cpu/call':>10} {'p50':>9} {'peak':>9} {'retained':>9}")
+    baseline = {}
+    for name, call in CALLS.items():
+        for path, repo_cls in (("orm", OrmReadRepository), ("core", PostgresUserRepository)):
+            async with SessionLocal() as session:
+                repo = repo_cls(session)
+                await repo.set_cursor(TG_USER_ID, 0)
+                cpu, p50, peak, retained = await measure(repo, call, args.repeat)
+            baseline.setdefault(path, peak)
+            print(
+                f"{name:<20} {path:<5} {cpu:8.0f}us {p50:7.3f}ms "
+                f"{peak - baseline[path]:7.1f}KB {retained:7.1f}KB"
+            )
+
+    async with SessionLocal() as session:
+        await PostgresUserRepository(session).set_queue(TG_USER_ID, [])
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
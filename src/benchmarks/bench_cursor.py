@@ -0,0 +1,74 @@
+"""
+Латентность свайпа: прежняя навигация (вся очередь в Python)
+против одного индексного запроса.
+
+Запуск: python -m src.benchmarks.bench_cursor
+"""
+import asyncio
+
+from src.benchmarks.common import measure, print_row
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.session import SessionLocal, engine
+
+TG_USER_ID = 900_000_002
+QUEUE_SIZE = 1_000
+REPEAT = 200
+
+
+async def legacy_get_current_vk_id(repo: PostgresUserRepository, tg_user_id: int):
+    queue = await repo.get_queue(tg_user_id)
+    cursor = await repo.get_cursor(tg_user_id)
+    if 0 <= cursor < len(queue):
+        return queue[cursor]
+    return None
+
+
+async def legacy_move_next(repo: PostgresUserRepository, tg_user_id: int):
+    user = await repo._get_or_create_user_model(tg_user_id)
+    queue = await repo.get_queue(tg_user_id)
+
+    if user.history_cursor + 1 < len(queue):
+        user.history_cursor += 1
+        await repo.session.commit()
+        return queue[user.history_cursor]
+
+    return None
+
+
+async def main() -> None:
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+
+        await repo.set_queue(TG_USER_ID, list(range(1, QUEUE_SIZE + 1)))
+        print_row(
+            "legacy get_current_vk_id",
+            await measure(lambda: legacy_get_current_vk_id(repo, TG_USER_ID), REPEAT),
+        )
+        print_row(
+            "get_current_vk_id",
+            await measure(lambda: repo.get_current_vk_id(TG_USER_ID), REPEAT),
+        )
+
+        await repo.set_queue(TG_USER_ID, list(range(1, QUEUE_SIZE + 1)))
+        print_row(
+            "legacy move_next",
+            await measure(lambda: legacy_move_next(repo, TG_USER_ID), REPEAT),
+        )
+
+        await repo.set_queue(TG_USER_ID, list(range(1, QUEUE_SIZE + 1)))
+        print_row(
+            "move_next",
+            await measure(lambda: repo.move_next(TG_USER_ID), REPEAT),
+        )
+        print_row(
+            "move_prev",
+            await measure(lambda: repo.move_prev(TG_USER_ID), REPEAT),
+        )
+
+        await repo.set_queue(TG_USER_ID, [])
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
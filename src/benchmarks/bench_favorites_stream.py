@@ -0,0 +1,80 @@
+"""
+Большое избранное: list_favorites целиком против keyset-страниц
+(list_favorites_page) и потока через server-side курсор
+(stream_favorites). Считаются время и пик памяти клиента (tracemalloc).
+
+Запуск: python -m src.benchmarks.bench_favorites_stream [--favorites 50000]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from sqlalchemy import text
+
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.session import SessionLocal, engine
+
+TG_USER_ID = 900_000_019
+VK_BASE = 900_019_000
+
+
+async def whole(repo: PostgresUserRepository) -> int:
+    return len(await repo.list_favorites(TG_USER_ID))
+
+
+async def pages(repo: PostgresUserRepository, limit: int = 500) -> int:
+    count, after_id = 0, None
+    while True:
+        page = await repo.list_favorites_page(TG_USER_ID, after_id, limit)
+        count += len(page.vk_ids)
+        after_id = page.next_after_id
+        if after_id is None:
+            return count
+
+
+async def stream(repo: PostgresUserRepository) -> int:
+    count = 0
+    async for _ in repo.stream_favorites(TG_USER_ID, batch_size=500):
+        count += 1
+    return count
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--favorites", type=int, default=50_000)
+    args = parser.parse_args()
+
+    params = {"tg": TG_USER_ID, "base": VK_BASE, "n": args.favorites}
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM favorites WHERE tg_user_id = :tg"), params)
+        await conn.execute(text(
+            "INSERT INTO favorites (tg_user_id, vk_profile_id) "
+            "SELECT :tg, :base + g FROM generate_series(1, :n) g"
+        ), params)
+
+    try:
+        for name, read in (("list_favorites", whole), ("pages of 500", pages), ("stream", stream)):
+            async with SessionLocal() as session:
+                repo = PostgresUserRepository(session)
+                await read(repo)  # прогрев соединения и prepared statements
+
+                tracemalloc.start()
+                started = time.perf_counter()
+                count = await read(repo)
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            print(
+                f"{name:<16} rows={count:<7} {elapsed * 1000:8.1f}ms "
+                f"peak={peak / 1024:8.1f}KB"
+            )
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM favorites WHERE tg_user_id = :tg"), params)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""
+Накладные расходы InstrumentedUserRepository.
+
+1. Чистая стоимость обёртки: вызов метода-заглушки без БД.
+2. Реальные запросы: get_profile / get_current_vk_id с метриками и без.
+
+Запуск: python -m src.benchmarks.bench_instrumentation
+"""
+import asyncio
+import time
+
+from src.benchmarks.common import measure, print_row
+from src.infrastructure.db.metrics import RepositoryMetrics
+from src.infrastructure.db.repositories.instrumented_repo import InstrumentedUserRepository
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import ProfileDTO
+from src.infrastructure.db.session import SessionLocal, engine
+
+TG_USER_ID = 900_000_012
+VK_ID = 900_000_012
+STUB_CALLS = 200_000
+DB_CALLS = 2_000
+ROUNDS = 10
+
+
+class StubRepository:
+    async def get_profile(self, vk_user_id: int):
+        return None
+
+
+async def stub_overhead() -> None:
+    stub = StubRepository()
+    wrapped = InstrumentedUserRepository(stub, RepositoryMetrics())
+
+    for name, repo in (("stub, bare", stub), ("stub, instrumented", wrapped)):
+        started = time.perf_counter()
+        for _ in range(STUB_CALLS):
+            await repo.get_profile(1)
+        per_call_us = (time.perf_counter() - started) / STUB_CALLS * 1e6
+        print(f"{name:<40} {per_call_us:.3f} us/call")
+
+
+async def db_overhead() -> None:
+    metrics = RepositoryMetrics()
+    metrics.attach(engine)
+
+    async with SessionLocal() as session:
+        bare = PostgresUserRepository(session)
+        wrapped = InstrumentedUserRepository(bare, metrics)
+        await bare.upsert_profile(ProfileDTO(VK_ID, "Имя", "Фамилия", "id"))
+        await bare.set_queue(TG_USER_ID, [VK_ID])
+
+        # прогоны чередуются, чтобы дрейф машины не шёл в зачёт одной стороне
+        samples = {("bare", m): [] for m in ("get_profile", "get_current_vk_id")}
+        samples.update({("instrumented", m): [] for m in ("get_profile", "get_current_vk_id")})
+        for _ in range(ROUNDS):
+            for label, repo in (("bare", bare), ("instrumented", wrapped)):
+                samples[(label, "get_profile")] += await measure(
+                    lambda: repo.get_profile(VK_ID), DB_CALLS // ROUNDS
+                )
+                samples[(label, "get_current_vk_id")] += await measure(
+                    lambda: repo.get_current_vk_id(TG_USER_ID), DB_CALLS // ROUNDS
+                )
+
+        for (label, method), values in samples.items():
+            print_row(f"{method}, {label}", values)
+
+    metrics.detach(engine)
+    await engine.dispose()
+
+
+async def main() -> None:
+    await stub_overhead()
+    await db_overhead()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+"""
+Инвалидация кэшей между процессами через LISTEN/NOTIFY.
+
+1. Задержка сброса ключа в кэше listener'а: от начала upsert_profile
+   (запрос + COMMIT) и от его возврата.
+2. Несколько процессов бота с CachedUserRepository читают горячие
+   профили и изредка их обновляют. Короткий TTL без listener'а (как было)
+   против длинного TTL с InvalidationListener: запросы к БД и hit rate.
+
+Запуск: python -m src.benchmarks.bench_invalidation
+    [--processes 4,8 --seconds 10 --rate 200 --hot 500 --write-ratio 0.01]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+
+from sqlalchemy import event, text
+
+from src.benchmarks.common import percentile
+from src.infrastructure.cache import TTLCache
+from src.infrastructure.db.invalidation import InvalidationListener, asyncpg_dsn
+from src.infrastructure.db.repositories.cached_repo import CachedUserRepository
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import ProfileDTO
+from src.infrastructure.db.session import SessionLocal, engine
+
+VK_BASE = 900_022_000
+
+# (имя, TTL кэша, listener)
+MODES = (("ttl=1s", 1.0, False), ("ttl=300s+notify", 300.0, True))
+
+
+def dsn() -> str:
+    return asyncpg_dsn(os.environ["DATABASE_URL"])
+
+
+async def measure_lag(samples: int) -> tuple[list[float], list[float]]:
+    evicted = asyncio.Event()
+    cache = TTLCache(ttl=3600)
+    # записи этого же процесса: listener слушает их как чужие
+    listener = InvalidationListener(
+        dsn(), [cache], on_event=lambda _: evicted.set(), skip_own=False
+    ).start()
+    await listener.wait_listening(5)
+
+    from_write, from_commit = [], []
+    try:
+        async with SessionLocal() as session:
+            repo = PostgresUserRepository(session)
+            for n in range(samples):
+                evicted.clear()
+                started = time.perf_counter()
+                await repo.upsert_profile(ProfileDTO(VK_BASE, "Имя", str(n), "lag"))
+                committed = time.perf_counter()
+                await evicted.wait()
+                done = time.perf_counter()
+                from_write.append((done - started) * 1000)
+                # событие может обогнать ответ на COMMIT - тогда задержка 0
+                from_commit.append(max(done - committed, 0.0) * 1000)
+    finally:
+        await listener.stop()
+    return from_write, from_commit
+
+
+def worker(mode: str, ttl: float, notify: bool, args, results) -> None:
+    async def main() -> None:
+        cache = TTLCache(max_entries=args.hot * 2, ttl=ttl)
+        listener = None
+        if notify:
+            listener = InvalidationListener(dsn(), [cache]).start()
+            await listener.wait_listening(5)
+
+        reads = 0
+
+        def count(conn, cursor, statement, *_):
+            nonlocal reads
+            if statement.lstrip().startswith("SELECT") and "profiles" in statement:
+                reads += 1
+
+        event.listen(engine.sync_engine, "before_cursor_execute", count)
+        rng = random.Random(os.getpid())
+        calls = writes = 0
+        interval = 1 / args.rate
+        deadline = time.monotonic() + args.seconds
+        try:
+            async with SessionLocal() as session:
+                repo = CachedUserRepository(PostgresUserRepository(session), cache)
+                next_at = time.monotonic()
+                while time.monotonic() < deadline:
+                    vk_id = VK_BASE + 1 + rng.randrange(args.hot)
+                    if rng.random() < args.write_ratio:
+                        await repo.upsert_profile(ProfileDTO(vk_id, "Имя", str(calls), "w"))
+                        writes += 1
+                    else:
+                        await repo.get_profile(vk_id)
+                        calls += 1
+                    next_at += interval
+                    await asyncio.sleep(max(next_at - time.monotonic(), 0))
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", count)
+            if listener is not None:
+                await listener.stop()
+            await engine.dispose()
+
+        results.put((calls, writes, reads, cache.stats()["hit_rate"]))
+
+    asyncio.run(main())
+
+
+async def seed(hot: int) -> None:
+    async with SessionLocal() as session:
+        await PostgresUserRepository(session).upsert_profiles([
+            ProfileDTO(VK_BASE + n, "Имя", "Фамилия", f"id{n}") for n in range(hot + 1)
+        ])
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--processes", default="4,8")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rate", type=float, default=200, help="вызовов в секунду на процесс")
+    parser.add_argument("--hot", type=int, default=500)
+    parser.add_argument("--write-ratio", type=float, default=0.01)
+    parser.add_argument("--lag-samples", type=int, default=300)
+    args = parser.parse_args()
+
+    await seed(args.hot)
+    try:
+        for name, lags in zip(("from write", "after commit"), await measure_lag(args.lag_samples)):
+            print(
+                f"invalidation lag {name:<12}: p50={percentile(lags, 50):.2f}ms "
+                f"p99={percentile(lags, 99):.2f}ms max={max(lags):.2f}ms"
+            )
+
+        ctx = multiprocessing.get_context("spawn")
+        for processes in map(int, args.processes.split(",")):
+            for mode, ttl, notify in MODES:
+                results = ctx.Queue()
+                procs = [
+                    ctx.Process(target=worker, args=(mode, ttl, notify, args, results))
+                    for _ in range(processes)
+                ]
+                for proc in procs:
+                    proc.start()
+                rows = [results.get() for _ in procs]
+                for proc in procs:
+                    proc.join()
+
+                calls = sum(r[0] for r in rows)
+                writes = sum(r[1] for r in rows)
+                reads = sum(r[2] for r in rows)
+                hit_rate = sum(r[3] for r in rows) / len(rows)
+                print(
+                    f"processes={processes:<2} {mode:<16} get_profile={calls:<6} "
+                    f"writes={writes:<4} db reads={reads:<6} "
+                    f"({reads / calls * 1000:5.0f} per 1000)  hit rate={hit_rate:.0%}"
+                )
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM profiles WHERE vk_user_id BETWEEN :base AND :top"),
+                {"base": VK_BASE, "top": VK_BASE + args.hot},
+            )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
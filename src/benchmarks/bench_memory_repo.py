@@ -0,0 +1,86 @@
+"""
+InMemoryUserRepository против PostgresUserRepository на пути свайпа:
+время вызова move_next, get_current_vk_id, get_window и set_queue,
+плюс память очереди в array('q') против list.
+
+Запуск: python -m src.benchmarks.bench_memory_repo [--repeat 2000 --queue 1000]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from array import array
+
+from src.benchmarks.common import percentile
+from src.infrastructure.db.repositories.memory_repo import InMemoryUserRepository
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import ProfileDTO, PhotoDTO
+from src.infrastructure.db.session import SessionLocal, engine
+
+TG_USER_ID = 900_000_021
+VK_BASE = 900_021_000
+
+
+async def seed(repo, queue_size: int) -> list[int]:
+    vk_ids = list(range(VK_BASE, VK_BASE + queue_size))
+    await repo.upsert_profiles([ProfileDTO(v, "Имя", "Фамилия", f"id{v}") for v in vk_ids[:10]])
+    for vk_id in vk_ids[:10]:
+        await repo.set_photos(vk_id, [PhotoDTO(1, vk_id, f"https://vk.test/{vk_id}.jpg", 0)])
+    await repo.set_queue(TG_USER_ID, vk_ids)
+    return vk_ids
+
+
+async def measure(call, repeat: int) -> tuple[float, float]:
+    """(мкс на вызов p50, вызовов в секунду)."""
+    walls = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        await call()
+        walls.append((time.perf_counter() - t) * 1e6)
+    return percentile(walls, 50), repeat / (time.perf_counter() - started)
+
+
+async def run(name: str, repo, args) -> None:
+    vk_ids = await seed(repo, args.queue)
+    calls = {
+        "move_next": lambda: repo.move_next(TG_USER_ID),
+        "get_current_vk_id": lambda: repo.get_current_vk_id(TG_USER_ID),
+        "get_window": lambda: repo.get_window(TG_USER_ID, ahead=3),
+        "set_queue": lambda: repo.set_queue(TG_USER_ID, vk_ids),
+    }
+    for method, call in calls.items():
+        await repo.set_cursor(TG_USER_ID, 0)
+        # move_next упирается в конец очереди - повторов не больше её длины
+        repeat = min(args.repeat, args.queue - 1) if method == "move_next" else args.repeat
+        if method == "set_queue":
+            repeat = max(repeat // 20, 1)
+        p50, rate = await measure(call, repeat)
+        print(f"{name:<9} {method:<18} p50={p50:9.1f}us {rate:10.0f} calls/s")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=2_000)
+    parser.add_argument("--queue", type=int, default=1_000)
+    args = parser.parse_args()
+
+    await run("memory", InMemoryUserRepository(), args)
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        try:
+            await run("postgres", repo, args)
+        finally:
+            await repo.set_queue(TG_USER_ID, [])
+    await engine.dispose()
+
+    as_list = list(range(VK_BASE, VK_BASE + args.queue))
+    list_bytes = sys.getsizeof(as_list) + sum(sys.getsizeof(v) for v in as_list)
+    print(
+        f"queue of {args.queue}: list {list_bytes / 1024:.1f}KB, "
+        f"array('q') {sys.getsizeof(array('q', as_list)) / 1024:.1f}KB"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+"""
+Несколько процессов-загрузчиков на одной таблице photos: пропускная
+способность при 1/2/4 процессах и проверка, что ни одна строка не
+скачана дважды (claim_pending_photos + SKIP LOCKED).
+
+Очередь скачивания общая для всей базы, поэтому бенчмарк идёт в своей
+базе vkt_photo_claim_bench_0 на сервере DATABASE_URL и не трогает чужие
+pending-строки.
+
+Запуск: python -m src.benchmarks.bench_photo_claim [--photos 800 --processes 1,2,4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import PhotoDTO, ProfileDTO
+from src.infrastructure.db.session import DATABASE_URL, PoolSettings, create_engine
+from src.scripts.init_db import create_databases
+
+VK_BASE = 900_016_000
+PHOTOS_PER_PROFILE = 4
+PHOTO_BYTES = 16 * 1024
+
+
+def start_server(latency: float, hits: Counter) -> ThreadingHTTPServer:
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                hits[self.path] += 1
+            time.sleep(latency)
+            data = self.path.encode().ljust(PHOTO_BYTES, b"x")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def seed(engine: AsyncEngine, base_url: str, photos: int) -> None:
+    profiles = photos // PHOTOS_PER_PROFILE
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        repo = PostgresUserRepository(session)
+        async with repo.transaction():
+            await repo.upsert_profiles([
+                ProfileDTO(VK_BASE + p, "Имя", "Фамилия", f"id{p}")
+                for p in range(1, profiles + 1)
+            ])
+            for p in range(1, profiles + 1):
+                await repo.set_photos(VK_BASE + p, [
+                    PhotoDTO(k, VK_BASE + p, f"{base_url}/{p}_{k}.jpg", 0)
+                    for k in range(PHOTOS_PER_PROFILE)
+                ])
+
+
+async def check(engine: AsyncEngine) -> tuple[int, int, int]:
+    """(всего строк, done, строк с attempts > 1)."""
+    async with engine.connect() as conn:
+        row = (await conn.execute(text(
+            "SELECT count(*), count(*) FILTER (WHERE status = 'done'), "
+            "count(*) FILTER (WHERE attempts > 1) FROM photos"
+        ))).one()
+    return tuple(row)
+
+
+def worker(url: str, worker_id: str, args, results) -> None:
+    # отдельный процесс: свой движок и своё хранилище - PhotoStore
+    # рассчитан на один процесс
+    from src.infrastructure.photos.store import PhotoStore
+    from src.infrastructure.photos.worker import PhotoDownloader
+
+    async def main() -> None:
+        root = tempfile.mkdtemp(prefix="vkt-claim-")
+        engine = create_engine(url, PoolSettings(pool_size=1))
+        try:
+            store = PhotoStore(root)
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                downloader = PhotoDownloader(
+                    PostgresUserRepository(session),
+                    store,
+                    concurrency=args.concurrency,
+                    batch_size=args.batch_size,
+                    worker_id=worker_id,
+                )
+                stats = await downloader.run()
+                downloader.close()
+            store.close()
+            results.put((worker_id, stats.jobs))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--photos", type=int, default=800)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--processes", default="1,2,4")
+    args = parser.parse_args()
+
+    hits: Counter = Counter()
+    server = start_server(args.latency_ms / 1000, hits)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    ctx = multiprocessing.get_context("spawn")
+
+    (url,) = await create_databases(DATABASE_URL, "vkt_photo_claim_bench", 1, truncate=True)
+    engine = create_engine(url, PoolSettings(pool_size=1))
+    try:
+        for processes in map(int, args.processes.split(",")):
+            # set_photos пересоздаёт строки: снова pending, attempts = 0
+            await seed(engine, base_url, args.photos)
+            hits.clear()
+            results = ctx.Queue()
+            procs = [
+                ctx.Process(target=worker, args=(url, f"bench-{n}", args, results))
+                for n in range(processes)
+            ]
+            started = time.perf_counter()
+            for proc in procs:
+                proc.start()
+            jobs = dict(results.get() for _ in procs)
+            for proc in procs:
+                proc.join()
+            wall = time.perf_counter() - started
+
+            total, done, retried = await check(engine)
+            twice = sum(1 for n in hits.values() if n > 1)
+            print(
+                f"processes={processes:<2} photos={total:<5} done={done:<5} "
+                f"{total / wall:8.1f} photos/s  wall={wall:6.2f}s  "
+                f"fetched twice={twice} retried rows={retried}  "
+                f"per worker={sorted(jobs.values(), reverse=True)}"
+            )
+    finally:
+        server.shutdown()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
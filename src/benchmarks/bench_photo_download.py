@@ -0,0 +1,126 @@
+"""
+Скачивание фото в локальный кэш: пропускная способность (байт/с) при
+разном числе одновременных загрузок и доля попаданий в хранилище.
+Фото отдаёт локальный HTTP-сервер с искусственной задержкой.
+
+Очередь скачивания общая для всей базы, поэтому бенчмарк идёт в своей
+базе vkt_photo_download_bench_0 на сервере DATABASE_URL.
+
+Запуск: python -m src.benchmarks.bench_photo_download [--photos 600 --latency-ms 30]
+"""
+import argparse
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import PhotoDTO, ProfileDTO
+from src.infrastructure.db.session import DATABASE_URL, PoolSettings, create_engine
+from src.infrastructure.photos.store import PhotoStore
+from src.infrastructure.photos.worker import DownloadStats, PhotoDownloader
+from src.scripts.init_db import create_databases
+
+VK_BASE = 900_015_000
+PHOTOS_PER_PROFILE = 3
+PHOTO_BYTES = 64 * 1024
+
+
+def start_server(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            # содержимое зависит от пути, чтобы объекты не склеились
+            data = self.path.encode().ljust(PHOTO_BYTES, b"x")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def seed(
+    repo: PostgresUserRepository, base_url: str, photos: int, duplicates: float
+) -> None:
+    profiles = photos // PHOTOS_PER_PROFILE
+    unique = max(int(photos * (1 - duplicates)), 1)
+    async with repo.transaction():
+        await repo.upsert_profiles([
+            ProfileDTO(VK_BASE + p, "Имя", "Фамилия", f"id{p}")
+            for p in range(1, profiles + 1)
+        ])
+        n = 0
+        for p in range(1, profiles + 1):
+            items = []
+            for k in range(PHOTOS_PER_PROFILE):
+                # часть фото повторяет уже встречавшиеся URL (репосты, аватары)
+                items.append(PhotoDTO(k, VK_BASE + p, f"{base_url}/{n % unique}.jpg", 0))
+                n += 1
+            await repo.set_photos(VK_BASE + p, items)
+
+
+async def run(engine: AsyncEngine, concurrency: int, base_url: str, args) -> None:
+    root = tempfile.mkdtemp(prefix="vkt-photos-")
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            repo = PostgresUserRepository(session)
+            await seed(repo, base_url, args.photos, args.duplicates)
+            store = PhotoStore(root, max_bytes=args.cache_mb * 1024 ** 2)
+
+            downloader = PhotoDownloader(repo, store, concurrency=concurrency)
+            started = time.perf_counter()
+            stats = await downloader.run()
+            wall = time.perf_counter() - started
+
+            print(
+                f"concurrency={concurrency:<3} jobs={stats.jobs:<5} fetched={stats.fetched:<5} "
+                f"hit_rate={stats.hit_rate:5.1%} evicted={stats.evicted:<4} "
+                f"{stats.bytes / wall / 1024 ** 2:7.2f} MB/s  wall={wall:6.2f}s"
+            )
+
+            # второй проход по тем же URL: всё должно найтись в хранилище
+            await seed(repo, base_url, args.photos, args.duplicates)
+            downloader.stats = DownloadStats()
+            stats = await downloader.run()
+            downloader.close()
+            store.close()
+            print(f"{'':<15} repeat pass: fetched={stats.fetched} hit_rate={stats.hit_rate:.1%}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--photos", type=int, default=600)
+    parser.add_argument("--duplicates", type=float, default=0.2)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--cache-mb", type=int, default=512)
+    parser.add_argument("--concurrency", default="1,8,32")
+    args = parser.parse_args()
+
+    server = start_server(args.latency_ms / 1000)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    (url,) = await create_databases(
+        DATABASE_URL, "vkt_photo_download_bench", 1, truncate=True
+    )
+    engine = create_engine(url, PoolSettings(pool_size=1))
+    try:
+        for concurrency in map(int, args.concurrency.split(",")):
+            await run(engine, concurrency, base_url, args)
+    finally:
+        server.shutdown()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
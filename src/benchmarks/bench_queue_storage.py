@@ -0,0 +1,133 @@
+"""
+Хранение очереди: строка queue на кандидата (rows) против одного int[]
+в queue_packed (packed). Размер таблиц, объём WAL и латентность свайпа.
+
+Запуск: python -m src.benchmarks.bench_queue_storage [--users 200 --queue-size 1000]
+"""
+import argparse
+import asyncio
+import random
+
+from sqlalchemy import text
+
+from src.benchmarks.common import measure, print_row
+from src.infrastructure.db.repositories.factory import create_user_repository
+from src.infrastructure.db.session import SessionLocal, engine
+
+TG_BASE = 900_100_000
+SWIPES = 1_000
+
+TABLES = {"rows": "queue", "packed": "queue_packed"}
+
+
+async def scalar(sql: str, **params):
+    async with engine.connect() as conn:
+        return (await conn.execute(text(sql), params)).scalar()
+
+
+async def wal_lsn() -> str:
+    return await scalar("SELECT pg_current_wal_lsn()")
+
+
+async def wal_since(lsn: str) -> int:
+    return int(await scalar("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), :lsn)", lsn=lsn))
+
+
+async def table_size(table: str) -> int:
+    return int(await scalar("SELECT pg_total_relation_size(CAST(:t AS regclass))", t=table))
+
+
+async def vacuum(table: str, full: bool = False) -> None:
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(f"VACUUM {'FULL ' if full else ''}{table}"))
+
+
+async def fill(storage: str, users: int, queue_size: int, rnd: random.Random) -> None:
+    async with SessionLocal() as session:
+        repo = create_user_repository(session, storage)
+        for u in range(1, users + 1):
+            await repo.set_queue(
+                TG_BASE + u, [rnd.randint(1, 10_000_000) for _ in range(queue_size)]
+            )
+
+
+async def cleanup(users: int) -> None:
+    params = {"lo": TG_BASE, "hi": TG_BASE + users}
+    async with engine.begin() as conn:
+        for table in ("queue", "queue_packed", "seen_profiles"):
+            await conn.execute(
+                text(f"DELETE FROM {table} WHERE tg_user_id > :lo AND tg_user_id <= :hi"),
+                params,
+            )
+    # FULL - чтобы прирост размера после заполнения был виден,
+    # а не ушёл в свободное место от прошлых прогонов
+    for table in ("queue", "queue_packed", "seen_profiles"):
+        await vacuum(table, full=True)
+
+
+def mb(size: int) -> str:
+    return f"{size / 1024 / 1024:8.2f} MB"
+
+
+async def run(storage: str, users: int, queue_size: int) -> None:
+    table = TABLES[storage]
+    rnd = random.Random(1)
+    await cleanup(users)
+    before = await table_size(table)
+
+    lsn = await wal_lsn()
+    await fill(storage, users, queue_size, rnd)
+    fill_wal = await wal_since(lsn)
+    await vacuum(table)
+    size = await table_size(table) - before
+
+    # повторное заполнение - то, что делают update_filters / set_queue
+    lsn = await wal_lsn()
+    await fill(storage, users, queue_size, rnd)
+    refill_wal = await wal_since(lsn)
+    # иначе WAL свайпов смешается с WAL автовакуума после refill
+    await vacuum(table)
+
+    async with SessionLocal() as session:
+        repo = create_user_repository(session, storage)
+        swipe_users = [TG_BASE + rnd.randint(1, users) for _ in range(SWIPES)]
+        it = iter(swipe_users)
+
+        lsn = await wal_lsn()
+        samples = await measure(lambda: repo.move_next(next(it)), SWIPES)
+        swipe_wal = await wal_since(lsn)
+
+        current = await measure(lambda: repo.get_current_vk_id(TG_BASE + 1), SWIPES)
+
+    print(f"[{storage}] table {table}")
+    print(f"  size after fill ({users} x {queue_size}):  {mb(size)}")
+    print(f"  WAL fill:                   {mb(fill_wal)}")
+    print(f"  WAL refill:                 {mb(refill_wal)}")
+    print(f"  WAL per swipe:              {swipe_wal / SWIPES:8.0f} B")
+    print_row(f"  {storage} move_next", samples)
+    print_row(f"  {storage} get_current_vk_id", current)
+
+    await cleanup(users)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--queue-size", type=int, default=1_000)
+    args = parser.parse_args()
+
+    # пользователи нужны обоим режимам, set_queue создаст их сам
+    for storage in ("rows", "packed"):
+        await run(storage, args.users, args.queue_size)
+
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("DELETE FROM users WHERE tg_user_id > :lo AND tg_user_id <= :hi"),
+            {"lo": TG_BASE, "hi": TG_BASE + args.users},
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""
+Сравнение записи очереди: старый цикл session.add() против bulk-пути.
+
+Запуск: python -m src.benchmarks.bench_set_queue
+"""
+import asyncio
+
+from sqlalchemy import delete
+
+from src.benchmarks.common import measure, print_row
+from src.infrastructure.db.models import QueueItem
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.session import SessionLocal, engine
+
+TG_USER_ID = 900_000_001
+SIZES = (1_000, 10_000)
+REPEAT = 5
+
+
+async def legacy_set_queue(
+    repo: PostgresUserRepository, tg_user_id: int, vk_ids: list[int]
+) -> None:
+    # прежняя реализация: один ORM-объект и одна строка на элемент
+    await repo.session.execute(
+        delete(QueueItem).where(QueueItem.tg_user_id == tg_user_id)
+    )
+    user = await repo._get_or_create_user_model(tg_user_id)
+    for pos, vk_id in enumerate(vk_ids):
+        repo.session.add(QueueItem(
+            tg_user_id=tg_user_id,
+            vk_profile_id=vk_id,
+            position=pos,
+        ))
+    user.history_cursor = 0
+    await repo.session.commit()
+
+
+async def main() -> None:
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        await repo.get_or_create_user(TG_USER_ID)
+
+        for size in SIZES:
+            vk_ids = list(range(1, size + 1))
+
+            print_row(
+                f"legacy loop, {size} items",
+                await measure(
+                    lambda: legacy_set_queue(repo, TG_USER_ID, vk_ids), REPEAT
+                ),
+            )
+            print_row(
+                f"bulk set_queue, {size} items",
+                await measure(lambda: repo.set_queue(TG_USER_ID, vk_ids), REPEAT),
+            )
+
+        await repo.set_queue(TG_USER_ID, [])
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+"""
+Пропускная способность записей при 1, 2, 3... шардах: процессы-клиенты
+гоняют свайп-нагрузку (set_queue, move_next, add_favorite, add_blacklist)
+по разным пользователям через ShardedUserRepository.
+
+Шарды - базы vkt_shard_bench_<n> (создаются на сервере DATABASE_URL) или
+адреса из DATABASE_SHARD_URLS. Шарды на одном сервере делят его CPU и
+WAL: прирост показывает предел одной базы, а не нескольких машин.
+
+Запуск: python -m src.benchmarks.bench_sharding
+    [--shards 1,2,3 --processes 2 --concurrency 4 --seconds 8]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+
+from sqlalchemy import text
+
+from src.infrastructure.db.repositories.sharded_repo import ShardedUserRepository
+from src.infrastructure.db.session import DATABASE_URL, PoolSettings
+from src.infrastructure.db.sharding import ShardSet
+from src.scripts.init_db import create_databases
+
+TG_BASE = 900_023_000
+QUEUE = list(range(900_023_000, 900_023_050))
+_TABLES = "users, queue, queue_packed, favorites, blacklist, seen_profiles"
+
+
+async def bench_urls(count: int) -> list[str]:
+    env = [u.strip() for u in os.getenv("DATABASE_SHARD_URLS", "").split(",") if u.strip()]
+    if len(env) >= count:
+        return env[:count]
+    return await create_databases(DATABASE_URL, "vkt_shard_bench", count)
+
+
+async def clean(urls: list[str]) -> None:
+    shards = ShardSet(urls, PoolSettings(pool_size=1))
+    for engine in shards.engines:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DELETE FROM queue WHERE tg_user_id > {TG_BASE}"))
+            for table in _TABLES.split(", "):
+                await conn.execute(text(f"DELETE FROM {table} WHERE tg_user_id > {TG_BASE}"))
+    await shards.dispose()
+
+
+def worker(urls: list[str], index: int, args, results) -> None:
+    async def session_ops(shards: ShardSet, tg_user_id: int) -> int:
+        async with shards.sessions() as sessions:
+            repo = ShardedUserRepository(sessions)
+            await repo.set_queue(tg_user_id, QUEUE)
+            for _ in range(5):
+                await repo.move_next(tg_user_id)
+            await repo.add_favorite(tg_user_id, QUEUE[1])
+            await repo.add_blacklist(tg_user_id, QUEUE[2])
+        return 8
+
+    async def main() -> None:
+        per_shard = max(args.concurrency // len(urls), 1) + 1
+        shards = ShardSet(urls, PoolSettings(pool_size=per_shard, max_overflow=args.concurrency))
+        ops = 0
+        deadline = time.monotonic() + args.seconds
+
+        async def client(n: int) -> None:
+            nonlocal ops
+            user = 0
+            while time.monotonic() < deadline:
+                user += 1
+                tg = TG_BASE + 1 + (index * args.concurrency + n) * 100_000 + user
+                ops += await session_ops(shards, tg)
+
+        await asyncio.gather(*(client(n) for n in range(args.concurrency)))
+        await shards.dispose()
+        results.put(ops)
+
+    asyncio.run(main())
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--shards", default="1,2,3")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=8)
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.shards.split(",")]
+    all_urls = await bench_urls(max(counts))
+    ctx = multiprocessing.get_context("spawn")
+    baseline = None
+
+    try:
+        for count in counts:
+            urls = all_urls[:count]
+            await clean(all_urls)
+            results = ctx.Queue()
+            procs = [
+                ctx.Process(target=worker, args=(urls, i, args, results))
+                for i in range(args.processes)
+            ]
+            started = time.perf_counter()
+            for proc in procs:
+                proc.start()
+            ops = sum(results.get() for _ in procs)
+            for proc in procs:
+                proc.join()
+            wall = time.perf_counter() - started
+
+            rate = ops / args.seconds
+            baseline = baseline or rate
+            print(
+                f"shards={count:<2} write calls={ops:<7} {rate:8.0f} calls/s "
+                f"x{rate / baseline:.2f}  (wall {wall:.1f}s)"
+            )
+    finally:
+        await clean(all_urls)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
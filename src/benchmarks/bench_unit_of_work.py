@@ -0,0 +1,84 @@
+"""
+Коммиты на одно Telegram-обновление и пропускная способность
+при N параллельных пользователях: автокоммит против repo.transaction().
+
+Обновление = upsert_profile + set_photos + add_favorite + move_next.
+
+Запуск: python -m src.benchmarks.bench_unit_of_work
+"""
+import asyncio
+import time
+
+from sqlalchemy import event
+
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import PhotoDTO, ProfileDTO
+from src.infrastructure.db.session import SessionLocal, engine
+
+BASE_TG = 900_100_000
+BASE_VK = 900_100_000
+USERS = 20
+UPDATES_PER_USER = 25
+
+
+async def handle_update(repo: PostgresUserRepository, tg_user_id: int, n: int) -> None:
+    vk_id = BASE_VK + tg_user_id % 1000 * 1000 + n
+    await repo.upsert_profile(ProfileDTO(vk_id, "Имя", "Фамилия", f"id{vk_id}"))
+    await repo.set_photos(vk_id, [PhotoDTO(1, vk_id, "https://vk.test/1.jpg", 0)])
+    await repo.add_favorite(tg_user_id, vk_id)
+    await repo.move_next(tg_user_id)
+
+
+async def run_user(tg_user_id: int, batched: bool) -> None:
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        for n in range(UPDATES_PER_USER):
+            if batched:
+                async with repo.transaction():
+                    await handle_update(repo, tg_user_id, n)
+            else:
+                await handle_update(repo, tg_user_id, n)
+
+
+async def prepare() -> None:
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        for i in range(USERS):
+            tg_user_id = BASE_TG + i
+            for vk_id in await repo.list_favorites(tg_user_id):
+                await repo.remove_favorite(tg_user_id, vk_id)
+            await repo.set_queue(tg_user_id, list(range(UPDATES_PER_USER + 1)))
+
+
+async def run(batched: bool) -> None:
+    await prepare()
+
+    commits = 0
+
+    def on_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    event.listen(engine.sync_engine, "commit", on_commit)
+    started = time.perf_counter()
+    await asyncio.gather(*(run_user(BASE_TG + i, batched) for i in range(USERS)))
+    elapsed = time.perf_counter() - started
+    event.remove(engine.sync_engine, "commit", on_commit)
+
+    updates = USERS * UPDATES_PER_USER
+    label = "transaction()" if batched else "autocommit"
+    print(
+        f"{label:<14} users={USERS} updates={updates} "
+        f"commits/update={commits / updates:.2f} "
+        f"throughput={updates / elapsed:.1f} updates/s"
+    )
+
+
+async def main() -> None:
+    await run(batched=False)
+    await run(batched=True)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
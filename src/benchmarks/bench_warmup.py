@@ -0,0 +1,46 @@
+"""
+Латентность первых запросов после старта: холодный пул против warm_up().
+
+Запуск: python -m src.benchmarks.bench_warmup
+"""
+import asyncio
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.benchmarks.common import print_row
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.session import DATABASE_URL, create_engine, pool_status, settings
+from src.infrastructure.db.warmup import warm_up
+
+CONCURRENT = 5
+
+
+async def first_requests(warm: bool) -> None:
+    engine = create_engine(DATABASE_URL, settings)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    if warm:
+        await warm_up(engine, CONCURRENT)
+
+    async def request() -> float:
+        started = time.perf_counter()
+        async with sessions() as session:
+            repo = PostgresUserRepository(session)
+            await repo.get_current_vk_id(1)
+            await repo.get_cards([1, 2, 3])
+        return (time.perf_counter() - started) * 1000
+
+    samples = await asyncio.gather(*(request() for _ in range(CONCURRENT)))
+    print_row("warm pool" if warm else "cold pool", list(samples))
+    print(f"{'':<40} {pool_status(engine)}")
+    await engine.dispose()
+
+
+async def main() -> None:
+    await first_requests(warm=False)
+    await first_requests(warm=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Показ следующих карточек: get_current_vk_id + get_profile + get_photos
+на каждую карточку против одного get_window. Считаются запросы и время.
+
+Запуск: python -m src.benchmarks.bench_window
+"""
+import asyncio
+
+from sqlalchemy import event
+
+from src.benchmarks.common import measure, print_row
+from src.infrastructure.db.repositories.factory import QUEUE_STORAGES
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import PhotoDTO, ProfileDTO
+from src.infrastructure.db.session import SessionLocal, engine
+
+TG_USER_ID = 900_000_014
+BASE_VK = 900_014_000
+QUEUE_SIZE = 100
+AHEAD = 3
+REPEAT = 200
+
+
+async def per_card(repo: PostgresUserRepository) -> None:
+    # как обработчик делает сейчас: карточка за карточкой
+    queue = await repo.get_queue(TG_USER_ID)
+    cursor = await repo.get_cursor(TG_USER_ID)
+    for vk_id in queue[cursor:cursor + AHEAD + 1]:
+        await repo.get_profile(vk_id)
+        await repo.get_photos(vk_id)
+
+
+async def windowed(repo: PostgresUserRepository) -> None:
+    await repo.get_window(TG_USER_ID, ahead=AHEAD)
+
+
+async def seed(repo: PostgresUserRepository) -> None:
+    vk_ids = list(range(BASE_VK, BASE_VK + QUEUE_SIZE))
+    async with repo.transaction():
+        await repo.upsert_profiles(
+            [ProfileDTO(vk_id, "Имя", "Фамилия", f"id{vk_id}") for vk_id in vk_ids]
+        )
+        for vk_id in vk_ids:
+            await repo.set_photos(vk_id, [
+                PhotoDTO(n, vk_id, f"https://vk.test/{vk_id}_{n}.jpg", n)
+                for n in range(3)
+            ])
+    await repo.set_queue(TG_USER_ID, vk_ids)
+    await repo.set_cursor(TG_USER_ID, QUEUE_SIZE // 2)
+
+
+async def main() -> None:
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    for storage, repo_cls in QUEUE_STORAGES.items():
+        async with SessionLocal() as session:
+            repo = repo_cls(session)
+            await seed(repo)
+
+            for name, fetch in (("per card", per_card), ("get_window", windowed)):
+                event.listen(engine.sync_engine, "before_cursor_execute", count)
+                statements = 0
+                samples = await measure(lambda: fetch(repo), REPEAT)
+                event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+                print_row(f"[{storage}] {name}, {AHEAD + 1} cards", samples)
+                print(f"{'':<40} round trips per fetch: {statements // REPEAT}")
+
+            await repo.set_queue(TG_USER_ID, [])
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+import statistics
+import time
+from typing import Awaitable, Callable
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def measure(
+    fn: Callable[[], Awaitable[object]], repeat: int
+) -> list[float]:
+    """Выполняет fn() repeat раз и возвращает длительности в миллисекундах."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summary(samples: list[float]) -> dict:
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+    }
+
+
+def print_row(name: str, samples: list[float]) -> None:
+    s = summary(samples)
+    print(
+        f"{name:<40} n={s['n']:<5} mean={s['mean_ms']:>9.3f}ms "
+        f"p50={s['p50_ms']:>9.3f}ms p95={s['p95_ms']:>9.3f}ms"
+    )
@@ -0,0 +1,286 @@
+"""
+Нагрузочный прогон слоя репозитория: N параллельных asyncio-"пользователей"
+выполняют смесь move_next / get_profile / get_photos / add_favorite / set_queue
+против локального Postgres.
+
+Запуск:
+    python -m src.benchmarks.load --users 1000 --concurrency 50 --duration 30 \\
+        --output load.json [--compare previous.json]
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import text
+
+from src.benchmarks.common import summary
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.session import SessionLocal, engine, pool_status
+
+# seed() удаляет и создаёт заново строки только в диапазонах
+# TG_BASE + 1 .. TG_BASE + users и VK_BASE + 1 .. VK_BASE + profiles;
+# данные с такими id в базе прогона будут потеряны
+TG_BASE = 800_000_000
+VK_BASE = 800_000_000
+
+DEFAULT_MIX = "move_next=50,get_profile=20,get_photos=20,add_favorite=8,set_queue=2"
+
+
+@dataclass
+class LoadConfig:
+    users: int = 1_000
+    profiles: int = 20_000
+    photos_per_profile: int = 3
+    queue_size: int = 200
+    concurrency: int = 50
+    duration: float = 30.0
+    mix: str = DEFAULT_MIX
+    seed: int = 42
+    skip_seed: bool = False
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        weights[name.strip()] = int(weight)
+    return weights
+
+
+async def seed(config: LoadConfig) -> None:
+    params = {
+        "tg_base": TG_BASE,
+        "vk_base": VK_BASE,
+        "users": config.users,
+        "profiles": config.profiles,
+        "photos": config.photos_per_profile,
+        "queue": config.queue_size,
+    }
+    statements = [
+        "DELETE FROM queue WHERE tg_user_id BETWEEN :tg_base + 1 AND :tg_base + :users",
+        "DELETE FROM queue_packed WHERE tg_user_id BETWEEN :tg_base + 1 AND :tg_base + :users",
+        "DELETE FROM seen_profiles WHERE tg_user_id BETWEEN :tg_base + 1 AND :tg_base + :users",
+        "DELETE FROM favorites WHERE tg_user_id BETWEEN :tg_base + 1 AND :tg_base + :users",
+        "DELETE FROM blacklist WHERE tg_user_id BETWEEN :tg_base + 1 AND :tg_base + :users",
+        "DELETE FROM users WHERE tg_user_id BETWEEN :tg_base + 1 AND :tg_base + :users",
+        "DELETE FROM photos WHERE vk_user_id BETWEEN :vk_base + 1 AND :vk_base + :profiles",
+        "DELETE FROM profiles WHERE vk_user_id BETWEEN :vk_base + 1 AND :vk_base + :profiles",
+        """
+        INSERT INTO users (tg_user_id, history_cursor)
+        SELECT :tg_base + g, 0 FROM generate_series(1, :users) g
+        """,
+        """
+        INSERT INTO profiles (vk_user_id, first_name, last_name, domain)
+        SELECT :vk_base + g, 'Имя' || g, 'Фамилия' || g, 'id' || g
+        FROM generate_series(1, :profiles) g
+        """,
+        """
+        INSERT INTO photos (vk_user_id, photo_id, owner_id, url, likes_count)
+        SELECT :vk_base + g, n, :vk_base + g,
+               'https://vk.test/' || g || '_' || n || '.jpg', n
+        FROM generate_series(1, :profiles) g, generate_series(1, :photos) n
+        """,
+        """
+        INSERT INTO queue (tg_user_id, vk_profile_id, position)
+        SELECT :tg_base + u,
+               :vk_base + 1 + (u * 7919 + p) % :profiles,
+               p
+        FROM generate_series(1, :users) u, generate_series(0, :queue - 1) p
+        """,
+        "ANALYZE",
+    ]
+
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        for sql in statements:
+            await conn.execute(text(sql), params)
+    print(f"seeded in {time.perf_counter() - started:.1f}s")
+
+
+class Worker:
+    def __init__(self, config: LoadConfig, rnd: random.Random, samples: dict):
+        self.config = config
+        self.rnd = rnd
+        self.samples = samples
+        self.errors: dict[str, int] = defaultdict(int)
+        self.weights = parse_mix(config.mix)
+
+    def random_user(self) -> int:
+        return TG_BASE + self.rnd.randint(1, self.config.users)
+
+    def random_profile(self) -> int:
+        return VK_BASE + self.rnd.randint(1, self.config.profiles)
+
+    async def call(self, repo: PostgresUserRepository, name: str) -> None:
+        tg_user_id = self.random_user()
+
+        if name == "move_next":
+            if await repo.move_next(tg_user_id) is None:
+                await repo.set_cursor(tg_user_id, 0)
+        elif name == "get_profile":
+            await repo.get_profile(self.random_profile())
+        elif name == "get_photos":
+            await repo.get_photos(self.random_profile())
+        elif name == "add_favorite":
+            await repo.add_favorite(tg_user_id, self.random_profile())
+        elif name == "set_queue":
+            await repo.set_queue(
+                tg_user_id,
+                [self.random_profile() for _ in range(self.config.queue_size)],
+            )
+        else:
+            raise ValueError(f"unknown method in mix: {name}")
+
+    async def run(self, deadline: float) -> None:
+        names = list(self.weights)
+        weights = list(self.weights.values())
+
+        while time.perf_counter() < deadline:
+            name = self.rnd.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                # как в обработчике бота: своя сессия на каждое обновление
+                async with SessionLocal() as session:
+                    await self.call(PostgresUserRepository(session), name)
+            except Exception:
+                self.errors[name] += 1
+                continue
+            self.samples[name].append((time.perf_counter() - started) * 1000)
+
+
+async def run_load(config: LoadConfig) -> dict:
+    if not config.skip_seed:
+        await seed(config)
+
+    samples: dict[str, list[float]] = defaultdict(list)
+    workers = [
+        Worker(config, random.Random(config.seed + i), samples)
+        for i in range(config.concurrency)
+    ]
+
+    started = time.perf_counter()
+    deadline = started + config.duration
+    await asyncio.gather(*(w.run(deadline) for w in workers))
+    elapsed = time.perf_counter() - started
+
+    errors: dict[str, int] = defaultdict(int)
+    for w in workers:
+        for name, count in w.errors.items():
+            errors[name] += count
+
+    methods = {}
+    for name, values in sorted(samples.items()):
+        methods[name] = {
+            **summary(values),
+            "throughput_ops": round(len(values) / elapsed, 1),
+            "errors": errors.get(name, 0),
+        }
+
+    total = sum(len(v) for v in samples.values())
+    return {
+        "config": asdict(config),
+        "revision": _git_revision(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "elapsed_s": round(elapsed, 2),
+        "total_ops": total,
+        "throughput_ops": round(total / elapsed, 1),
+        "pool": pool_status(engine),
+        "methods": methods,
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict, baseline: dict | None = None) -> None:
+    print(
+        f"total: {report['total_ops']} ops in {report['elapsed_s']}s, "
+        f"{report['throughput_ops']} ops/s"
+    )
+    header = f"{'method':<14}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    if baseline:
+        header += f"{'Δp95':>10}{'Δops/s':>10}"
+    print(header)
+
+    for name, m in report["methods"].items():
+        line = (
+            f"{name:<14}{m['throughput_ops']:>10}{m['p50_ms']:>10}"
+            f"{m['p95_ms']:>10}{m['p99_ms']:>10}{m['errors']:>8}"
+        )
+        old = (baseline or {}).get("methods", {}).get(name)
+        if old:
+            line += (
+                f"{_delta(old['p95_ms'], m['p95_ms']):>10}"
+                f"{_delta(old['throughput_ops'], m['throughput_ops']):>10}"
+            )
+        print(line)
+
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def parse_args() -> tuple[LoadConfig, str | None, str | None]:
+    default = LoadConfig()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=default.users)
+    parser.add_argument("--profiles", type=int, default=default.profiles)
+    parser.add_argument("--photos-per-profile", type=int, default=default.photos_per_profile)
+    parser.add_argument("--queue-size", type=int, default=default.queue_size)
+    parser.add_argument("--concurrency", type=int, default=default.concurrency)
+    parser.add_argument("--duration", type=float, default=default.duration)
+    parser.add_argument("--mix", default=default.mix)
+    parser.add_argument("--seed", type=int, default=default.seed)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--output", help="куда сохранить результат в JSON")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    config = LoadConfig(
+        users=args.users,
+        profiles=args.profiles,
+        photos_per_profile=args.photos_per_profile,
+        queue_size=args.queue_size,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        mix=args.mix,
+        seed=args.seed,
+        skip_seed=args.skip_seed,
+    )
+    return config, args.output, args.compare
+
+
+async def main() -> None:
+    config, output, compare = parse_args()
+
+    report = await run_load(config)
+    await engine.dispose()
+
+    baseline = None
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
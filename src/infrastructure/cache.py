@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Ограниченный по числу записей LRU-кэш с TTL.
+
+    Рассчитан на один event loop: операции не содержат await,
+    поэтому между задачами asyncio атомарны.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+        # версии ключей: читатель запоминает version(key) (или tick для
+        # заранее неизвестных ключей) до загрузки и не кэширует результат,
+        # если ключ за это время инвалидировали. Хранится не больше
+        # max_entries последних версий; вытесненные поднимают порог _floor
+        self.tick = 0
+        self._floor = 0
+        self._versions: OrderedDict[Hashable, int] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+
+        if item is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = item
+        if expires_at <= self._clock():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Как get, но не считается в hits/misses и не двигает запись в LRU."""
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING or item[0] <= self._clock():
+            return default
+        return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (self._clock() + self.ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def version(self, key: Hashable) -> int:
+        """Номер последней инвалидации key (или clear), не больше tick."""
+        return self._versions.get(key, self._floor)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+        self.tick += 1
+        self._versions[key] = self.tick
+        self._versions.move_to_end(key)
+        if len(self._versions) > self.max_entries:
+            _, self._floor = self._versions.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._versions.clear()
+        self.tick += 1
+        self._floor = self.tick
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
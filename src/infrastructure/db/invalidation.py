@@ -0,0 +1,262 @@
+"""
+Межпроцессная инвалидация кэшей через LISTEN/NOTIFY.
+
+PostgresUserRepository при коммите записи, меняющей закэшированные
+данные, шлёт pg_notify в CHANNEL. Уведомление уходит только вместе с
+COMMIT (откат его отменяет), поэтому пришедшее событие всегда значит,
+что новые данные уже видны. InvalidationListener в каждом процессе
+слушает канал и сбрасывает ключи в своих TTLCache.
+
+Уведомление приходит только слушателям той базы, где был COMMIT. При
+шардировании каждый шард шлёт свои, поэтому listener слушает все шарды
+сразу: InvalidationListener(shards.asyncpg_dsns(), caches).
+
+Payload - "@<origin>;u:1,2;p:10;ph:10;e:1": процесс-источник и вид ключа
+с id через запятую, до MAX_PAYLOAD байт на уведомление. Свои события
+listener пропускает: CachedUserRepository уже обновил кэш этого процесса
+на месте, и сброс заставил бы перечитать его из БД.
+"""
+import asyncio
+import logging
+import os
+import secrets
+import time
+from typing import Callable, Iterable, Optional, Sequence, Union
+
+import asyncpg
+
+from src.infrastructure.cache import TTLCache
+from src.infrastructure.db.repositories.cached_repo import (
+    excluded_key, photos_key, profile_key, user_key,
+)
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "vkt_invalidate"
+# соединение listener'а видно в pg_stat_activity под этим именем
+APPLICATION_NAME = "vkt-cache-invalidation"
+
+# предел pg_notify - 8000 байт, с запасом
+MAX_PAYLOAD = 7_900
+
+USER = "u"
+PROFILE = "p"
+PHOTOS = "ph"
+# чёрный список и избранное пользователя (фильтр is_excluded_many)
+EXCLUDED = "e"
+
+# после fork у потомка другой pid - и другой origin
+_NONCE = secrets.token_hex(4)
+
+_KEYS = {
+    USER: user_key,
+    PROFILE: profile_key,
+    PHOTOS: photos_key,
+    EXCLUDED: excluded_key,
+}
+
+
+def origin() -> str:
+    """Id текущего процесса в payload."""
+    return f"{_NONCE}.{os.getpid()}"
+
+
+def encode(invalidations: dict[str, Iterable[int]], source: Optional[str] = None) -> list[str]:
+    """{вид: id} -> payload'ы не длиннее MAX_PAYLOAD, каждый с "@source" в начале."""
+    head = f"@{source}" if source else ""
+    payloads: list[str] = []
+    payload = head
+    for kind, ids in invalidations.items():
+        opened = False
+        for vk_id in sorted(ids):
+            item = f",{vk_id}" if opened else f"{';' if payload else ''}{kind}:{vk_id}"
+            if len(payload) + len(item) > MAX_PAYLOAD:
+                payloads.append(payload)
+                payload = head
+                item = f"{';' if payload else ''}{kind}:{vk_id}"
+            payload += item
+            opened = True
+    if payload != head:
+        payloads.append(payload)
+    return payloads
+
+
+def source_of(payload: str) -> Optional[str]:
+    """Origin из payload или None, если его нет."""
+    if not payload.startswith("@"):
+        return None
+    return payload[1:].partition(";")[0]
+
+
+def decode(payload: str) -> list[tuple]:
+    """Payload -> ключи кэша; origin и неизвестные виды пропускаются."""
+    keys = []
+    for part in payload.split(";"):
+        kind, _, ids = part.partition(":")
+        key = _KEYS.get(kind)
+        if key is None or not ids:
+            continue
+        keys.extend(key(int(vk_id)) for vk_id in ids.split(","))
+    return keys
+
+
+def asyncpg_dsn(url) -> str:
+    """URL SQLAlchemy (postgresql+asyncpg://...) -> DSN для asyncpg.connect."""
+    from sqlalchemy.engine import make_url
+
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class InvalidationListener:
+    """
+    Фоновая задача: держит отдельное соединение с LISTEN CHANNEL к каждой
+    базе из dsn (один DSN или список - по одному на шард) и сбрасывает
+    ключи из уведомлений во всех caches.
+
+    Соединение проверяется запросом раз в ping_interval; при обрыве
+    listener переподключается с экспоненциальной задержкой. Пока он не
+    слушал, уведомления терялись - поэтому после каждого обрыва и
+    повторного LISTEN кэши очищаются целиком (обрыв любого шарда
+    очищает всё: его записи могли задеть любой ключ).
+
+    skip_own=True пропускает уведомления этого же процесса: его записи
+    через CachedUserRepository уже сбросили или обновили ключи. Процесс,
+    который пишет в те же данные мимо CachedUserRepository, создаёт
+    listener с skip_own=False.
+    """
+
+    def __init__(
+        self,
+        dsn: Union[str, Sequence[str]],
+        caches: Iterable[TTLCache],
+        channel: str = CHANNEL,
+        ping_interval: float = 10.0,
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+        on_event: Optional[Callable[[str], None]] = None,
+        skip_own: bool = True,
+    ):
+        self.dsns = [dsn] if isinstance(dsn, str) else list(dsn)
+        if not self.dsns:
+            raise ValueError("at least one dsn is required")
+        self.caches = list(caches)
+        self.channel = channel
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.on_event = on_event
+        self.skip_own = skip_own
+
+        self.events = 0
+        self.skipped = 0
+        self.evicted = 0
+        self.reconnects = 0
+        self.last_event_at: Optional[float] = None
+
+        self._tasks: list[asyncio.Task] = []
+        # по событию на каждый DSN: слушает ли его соединение
+        self._listening = [asyncio.Event() for _ in self.dsns]
+
+    @property
+    def listening(self) -> bool:
+        """Слушаются все базы."""
+        return all(event.is_set() for event in self._listening)
+
+    def start(self) -> "InvalidationListener":
+        if not self._tasks or any(task.done() for task in self._tasks):
+            self._cancel()
+            self._tasks = [
+                asyncio.create_task(self._run(i), name=f"cache-invalidation-{i}")
+                for i in range(len(self.dsns))
+            ]
+        return self
+
+    async def wait_listening(self, timeout: Optional[float] = None) -> None:
+        await asyncio.wait_for(
+            asyncio.gather(*(event.wait() for event in self._listening)), timeout
+        )
+
+    async def stop(self) -> None:
+        tasks = self._cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "listening": self.listening,
+            "events": self.events,
+            "skipped": self.skipped,
+            "evicted": self.evicted,
+            "reconnects": self.reconnects,
+        }
+
+    # ================= INTERNAL =================
+
+    def _cancel(self) -> list[asyncio.Task]:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        return tasks
+
+    async def _run(self, index: int) -> None:
+        listening = self._listening[index]
+        delay = self.reconnect_delay
+        connected_before = False
+        while True:
+            try:
+                conn = await asyncpg.connect(
+                    self.dsns[index], server_settings={"application_name": APPLICATION_NAME}
+                )
+            except Exception as exc:
+                log.warning("invalidation listener: connect to #%d failed: %r", index, exc)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _: lost.set())
+            try:
+                await conn.add_listener(self.channel, self._notified)
+                if connected_before:
+                    self.reconnects += 1
+                    self._clear()
+                connected_before = True
+                delay = self.reconnect_delay
+                listening.set()
+
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.ping_interval)
+                    except asyncio.TimeoutError:
+                        # полуоткрытое TCP-соединение само не закрывается
+                        await asyncio.wait_for(conn.fetchval("SELECT 1"), self.ping_interval)
+            except Exception as exc:
+                # listener не должен умереть молча: кэши остались бы без инвалидации
+                log.warning("invalidation listener: connection #%d lost: %r", index, exc)
+            finally:
+                listening.clear()
+                # ключи, изменённые до переподключения, уже не придут
+                self._clear()
+                conn.terminate()
+
+            await asyncio.sleep(delay)
+
+    def _notified(self, connection, pid, channel, payload: str) -> None:
+        if self.skip_own and source_of(payload) == origin():
+            self.skipped += 1
+            return
+        self.events += 1
+        self.last_event_at = time.monotonic()
+        for key in decode(payload):
+            for cache in self.caches:
+                cache.invalidate(key)
+            self.evicted += 1
+        if self.on_event is not None:
+            self.on_event(payload)
+
+    def _clear(self) -> None:
+        for cache in self.caches:
+            cache.clear()
@@ -0,0 +1,177 @@
+import bisect
+import time
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+# границы бакетов гистограммы латентности, секунды
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+class MethodStats:
+    __slots__ = ("calls", "errors", "seconds", "buckets", "statements", "rows")
+
+    def __init__(self, bucket_count: int):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        # последний бакет - всё, что больше верхней границы (+Inf)
+        self.buckets = [0] * (bucket_count + 1)
+        self.statements = 0
+        self.rows = 0
+
+
+# метод репозитория, который сейчас выполняется в этой asyncio-задаче;
+# SQLAlchemy переносит контекст в greenlet, поэтому он виден в событиях
+_current: ContextVar[Optional[MethodStats]] = ContextVar(
+    "repository_method", default=None
+)
+
+
+class _Tracking:
+    # обычный класс вместо @contextmanager: обёртка стоит на горячем пути
+    __slots__ = ("bounds", "stats", "token", "started")
+
+    def __init__(self, bounds: tuple[float, ...], stats: MethodStats):
+        self.bounds = bounds
+        self.stats = stats
+
+    def __enter__(self) -> None:
+        self.token = _current.set(self.stats)
+        self.started = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.started
+        _current.reset(self.token)
+        _record(self.bounds, self.stats, elapsed, exc_type is not None)
+
+
+def _record(bounds: tuple[float, ...], stats: MethodStats, elapsed: float, failed: bool) -> None:
+    stats.calls += 1
+    stats.seconds += elapsed
+    stats.buckets[bisect.bisect_left(bounds, elapsed)] += 1
+    if failed:
+        stats.errors += 1
+
+
+class RepositoryMetrics:
+    """
+    Счётчики вызовов, гистограмма латентности, число SQL-запросов
+    и возвращённых строк по каждому методу репозитория.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bucket_bounds = tuple(buckets)
+        self._methods: dict[str, MethodStats] = {}
+
+    # ================= СБОР =================
+
+    def attach(self, engine: AsyncEngine) -> None:
+        event.listen(engine.sync_engine, "after_cursor_execute", self._on_execute)
+
+    def detach(self, engine: AsyncEngine) -> None:
+        event.remove(engine.sync_engine, "after_cursor_execute", self._on_execute)
+
+    def track(self, method: str) -> "_Tracking":
+        return _Tracking(self.bucket_bounds, self._stats(method))
+
+    async def track_stream(self, method: str, stream: AsyncIterator) -> AsyncIterator:
+        """
+        Поток (async-генератор) считается одним вызовом от открытия до
+        конца. Метод выставляется в контекст только на время чтения
+        следующего элемента: запросы, которые делает потребитель между
+        элементами, ему не приписываются.
+        """
+        stats = self._stats(method)
+        started = time.perf_counter()
+        failed = False
+        try:
+            while True:
+                token = _current.set(stats)
+                try:
+                    item = await stream.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _current.reset(token)
+                yield item
+        except GeneratorExit:
+            # потребитель закрыл поток раньше конца - это не ошибка
+            raise
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            await stream.aclose()
+            _record(self.bucket_bounds, stats, time.perf_counter() - started, failed)
+
+    def _stats(self, method: str) -> MethodStats:
+        stats = self._methods.get(method)
+        if stats is None:
+            stats = self._methods[method] = MethodStats(len(self.bucket_bounds))
+        return stats
+
+    @staticmethod
+    def _on_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        stats = _current.get()
+        if stats is None:
+            return
+        stats.statements += 1
+        if cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+
+    def reset(self) -> None:
+        self._methods.clear()
+
+    # ================= ЧТЕНИЕ =================
+
+    def snapshot(self) -> dict[str, dict]:
+        result = {}
+        for name, s in sorted(self._methods.items()):
+            result[name] = {
+                "calls": s.calls,
+                "errors": s.errors,
+                "seconds_total": s.seconds,
+                "seconds_avg": s.seconds / s.calls if s.calls else 0.0,
+                "statements": s.statements,
+                "statements_per_call": s.statements / s.calls if s.calls else 0.0,
+                "rows": s.rows,
+                "latency_buckets": dict(
+                    zip([*map(str, self.bucket_bounds), "+Inf"], s.buckets)
+                ),
+            }
+        return result
+
+    def render_prometheus(self, prefix: str = "vkt_repository") -> str:
+        counters = (
+            ("calls_total", "Repository method calls.", "calls"),
+            ("errors_total", "Repository method calls that raised.", "errors"),
+            ("statements_total", "SQL statements executed by the method.", "statements"),
+            ("rows_total", "Rows returned or affected by the method's SQL.", "rows"),
+        )
+        items = sorted(self._methods.items())
+        lines = []
+
+        for suffix, help_text, attr in counters:
+            lines.append(f"# HELP {prefix}_{suffix} {help_text}")
+            lines.append(f"# TYPE {prefix}_{suffix} counter")
+            for name, s in items:
+                lines.append(f'{prefix}_{suffix}{{method="{name}"}} {getattr(s, attr)}')
+
+        metric = f"{prefix}_latency_seconds"
+        lines.append(f"# HELP {metric} Repository method latency.")
+        lines.append(f"# TYPE {metric} histogram")
+        for name, s in items:
+            cumulative = 0
+            for bound, count in zip([*map(str, self.bucket_bounds), "+Inf"], s.buckets):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{method="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{method="{name}"}} {s.seconds}')
+            lines.append(f'{metric}_count{{method="{name}"}} {s.calls}')
+
+        return "\n".join(lines) + "\n"
@@ -1,4 +1,7 @@
-from sqlalchemy import Integer, String, ForeignKey, UniqueConstraint
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, String, ForeignKey, UniqueConstraint, Index, text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -24,6 +27,13 @@ class User(Base):
 
     history_cursor: Mapped[int] = mapped_column(Integer, default=0)
 
+    # последний свайп или изменение настроек; по нему src/scripts/retention.py
+    # чистит данные брошенных аккаунтов. Без индекса: колонка меняется на
+    # каждом свайпе, индекс сделал бы эти UPDATE не-HOT
+    last_active_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True, server_default=text("now()")
+    )
+
 
 # ================= QUEUE =================
 
@@ -38,6 +48,22 @@ class QueueItem(Base):
     vk_profile_id: Mapped[int] = mapped_column(Integer)
     position: Mapped[int] = mapped_column(Integer)
 
+    __table_args__ = (
+        Index("ix_queue_tg_user_id_position", "tg_user_id", "position"),
+        Index("ix_queue_tg_user_id_vk_profile_id", "tg_user_id", "vk_profile_id"),
+    )
+
+
+class PackedQueue(Base):
+    __tablename__ = "queue_packed"
+
+    tg_user_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("users.tg_user_id"),
+        primary_key=True,
+    )
+    vk_ids: Mapped[list[int]] = mapped_column(ARRAY(Integer), default=list)
+
 
 # ================= FAVORITES =================
 
@@ -50,6 +76,8 @@ class FavoriteProfile(Base):
 
     __table_args__ = (
         UniqueConstraint("tg_user_id", "vk_profile_id"),
+        # постраничное чтение и поток избранного: WHERE tg_user_id ORDER BY id
+        Index("ix_favorites_tg_user_id_id", "tg_user_id", "id"),
     )
 
 
@@ -62,6 +90,24 @@ class Blacklist(Base):
     tg_user_id: Mapped[int] = mapped_column(Integer)
     vk_profile_id: Mapped[int] = mapped_column(Integer)
 
+    __table_args__ = (
+        Index(
+            "uq_blacklist_tg_user_id_vk_profile_id",
+            "tg_user_id",
+            "vk_profile_id",
+            unique=True,
+        ),
+    )
+
+
+# ================= SEEN =================
+
+class SeenProfile(Base):
+    __tablename__ = "seen_profiles"
+
+    tg_user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    vk_profile_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
 
 # ================= PROFILES =================
 
@@ -74,6 +120,15 @@ class Profile(Base):
     domain: Mapped[str] = mapped_column(String)
 
 
+class PhotoStatus:
+    # photos.status: скачивание в локальный кэш (src/infrastructure/photos)
+    PENDING = "pending"
+    # взято воркером (claimed_by) до lease_until
+    CLAIMED = "claimed"
+    DONE = "done"
+    FAILED = "failed"
+
+
 class Photo(Base):
     __tablename__ = "photos"
 
@@ -89,4 +144,35 @@ class Photo(Base):
     likes_count: Mapped[int] = mapped_column(Integer)
 
     local_path: Mapped[str | None] = mapped_column(String, nullable=True)
-    status: Mapped[str | None] = mapped_column(String, nullable=True)
\ No newline at end of file
+    status: Mapped[str | None] = mapped_column(
+        String, nullable=True, server_default=PhotoStatus.PENDING
+    )
+
+    claimed_by: Mapped[str | None] = mapped_column(String, nullable=True)
+    lease_until: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_photos_vk_user_id", "vk_user_id"),
+        # очередь скачивания: claim_pending_photos идёт по нему в порядке id
+        Index(
+            "ix_photos_pending",
+            "id",
+            postgresql_where=text("status = 'pending'"),
+        ),
+        # возврат в очередь строк упавших воркеров (истёкший lease)
+        Index(
+            "ix_photos_claimed_lease_until",
+            "lease_until",
+            postgresql_where=text("status = 'claimed'"),
+        ),
+        # сброс строк по вытесненным из кэша файлам
+        Index(
+            "ix_photos_local_path",
+            "local_path",
+            postgresql_where=text("local_path IS NOT NULL"),
+        ),
+    )
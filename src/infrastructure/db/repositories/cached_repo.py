@@ -0,0 +1,361 @@
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from src.infrastructure.cache import TTLCache
+from src.infrastructure.db.repositories.delegating_repo import DelegatingUserRepository
+from src.infrastructure.db.repositories.interfaces import UserRepository
+from src.infrastructure.db.schemas.dto import (
+    UserDTO, ProfileDTO, PhotoDTO, PhotoJobDTO, CardDTO, QueueWindowDTO,
+)
+from src.infrastructure.sorted_ids import SortedIdSet
+
+
+_MISSING = object()
+
+
+def user_key(tg_user_id: int) -> tuple:
+    return ("user", tg_user_id)
+
+
+def profile_key(vk_user_id: int) -> tuple:
+    return ("profile", vk_user_id)
+
+
+def photos_key(vk_user_id: int) -> tuple:
+    return ("photos", vk_user_id)
+
+
+def excluded_key(tg_user_id: int) -> tuple:
+    return ("excluded", tg_user_id)
+
+
+@dataclass(slots=True)
+class _Exclusions:
+    # раздельно: remove_favorite не должен снимать запрет чёрного списка
+    blacklist: SortedIdSet
+    favorites: SortedIdSet
+
+    def intersection(self, vk_ids: List[int]) -> Set[int]:
+        candidates = set(vk_ids)
+        return self.blacklist.intersection(candidates) | self.favorites.intersection(candidates)
+
+
+class CachedUserRepository(DelegatingUserRepository):
+    """
+    Read-through кэш для get_or_create_user, get_profile и get_photos.
+
+    is_excluded_many отвечает по фильтру пользователя: чёрный список и
+    избранное в отсортированных массивах, загружаются при первой проверке
+    и дальше обновляются на месте записями add_blacklist, add_favorite и
+    remove_favorite этого процесса. Записи других процессов сбрасывают
+    фильтр через InvalidationListener; свои уведомления он пропускает,
+    поэтому фильтр после своей записи не перечитывается.
+
+    Записи, прошедшие через этот репозиторий, точечно инвалидируют ключи.
+    Один TTLCache можно разделить между репозиториями разных сессий;
+    записи других процессов сбрасывает InvalidationListener.
+    Возвращаемые DTO общие с кэшем - их нельзя менять на месте.
+    """
+
+    def __init__(self, inner: UserRepository, cache: Optional[TTLCache] = None):
+        super().__init__(inner)
+        self.cache = cache if cache is not None else TTLCache()
+        # ключи, изменённые в открытом transaction(); None - блока нет
+        self._pending: Optional[set] = None
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+    # ================= UNIT OF WORK =================
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["CachedUserRepository"]:
+        if self._pending is not None:
+            yield self
+            return
+
+        self._pending = set()
+        try:
+            async with self.inner.transaction():
+                yield self
+        finally:
+            # пока блок был открыт, другие задачи могли положить в кэш
+            # ещё не изменённые данные - сбрасываем ключи повторно
+            pending, self._pending = self._pending, None
+            for key in pending:
+                self.cache.invalidate(key)
+
+    # ================= USERS =================
+
+    async def get_or_create_user(self, tg_user_id: int) -> UserDTO:
+        return await self._read_through(
+            user_key(tg_user_id),
+            lambda: self.inner.get_or_create_user(tg_user_id),
+        )
+
+    async def upsert_user_token_and_vk_id(
+        self, tg_user_id: int, vk_access_token: str, vk_user_id: int
+    ) -> None:
+        await self.inner.upsert_user_token_and_vk_id(
+            tg_user_id, vk_access_token, vk_user_id
+        )
+        self._invalidate(user_key(tg_user_id))
+
+    async def update_filters(
+        self,
+        tg_user_id: int,
+        city: str,
+        gender: int,
+        age_from: int,
+        age_to: int,
+        city_id: Optional[int] = None,
+    ) -> None:
+        await self.inner.update_filters(
+            tg_user_id, city, gender, age_from, age_to, city_id
+        )
+        self._invalidate(user_key(tg_user_id))
+
+    # history_cursor входит в UserDTO, поэтому сдвиг курсора тоже
+    # сбрасывает закэшированного пользователя
+
+    async def set_cursor(self, tg_user_id: int, cursor: int) -> None:
+        await self.inner.set_cursor(tg_user_id, cursor)
+        self._invalidate(user_key(tg_user_id))
+
+    async def set_queue(
+        self, tg_user_id: int, vk_ids: List[int], exclude_known: bool = False
+    ) -> int:
+        size = await self.inner.set_queue(tg_user_id, vk_ids, exclude_known)
+        self._invalidate(user_key(tg_user_id))
+        return size
+
+    async def move_next(self, tg_user_id: int) -> Optional[int]:
+        vk_id = await self.inner.move_next(tg_user_id)
+        self._invalidate(user_key(tg_user_id))
+        return vk_id
+
+    async def move_prev(self, tg_user_id: int) -> Optional[int]:
+        vk_id = await self.inner.move_prev(tg_user_id)
+        self._invalidate(user_key(tg_user_id))
+        return vk_id
+
+    async def get_window(
+        self, tg_user_id: int, ahead: int = 3, behind: int = 0
+    ) -> QueueWindowDTO:
+        # окно не кэшируется (курсор двигается на каждом свайпе), но его
+        # профили и фото прогревают кэш для следующих get_profile/get_photos
+        tick = self.cache.tick
+        window = await self.inner.get_window(tg_user_id, ahead, behind)
+
+        if self._pending is None:
+            for card in window.cards:
+                profile, photos = profile_key(card.vk_user_id), photos_key(card.vk_user_id)
+                if (
+                    card.profile is not None
+                    and self.cache.version(profile) <= tick
+                    and self.cache.version(photos) <= tick
+                ):
+                    self.cache.set(profile, card.profile)
+                    self.cache.set(photos, list(card.photos))
+
+        return window
+
+    # ================= FAVORITES =================
+
+    async def add_favorite(self, tg_user_id: int, vk_profile_id: int) -> None:
+        await self.inner.add_favorite(tg_user_id, vk_profile_id)
+        self._update_exclusions(tg_user_id, lambda e: e.favorites.add(vk_profile_id))
+
+    async def add_favorites_many(self, tg_user_id: int, vk_profile_ids: List[int]) -> None:
+        await self.inner.add_favorites_many(tg_user_id, vk_profile_ids)
+        self._update_exclusions(tg_user_id, lambda e: e.favorites.update(vk_profile_ids))
+
+    async def remove_favorite(self, tg_user_id: int, vk_profile_id: int) -> None:
+        await self.inner.remove_favorite(tg_user_id, vk_profile_id)
+        self._update_exclusions(tg_user_id, lambda e: e.favorites.discard(vk_profile_id))
+
+    # ================= BLACKLIST =================
+
+    async def add_blacklist(self, tg_user_id: int, vk_profile_id: int) -> None:
+        await self.inner.add_blacklist(tg_user_id, vk_profile_id)
+        self._update_exclusions(tg_user_id, lambda e: e.blacklist.add(vk_profile_id))
+
+    async def add_blacklist_many(self, tg_user_id: int, vk_profile_ids: List[int]) -> None:
+        await self.inner.add_blacklist_many(tg_user_id, vk_profile_ids)
+        self._update_exclusions(tg_user_id, lambda e: e.blacklist.update(vk_profile_ids))
+
+    async def is_excluded_many(self, tg_user_id: int, vk_ids: List[int]) -> Set[int]:
+        if not vk_ids:
+            return set()
+        exclusions = self.cache.get(excluded_key(tg_user_id), _MISSING)
+        if exclusions is not _MISSING:
+            return exclusions.intersection(vk_ids)
+        if self._pending is not None:
+            # в транзакции фильтр не сохраняется - точечный запрос дешевле
+            return await self.inner.is_excluded_many(tg_user_id, vk_ids)
+        return (await self._load_exclusions(tg_user_id)).intersection(vk_ids)
+
+    # ================= PROFILES =================
+
+    async def upsert_profile(self, profile: ProfileDTO) -> None:
+        await self.inner.upsert_profile(profile)
+        self._invalidate(profile_key(profile.vk_user_id))
+
+    async def upsert_profiles(self, profiles: List[ProfileDTO]) -> None:
+        await self.inner.upsert_profiles(profiles)
+        for profile in profiles:
+            self._invalidate(profile_key(profile.vk_user_id))
+
+    async def get_profile(self, vk_user_id: int) -> Optional[ProfileDTO]:
+        return await self._read_through(
+            profile_key(vk_user_id),
+            lambda: self.inner.get_profile(vk_user_id),
+        )
+
+    async def set_photos(self, vk_user_id: int, photos: List[PhotoDTO]) -> None:
+        await self.inner.set_photos(vk_user_id, photos)
+        self._invalidate(photos_key(vk_user_id))
+
+    async def get_photos(self, vk_user_id: int) -> List[PhotoDTO]:
+        photos = await self._read_through(
+            photos_key(vk_user_id),
+            lambda: self.inner.get_photos(vk_user_id),
+        )
+        return list(photos)
+
+    async def get_profiles_many(self, vk_user_ids: List[int]) -> Dict[int, ProfileDTO]:
+        return await self._read_through_many(
+            vk_user_ids, profile_key, self.inner.get_profiles_many
+        )
+
+    async def get_photos_many(self, vk_user_ids: List[int]) -> Dict[int, List[PhotoDTO]]:
+        photos = await self._read_through_many(
+            vk_user_ids, photos_key, self.inner.get_photos_many
+        )
+        return {vk_id: list(items) for vk_id, items in photos.items()}
+
+    async def get_cards(self, vk_user_ids: List[int]) -> Dict[int, CardDTO]:
+        profiles = await self.get_profiles_many(vk_user_ids)
+        photos = await self.get_photos_many(vk_user_ids)
+        return {
+            vk_id: CardDTO(
+                vk_user_id=vk_id,
+                profile=profiles.get(vk_id),
+                photos=photos.get(vk_id, []),
+            )
+            for vk_id in vk_user_ids
+        }
+
+    # ================= PHOTO FILES =================
+
+    # local_path и status входят в PhotoDTO
+
+    async def complete_photos(self, jobs: List[PhotoJobDTO]) -> None:
+        await self.inner.complete_photos(jobs)
+        for vk_user_id in {job.vk_user_id for job in jobs}:
+            self._invalidate(photos_key(vk_user_id))
+
+    async def fail_photos(self, jobs: List[PhotoJobDTO], max_attempts: int = 3) -> None:
+        await self.inner.fail_photos(jobs, max_attempts)
+        for vk_user_id in {job.vk_user_id for job in jobs}:
+            self._invalidate(photos_key(vk_user_id))
+
+    async def reset_photo_files(self, local_paths: List[str]) -> List[int]:
+        vk_user_ids = await self.inner.reset_photo_files(local_paths)
+        for vk_user_id in vk_user_ids:
+            self._invalidate(photos_key(vk_user_id))
+        return vk_user_ids
+
+    # ================= INTERNAL =================
+
+    async def _read_through(
+        self, key: Hashable, load: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        value = self.cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        version = self.cache.version(key)
+        value = await load()
+
+        # не кэшируем: отсутствующие записи, незакоммиченное состояние
+        # и результат, который устарел из-за инвалидации ключа во время загрузки
+        if (
+            value is not None
+            and self._pending is None
+            and self.cache.version(key) == version
+        ):
+            self.cache.set(key, value)
+
+        return value
+
+    async def _read_through_many(
+        self,
+        ids: List[int],
+        key: Callable[[int], Hashable],
+        load: Callable[[List[int]], Awaitable[Dict[int, Any]]],
+    ) -> Dict[int, Any]:
+        found: Dict[int, Any] = {}
+        missing: List[int] = []
+
+        for vk_id in ids:
+            value = self.cache.get(key(vk_id), _MISSING)
+            if value is _MISSING:
+                missing.append(vk_id)
+            else:
+                found[vk_id] = value
+
+        if not missing:
+            return found
+
+        versions = {vk_id: self.cache.version(key(vk_id)) for vk_id in missing}
+        loaded = await load(missing)
+
+        for vk_id, value in loaded.items():
+            found[vk_id] = value
+            if (
+                value is not None
+                and self._pending is None
+                and self.cache.version(key(vk_id)) == versions.get(vk_id)
+            ):
+                self.cache.set(key(vk_id), value)
+
+        return found
+
+    async def _load_exclusions(self, tg_user_id: int) -> _Exclusions:
+        key = excluded_key(tg_user_id)
+        version = self.cache.version(key)
+        exclusions = _Exclusions(
+            blacklist=SortedIdSet(await self.inner.list_blacklist(tg_user_id)),
+            favorites=SortedIdSet(await self.inner.list_favorites(tg_user_id)),
+        )
+        # фильтр, положенный параллельной загрузкой, мог уже получить
+        # обновления на месте - не перетираем его своим
+        if (
+            self.cache.version(key) == version
+            and self.cache.peek(key, _MISSING) is _MISSING
+        ):
+            self.cache.set(key, exclusions)
+        return exclusions
+
+    def _update_exclusions(
+        self, tg_user_id: int, apply: Callable[[_Exclusions], None]
+    ) -> None:
+        key = excluded_key(tg_user_id)
+        if self._pending is not None:
+            # транзакция может откатиться - фильтр перестроится после неё
+            self._invalidate(key)
+            return
+
+        exclusions = self.cache.peek(key, _MISSING)
+        if exclusions is _MISSING:
+            # сдвигает версию ключа: идущая загрузка не сохранит фильтр без этой записи
+            self.cache.invalidate(key)
+        else:
+            apply(exclusions)
+
+    def _invalidate(self, key: Hashable) -> None:
+        self.cache.invalidate(key)
+        if self._pending is not None:
+            self._pending.add(key)
@@ -0,0 +1,206 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, List, Optional
+
+from src.infrastructure.db.repositories.delegating_repo import DelegatingUserRepository
+from src.infrastructure.db.repositories.interfaces import UserRepository
+from src.infrastructure.db.schemas.dto import (
+    UserDTO, ProfileDTO, PhotoDTO, QueueWindowDTO, FavoritesPageDTO,
+)
+from src.infrastructure.singleflight import SingleFlight
+
+
+# чтения, которые объединяются; остальные методы интерфейса - записи
+COALESCED_READS = frozenset({
+    "get_or_create_user",
+    "get_cursor",
+    "list_favorites",
+    "list_favorites_page",
+    "list_blacklist",
+    "get_queue",
+    "get_current_vk_id",
+    "get_window",
+    "get_profile",
+    "get_photos",
+})
+
+# ключи чтений - (вид, id, ...): у видов пользователя id - tg_user_id
+_USER_KEYS = frozenset({
+    "user", "cursor", "favorites", "favorites_page", "blacklist",
+    "queue", "current", "window",
+})
+# профили и фото входят ещё и в окна очередей любых пользователей
+_PROFILE_KEYS = frozenset({"profile", "photos", "window"})
+
+# записи одного пользователя: первый аргумент - tg_user_id
+_USER_WRITES = frozenset({
+    "upsert_user_token_and_vk_id", "update_filters", "set_cursor",
+    "add_favorite", "add_favorites_many", "remove_favorite",
+    "add_blacklist", "add_blacklist_many",
+    "set_queue", "move_next", "move_prev",
+})
+# записи профилей и фото
+_PROFILE_WRITES = frozenset({
+    "upsert_profile", "upsert_profiles", "set_photos",
+    "claim_pending_photos", "complete_photos", "fail_photos", "reset_photo_files",
+})
+
+# пакетные чтения (ключ - весь список id, одинаковые вызовы редки)
+# и потоки - у каждого свой server-side курсор
+_PASS_THROUGH_READS = frozenset({
+    "get_profiles_many", "get_photos_many", "get_cards", "is_excluded_many",
+    "stream_favorites", "stream_queue",
+})
+
+
+class CoalescingUserRepository(DelegatingUserRepository):
+    """
+    Одновременные одинаковые чтения (двойной тап, параллельные
+    обработчики одного пользователя) выполняются одним запросом.
+
+    Запись через этот репозиторий отцепляет идущие чтения затронутых ею
+    ключей (всех ключей её пользователя или профилей): вызовы после неё
+    делают свой запрос, чтения остальных пользователей по-прежнему
+    объединяются. Внутри transaction() чтения не объединяются -
+    они видят незакоммиченное состояние своей сессии.
+    Возвращаемые DTO общие для всех ожидавших - их нельзя менять на месте.
+    """
+
+    def __init__(self, inner: UserRepository, flight: Optional[SingleFlight] = None):
+        super().__init__(inner)
+        self.flight = flight if flight is not None else SingleFlight()
+        self._transaction_depth = 0
+        # ключи, затронутые записями открытого transaction()
+        self._touched: List[Optional[Callable[[Hashable], bool]]] = []
+
+    def stats(self) -> dict:
+        return self.flight.stats()
+
+    # ================= UNIT OF WORK =================
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["CoalescingUserRepository"]:
+        self._transaction_depth += 1
+        try:
+            async with self.inner.transaction():
+                yield self
+        finally:
+            self._transaction_depth -= 1
+            if not self._transaction_depth:
+                # чтения, начатые до коммита, не видели записей блока
+                touched, self._touched = self._touched, []
+                for match in touched:
+                    self.flight.forget(match)
+
+    # ================= USERS =================
+
+    async def get_or_create_user(self, tg_user_id: int) -> UserDTO:
+        return await self._coalesce(
+            ("user", tg_user_id), lambda: self.inner.get_or_create_user(tg_user_id)
+        )
+
+    async def get_cursor(self, tg_user_id: int) -> int:
+        return await self._coalesce(
+            ("cursor", tg_user_id), lambda: self.inner.get_cursor(tg_user_id)
+        )
+
+    # ================= FAVORITES =================
+
+    async def list_favorites(self, tg_user_id: int) -> List[int]:
+        favorites = await self._coalesce(
+            ("favorites", tg_user_id), lambda: self.inner.list_favorites(tg_user_id)
+        )
+        return list(favorites)
+
+    async def list_favorites_page(
+        self, tg_user_id: int, after_id: Optional[int] = None, limit: int = 50
+    ) -> FavoritesPageDTO:
+        return await self._coalesce(
+            ("favorites_page", tg_user_id, after_id, limit),
+            lambda: self.inner.list_favorites_page(tg_user_id, after_id, limit),
+        )
+
+    # ================= BLACKLIST =================
+
+    async def list_blacklist(self, tg_user_id: int) -> List[int]:
+        blacklist = await self._coalesce(
+            ("blacklist", tg_user_id), lambda: self.inner.list_blacklist(tg_user_id)
+        )
+        return list(blacklist)
+
+    # ================= QUEUE =================
+
+    async def get_queue(self, tg_user_id: int) -> List[int]:
+        queue = await self._coalesce(
+            ("queue", tg_user_id), lambda: self.inner.get_queue(tg_user_id)
+        )
+        return list(queue)
+
+    async def get_current_vk_id(self, tg_user_id: int) -> Optional[int]:
+        return await self._coalesce(
+            ("current", tg_user_id), lambda: self.inner.get_current_vk_id(tg_user_id)
+        )
+
+    async def get_window(
+        self, tg_user_id: int, ahead: int = 3, behind: int = 0
+    ) -> QueueWindowDTO:
+        return await self._coalesce(
+            ("window", tg_user_id, ahead, behind),
+            lambda: self.inner.get_window(tg_user_id, ahead, behind),
+        )
+
+    # ================= PROFILES =================
+
+    async def get_profile(self, vk_user_id: int) -> Optional[ProfileDTO]:
+        return await self._coalesce(
+            ("profile", vk_user_id), lambda: self.inner.get_profile(vk_user_id)
+        )
+
+    async def get_photos(self, vk_user_id: int) -> List[PhotoDTO]:
+        photos = await self._coalesce(
+            ("photos", vk_user_id), lambda: self.inner.get_photos(vk_user_id)
+        )
+        return list(photos)
+
+    # ================= INTERNAL =================
+
+    async def _coalesce(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        if self._transaction_depth:
+            return await load()
+        return await self.flight.do(key, load)
+
+    def _forget(self, match: Optional[Callable[[Hashable], bool]]) -> None:
+        self.flight.forget(match)
+        if self._transaction_depth:
+            self._touched.append(match)
+
+
+def _touched_keys(name: str, args: tuple, kwargs: dict) -> Optional[Callable[[Hashable], bool]]:
+    """Какие ключи затрагивает запись name; None - все."""
+    if name in _USER_WRITES:
+        tg_user_id = kwargs["tg_user_id"] if "tg_user_id" in kwargs else args[0]
+        return lambda key: key[0] in _USER_KEYS and key[1] == tg_user_id
+    if name in _PROFILE_WRITES:
+        return lambda key: key[0] in _PROFILE_KEYS
+    # новая запись без классификации - отцепляем всё
+    return None
+
+
+def _write(name: str):
+    async def method(self, *args, **kwargs):
+        try:
+            return await getattr(self.inner, name)(*args, **kwargs)
+        finally:
+            self._forget(_touched_keys(name, args, kwargs))
+
+    method.__name__ = name
+    method.__qualname__ = f"CoalescingUserRepository.{name}"
+    return method
+
+
+# записи генерируются по интерфейсу, как в InstrumentedUserRepository:
+# новый пишущий метод не сможет забыть сбросить идущие чтения
+for _name in sorted(
+    UserRepository.__abstractmethods__
+    - COALESCED_READS - _PASS_THROUGH_READS - {"transaction"}
+):
+    setattr(CoalescingUserRepository, _name, _write(_name))
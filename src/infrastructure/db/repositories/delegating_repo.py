@@ -0,0 +1,167 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from src.infrastructure.db.repositories.interfaces import UserRepository
+from src.infrastructure.db.schemas.dto import (
+    UserDTO, ProfileDTO, PhotoDTO, PhotoJobDTO, CardDTO, QueueWindowDTO, FavoritesPageDTO,
+)
+
+
+class DelegatingUserRepository(UserRepository):
+    """
+    Базовый декоратор: прокидывает все вызовы во вложенный репозиторий.
+    Наследники переопределяют только нужные методы.
+    """
+
+    def __init__(self, inner: UserRepository):
+        self.inner = inner
+
+    # ================= UNIT OF WORK =================
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["DelegatingUserRepository"]:
+        # отдаём себя, а не inner: вызовы внутри блока идут через декоратор
+        async with self.inner.transaction():
+            yield self
+
+    # ================= USERS =================
+
+    async def get_or_create_user(self, tg_user_id: int) -> UserDTO:
+        return await self.inner.get_or_create_user(tg_user_id)
+
+    async def upsert_user_token_and_vk_id(
+        self, tg_user_id: int, vk_access_token: str, vk_user_id: int
+    ) -> None:
+        await self.inner.upsert_user_token_and_vk_id(
+            tg_user_id, vk_access_token, vk_user_id
+        )
+
+    async def update_filters(
+        self,
+        tg_user_id: int,
+        city: str,
+        gender: int,
+        age_from: int,
+        age_to: int,
+        city_id: Optional[int] = None,
+    ) -> None:
+        await self.inner.update_filters(
+            tg_user_id, city, gender, age_from, age_to, city_id
+        )
+
+    async def get_cursor(self, tg_user_id: int) -> int:
+        return await self.inner.get_cursor(tg_user_id)
+
+    async def set_cursor(self, tg_user_id: int, cursor: int) -> None:
+        await self.inner.set_cursor(tg_user_id, cursor)
+
+    # ================= FAVORITES =================
+
+    async def add_favorite(self, tg_user_id: int, vk_profile_id: int) -> None:
+        await self.inner.add_favorite(tg_user_id, vk_profile_id)
+
+    async def add_favorites_many(self, tg_user_id: int, vk_profile_ids: List[int]) -> None:
+        await self.inner.add_favorites_many(tg_user_id, vk_profile_ids)
+
+    async def remove_favorite(self, tg_user_id: int, vk_profile_id: int) -> None:
+        await self.inner.remove_favorite(tg_user_id, vk_profile_id)
+
+    async def list_favorites(self, tg_user_id: int) -> List[int]:
+        return await self.inner.list_favorites(tg_user_id)
+
+    async def list_favorites_page(
+        self, tg_user_id: int, after_id: Optional[int] = None, limit: int = 50
+    ) -> FavoritesPageDTO:
+        return await self.inner.list_favorites_page(tg_user_id, after_id, limit)
+
+    async def stream_favorites(
+        self, tg_user_id: int, batch_size: int = 1000
+    ) -> AsyncIterator[int]:
+        async for vk_id in self.inner.stream_favorites(tg_user_id, batch_size):
+            yield vk_id
+
+    # ================= BLACKLIST =================
+
+    async def add_blacklist(self, tg_user_id: int, vk_profile_id: int) -> None:
+        await self.inner.add_blacklist(tg_user_id, vk_profile_id)
+
+    async def add_blacklist_many(self, tg_user_id: int, vk_profile_ids: List[int]) -> None:
+        await self.inner.add_blacklist_many(tg_user_id, vk_profile_ids)
+
+    async def list_blacklist(self, tg_user_id: int) -> List[int]:
+        return await self.inner.list_blacklist(tg_user_id)
+
+    async def is_excluded_many(self, tg_user_id: int, vk_ids: List[int]) -> Set[int]:
+        return await self.inner.is_excluded_many(tg_user_id, vk_ids)
+
+    # ================= QUEUE =================
+
+    async def set_queue(
+        self, tg_user_id: int, vk_ids: List[int], exclude_known: bool = False
+    ) -> int:
+        return await self.inner.set_queue(tg_user_id, vk_ids, exclude_known)
+
+    async def get_queue(self, tg_user_id: int) -> List[int]:
+        return await self.inner.get_queue(tg_user_id)
+
+    async def stream_queue(self, tg_user_id: int, batch_size: int = 1000) -> AsyncIterator[int]:
+        async for vk_id in self.inner.stream_queue(tg_user_id, batch_size):
+            yield vk_id
+
+    async def get_current_vk_id(self, tg_user_id: int) -> Optional[int]:
+        return await self.inner.get_current_vk_id(tg_user_id)
+
+    async def move_next(self, tg_user_id: int) -> Optional[int]:
+        return await self.inner.move_next(tg_user_id)
+
+    async def move_prev(self, tg_user_id: int) -> Optional[int]:
+        return await self.inner.move_prev(tg_user_id)
+
+    async def get_window(
+        self, tg_user_id: int, ahead: int = 3, behind: int = 0
+    ) -> QueueWindowDTO:
+        return await self.inner.get_window(tg_user_id, ahead, behind)
+
+    # ================= PROFILES =================
+
+    async def upsert_profile(self, profile: ProfileDTO) -> None:
+        await self.inner.upsert_profile(profile)
+
+    async def upsert_profiles(self, profiles: List[ProfileDTO]) -> None:
+        await self.inner.upsert_profiles(profiles)
+
+    async def get_profile(self, vk_user_id: int) -> Optional[ProfileDTO]:
+        return await self.inner.get_profile(vk_user_id)
+
+    async def set_photos(self, vk_user_id: int, photos: List[PhotoDTO]) -> None:
+        await self.inner.set_photos(vk_user_id, photos)
+
+    async def get_photos(self, vk_user_id: int) -> List[PhotoDTO]:
+        return await self.inner.get_photos(vk_user_id)
+
+    async def get_profiles_many(self, vk_user_ids: List[int]) -> Dict[int, ProfileDTO]:
+        return await self.inner.get_profiles_many(vk_user_ids)
+
+    async def get_photos_many(self, vk_user_ids: List[int]) -> Dict[int, List[PhotoDTO]]:
+        return await self.inner.get_photos_many(vk_user_ids)
+
+    async def get_cards(self, vk_user_ids: List[int]) -> Dict[int, CardDTO]:
+        return await self.inner.get_cards(vk_user_ids)
+
+    # ================= PHOTO FILES =================
+
+    async def claim_pending_photos(
+        self, limit: int, worker_id: str, lease_seconds: float = 300.0, max_attempts: int = 3
+    ) -> List[PhotoJobDTO]:
+        return await self.inner.claim_pending_photos(
+            limit, worker_id, lease_seconds, max_attempts
+        )
+
+    async def complete_photos(self, jobs: List[PhotoJobDTO]) -> None:
+        await self.inner.complete_photos(jobs)
+
+    async def fail_photos(self, jobs: List[PhotoJobDTO], max_attempts: int = 3) -> None:
+        await self.inner.fail_photos(jobs, max_attempts)
+
+    async def reset_photo_files(self, local_paths: List[str]) -> List[int]:
+        return await self.inner.reset_photo_files(local_paths)
@@ -0,0 +1,33 @@
+import os
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.infrastructure.db.repositories.packed_queue_repo import PackedQueueUserRepository
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+
+# rows - строка queue на кандидата, packed - int[] в queue_packed
+QUEUE_STORAGES = {
+    "rows": PostgresUserRepository,
+    "packed": PackedQueueUserRepository,
+}
+
+
+def queue_storage_from_env() -> str:
+    return os.getenv("DB_QUEUE_STORAGE", "rows").strip().lower()
+
+
+def create_user_repository(
+    session: AsyncSession, queue_storage: str | None = None
+) -> PostgresUserRepository:
+    """
+    Репозиторий с нужным режимом хранения очереди.
+    По умолчанию режим берётся из DB_QUEUE_STORAGE.
+    """
+    storage = queue_storage or queue_storage_from_env()
+    try:
+        repo_cls = QUEUE_STORAGES[storage]
+    except KeyError:
+        raise ValueError(
+            f"unknown queue storage {storage!r}, expected one of {sorted(QUEUE_STORAGES)}"
+        ) from None
+    return repo_cls(session)
@@ -0,0 +1,40 @@
+import inspect
+
+from src.infrastructure.db.metrics import RepositoryMetrics
+from src.infrastructure.db.repositories.delegating_repo import DelegatingUserRepository
+from src.infrastructure.db.repositories.interfaces import UserRepository
+
+
+class InstrumentedUserRepository(DelegatingUserRepository):
+    """
+    Снимает метрики с каждого метода UserRepository.
+
+    SQL-запросы и строки считаются, только если metrics.attach(engine)
+    вызван для движка, с которым работает вложенный репозиторий.
+    """
+
+    def __init__(self, inner: UserRepository, metrics: RepositoryMetrics):
+        super().__init__(inner)
+        self.metrics = metrics
+
+
+def _instrumented(name: str):
+    if inspect.isasyncgenfunction(getattr(DelegatingUserRepository, name)):
+        # потоки: метрика - весь проход по генератору
+        def method(self, *args, **kwargs):
+            stream = getattr(self.inner, name)(*args, **kwargs)
+            return self.metrics.track_stream(name, stream)
+    else:
+        async def method(self, *args, **kwargs):
+            with self.metrics.track(name):
+                return await getattr(self.inner, name)(*args, **kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"InstrumentedUserRepository.{name}"
+    return method
+
+
+# обёртки генерируются по интерфейсу, чтобы новые методы
+# UserRepository попадали в метрики без правок здесь
+for _name in sorted(UserRepository.__abstractmethods__ - {"transaction"}):
+    setattr(InstrumentedUserRepository, _name, _instrumented(_name))
@@ -1,11 +1,17 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import AsyncContextManager, AsyncIterator, Dict, List, Optional, Set
 
-from src.infrastructure.db.schemas.dto import UserDTO, ProfileDTO, PhotoDTO
+from src.infrastructure.db.schemas.dto import (
+    UserDTO, ProfileDTO, PhotoDTO, PhotoJobDTO, CardDTO, QueueWindowDTO, FavoritesPageDTO,
+)
 
 
 class UserRepository(ABC):
 
+    # UNIT OF WORK
+    @abstractmethod
+    def transaction(self) -> AsyncContextManager["UserRepository"]: ...
+
     # USERS
     @abstractmethod
     async def get_or_create_user(self, tg_user_id: int) -> UserDTO: ...
@@ -36,23 +42,53 @@ class UserRepository(ABC):
     @abstractmethod
     async def add_favorite(self, tg_user_id: int, vk_profile_id: int) -> None: ...
 
+    @abstractmethod
+    async def add_favorites_many(self, tg_user_id: int, vk_profile_ids: List[int]) -> None: ...
+
     @abstractmethod
     async def remove_favorite(self, tg_user_id: int, vk_profile_id: int) -> None: ...
 
     @abstractmethod
     async def list_favorites(self, tg_user_id: int) -> List[int]: ...
 
+    @abstractmethod
+    async def list_favorites_page(
+        self, tg_user_id: int, after_id: Optional[int] = None, limit: int = 50
+    ) -> FavoritesPageDTO: ...
+
+    # потоки - async-генераторы, поэтому объявлены без async
+    @abstractmethod
+    def stream_favorites(
+        self, tg_user_id: int, batch_size: int = 1000
+    ) -> AsyncIterator[int]: ...
+
     # BLACKLIST
     @abstractmethod
     async def add_blacklist(self, tg_user_id: int, vk_profile_id: int) -> None: ...
 
+    @abstractmethod
+    async def add_blacklist_many(self, tg_user_id: int, vk_profile_ids: List[int]) -> None: ...
+
+    # по возрастанию vk id
+    @abstractmethod
+    async def list_blacklist(self, tg_user_id: int) -> List[int]: ...
+
+    # те из vk_ids, что в чёрном списке или в избранном
+    @abstractmethod
+    async def is_excluded_many(self, tg_user_id: int, vk_ids: List[int]) -> Set[int]: ...
+
     # QUEUE
     @abstractmethod
-    async def set_queue(self, tg_user_id: int, vk_ids: List[int]) -> None: ...
+    async def set_queue(
+        self, tg_user_id: int, vk_ids: List[int], exclude_known: bool = False
+    ) -> int: ...
 
     @abstractmethod
     async def get_queue(self, tg_user_id: int) -> List[int]: ...
 
+    @abstractmethod
+    def stream_queue(self, tg_user_id: int, batch_size: int = 1000) -> AsyncIterator[int]: ...
+
     @abstractmethod
     async def get_current_vk_id(self, tg_user_id: int) -> Optional[int]: ...
 
@@ -62,10 +98,18 @@ class UserRepository(ABC):
     @abstractmethod
     async def move_prev(self, tg_user_id: int) -> Optional[int]: ...
 
+    @abstractmethod
+    async def get_window(
+        self, tg_user_id: int, ahead: int = 3, behind: int = 0
+    ) -> QueueWindowDTO: ...
+
     # PROFILES
     @abstractmethod
     async def upsert_profile(self, profile: ProfileDTO) -> None: ...
 
+    @abstractmethod
+    async def upsert_profiles(self, profiles: List[ProfileDTO]) -> None: ...
+
     @abstractmethod
     async def get_profile(self, vk_user_id: int) -> Optional[ProfileDTO]: ...
 
@@ -73,4 +117,28 @@ class UserRepository(ABC):
     async def set_photos(self, vk_user_id: int, photos: List[PhotoDTO]) -> None: ...
 
     @abstractmethod
-    async def get_photos(self, vk_user_id: int) -> List[PhotoDTO]: ...
\ No newline at end of file
+    async def get_photos(self, vk_user_id: int) -> List[PhotoDTO]: ...
+
+    @abstractmethod
+    async def get_profiles_many(self, vk_user_ids: List[int]) -> Dict[int, ProfileDTO]: ...
+
+    @abstractmethod
+    async def get_photos_many(self, vk_user_ids: List[int]) -> Dict[int, List[PhotoDTO]]: ...
+
+    @abstractmethod
+    async def get_cards(self, vk_user_ids: List[int]) -> Dict[int, CardDTO]: ...
+
+    # PHOTO FILES
+    @abstractmethod
+    async def claim_pending_photos(
+        self, limit: int, worker_id: str, lease_seconds: float = 300.0, max_attempts: int = 3
+    ) -> List[PhotoJobDTO]: ...
+
+    @abstractmethod
+    async def complete_photos(self, jobs: List[PhotoJobDTO]) -> None: ...
+
+    @abstractmethod
+    async def fail_photos(self, jobs: List[PhotoJobDTO], max_attempts: int = 3) -> None: ...
+
+    @abstractmethod
+    async def reset_photo_files(self, local_paths: List[str]) -> List[int]: ...
@@ -0,0 +1,643 @@
+import asyncio
+import heapq
+import os
+import pickle
+import time
+from array import array
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass, field, replace
+from itertools import dropwhile, islice
+from typing import AsyncIterator, Optional
+
+from src.infrastructure.db.models import PhotoStatus
+from src.infrastructure.db.repositories.interfaces import UserRepository
+from src.infrastructure.db.schemas.dto import (
+    UserDTO, ProfileDTO, PhotoDTO, PhotoJobDTO, CardDTO, QueueWindowDTO, FavoritesPageDTO,
+)
+
+
+# Очередь хранится как в PackedQueueUserRepository: массив vk_id
+# и history_cursor - 0-based индекс в нём. array('q') - 8 байт на
+# кандидата вместо ~36 у списка int.
+
+
+@dataclass(slots=True)
+class _UserState:
+    user: UserDTO
+    queue: array = field(default_factory=lambda: array("q"))
+    # vk_id -> id строки избранного; порядок dict - порядок добавления
+    favorites: dict[int, int] = field(default_factory=dict)
+    blacklist: set[int] = field(default_factory=set)
+    seen: set[int] = field(default_factory=set)
+
+    def copy(self) -> "_UserState":
+        return _UserState(
+            replace(self.user),
+            self.queue[:],
+            dict(self.favorites),
+            set(self.blacklist),
+            set(self.seen),
+        )
+
+
+@dataclass(slots=True)
+class _PhotoRow:
+    id: int
+    vk_user_id: int
+    photo_id: int
+    owner_id: int
+    url: str
+    likes_count: int
+    local_path: Optional[str] = None
+    status: str = PhotoStatus.PENDING
+    claimed_by: Optional[str] = None
+    lease_until: Optional[float] = None
+    attempts: int = 0
+    last_error: Optional[str] = None
+
+    def to_dto(self) -> PhotoDTO:
+        return PhotoDTO(
+            self.photo_id, self.owner_id, self.url, self.likes_count,
+            self.local_path, self.status,
+        )
+
+
+@dataclass
+class _Journal:
+    """Прежние значения всего, что изменила транзакция; None - записи не было."""
+
+    users: dict[int, Optional[_UserState]] = field(default_factory=dict)
+    profiles: dict[int, Optional[tuple]] = field(default_factory=dict)
+    photos: dict[int, Optional[_PhotoRow]] = field(default_factory=dict)
+    owners: dict[int, Optional[list]] = field(default_factory=dict)
+
+
+_HELD = nullcontext()
+
+
+class InMemoryStore:
+    """
+    Данные InMemoryUserRepository. Один store на процесс, репозитории
+    (по одному на обработчик, как сессии) работают с ним совместно.
+
+    snapshot() пишет состояние на диск, InMemoryStore.open(path) поднимает
+    его обратно - очередь переживает перезапуск бота.
+    """
+
+    _STATE = (
+        "users", "profiles", "photos", "photos_by_owner",
+        "pending_photos", "claimed_photos", "last_favorite_id", "last_photo_id",
+    )
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.users: dict[int, _UserState] = {}
+        # vk_user_id -> (first_name, last_name, domain)
+        self.profiles: dict[int, tuple[str, str, str]] = {}
+        self.photos: dict[int, _PhotoRow] = {}
+        # vk_user_id -> id фото по порядку вставки
+        self.photos_by_owner: dict[int, list[int]] = {}
+        # очередь скачивания без обхода всех фото
+        self.pending_photos: set[int] = set()
+        self.claimed_photos: set[int] = set()
+        self.last_favorite_id = 0
+        self.last_photo_id = 0
+        # операции репозиториев атомарны и без await внутри; lock нужен,
+        # чтобы другие репозитории ждали конца чужой transaction()
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    def open(cls, path: str) -> "InMemoryStore":
+        """Store со снимком из path, пустой - если снимка ещё нет."""
+        store = cls(path)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            for name in cls._STATE:
+                setattr(store, name, state[name])
+        return store
+
+    async def snapshot(self, path: Optional[str] = None) -> None:
+        """Сериализует состояние под lock, пишет файл в потоке и атомарно."""
+        path = path or self.path
+        if path is None:
+            raise ValueError("snapshot path is not set")
+
+        async with self.lock:
+            data = pickle.dumps(
+                {name: getattr(self, name) for name in self._STATE},
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        await asyncio.to_thread(_write_atomic, path, data)
+
+
+class InMemoryUserRepository(UserRepository):
+    """
+    UserRepository на структурах Python: быстрый бэкенд для тестов и
+    горячий слой для очередей, которые не жалко потерять.
+
+    Поведение совпадает с PackedQueueUserRepository. Методы не отдают
+    ссылки на внутренние объекты - каждый вызов строит свои DTO.
+    """
+
+    def __init__(self, store: Optional[InMemoryStore] = None):
+        self.store = store if store is not None else InMemoryStore()
+        self._journal: Optional[_Journal] = None
+
+    # ================= UNIT OF WORK =================
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["InMemoryUserRepository"]:
+        """
+        Блок держит lock store: другие репозитории ждут его конца.
+        При ошибке изменения откатываются по журналу.
+        Вложенный блок присоединяется к внешнему.
+        """
+        if self._journal is not None:
+            yield self
+            return
+
+        async with self.store.lock:
+            self._journal = _Journal()
+            try:
+                yield self
+            except BaseException:
+                self._rollback()
+                raise
+            finally:
+                self._journal = None
+
+    # ================= USERS =================
+
+    async def get_or_create_user(self, tg_user_id: int) -> UserDTO:
+        async with self._lock():
+            state = self.store.users.get(tg_user_id) or self._user_for_write(tg_user_id)
+            return replace(state.user)
+
+    async def upsert_user_token_and_vk_id(
+        self, tg_user_id: int, vk_access_token: str, vk_user_id: int
+    ) -> None:
+        async with self._lock():
+            user = self._user_for_write(tg_user_id).user
+            user.vk_access_token = vk_access_token
+            user.vk_user_id = vk_user_id
+
+    async def update_filters(
+        self,
+        tg_user_id: int,
+        city: str,
+        gender: int,
+        age_from: int,
+        age_to: int,
+        city_id: Optional[int] = None,
+    ) -> None:
+        async with self._lock():
+            state = self._user_for_write(tg_user_id)
+            user = state.user
+            user.filter_city_name = city
+            user.filter_gender = gender
+            user.filter_age_from = age_from
+            user.filter_age_to = age_to
+            user.filter_city_id = city_id
+            user.history_cursor = 0
+            state.queue = array("q")
+
+    async def get_cursor(self, tg_user_id: int) -> int:
+        async with self._lock():
+            state = self.store.users.get(tg_user_id)
+            return state.user.history_cursor if state is not None else 0
+
+    async def set_cursor(self, tg_user_id: int, cursor: int) -> None:
+        async with self._lock():
+            self._user_for_write(tg_user_id).user.history_cursor = cursor
+
+    # ================= FAVORITES =================
+
+    async def add_favorite(self, tg_user_id: int, vk_profile_id: int) -> None:
+        await self.add_favorites_many(tg_user_id, [vk_profile_id])
+
+    async def add_favorites_many(self, tg_user_id: int, vk_profile_ids: list[int]) -> None:
+        if not vk_profile_ids:
+            return
+        async with self._lock():
+            favorites = self._user_for_write(tg_user_id).favorites
+            for vk_id in vk_profile_ids:
+                if vk_id not in favorites:
+                    self.store.last_favorite_id += 1
+                    favorites[vk_id] = self.store.last_favorite_id
+
+    async def remove_favorite(self, tg_user_id: int, vk_profile_id: int) -> None:
+        async with self._lock():
+            if vk_profile_id in self._favorites(tg_user_id):
+                del self._user_for_write(tg_user_id).favorites[vk_profile_id]
+
+    async def list_favorites(self, tg_user_id: int) -> list[int]:
+        async with self._lock():
+            return list(self._favorites(tg_user_id))
+
+    async def list_favorites_page(
+        self, tg_user_id: int, after_id: Optional[int] = None, limit: int = 50
+    ) -> FavoritesPageDTO:
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        async with self._lock():
+            # id растут в порядке добавления, как и порядок dict
+            rows = self._favorites(tg_user_id).items()
+            if after_id:
+                rows = dropwhile(lambda row: row[1] <= after_id, rows)
+            rows = list(islice(rows, limit + 1))
+
+        page = FavoritesPageDTO(vk_ids=[vk_id for vk_id, _ in rows[:limit]])
+        if len(rows) > limit:
+            page.next_after_id = rows[limit - 1][1]
+        return page
+
+    async def stream_favorites(
+        self, tg_user_id: int, batch_size: int = 1000
+    ) -> AsyncIterator[int]:
+        async with self._lock():
+            snapshot = list(self._favorites(tg_user_id))
+        async for vk_id in _stream(snapshot, batch_size):
+            yield vk_id
+
+    # ================= BLACKLIST =================
+
+    async def add_blacklist(self, tg_user_id: int, vk_profile_id: int) -> None:
+        await self.add_blacklist_many(tg_user_id, [vk_profile_id])
+
+    async def add_blacklist_many(self, tg_user_id: int, vk_profile_ids: list[int]) -> None:
+        if not vk_profile_ids:
+            return
+        async with self._lock():
+            state = self._user_for_write(tg_user_id)
+            state.blacklist.update(vk_profile_ids)
+            _remove_from_queue(state, set(vk_profile_ids))
+
+    async def list_blacklist(self, tg_user_id: int) -> list[int]:
+        async with self._lock():
+            state = self.store.users.get(tg_user_id)
+            return sorted(state.blacklist) if state is not None else []
+
+    async def is_excluded_many(self, tg_user_id: int, vk_ids: list[int]) -> set[int]:
+        async with self._lock():
+            state = self.store.users.get(tg_user_id)
+            if state is None:
+                return set()
+            return {
+                vk_id for vk_id in vk_ids
+                if vk_id in state.blacklist or vk_id in state.favorites
+            }
+
+    # ================= QUEUE =================
+
+    async def set_queue(
+        self, tg_user_id: int, vk_ids: list[int], exclude_known: bool = False
+    ) -> int:
+        async with self._lock():
+            state = self._user_for_write(tg_user_id)
+            if exclude_known:
+                known = state.blacklist
+                vk_ids = [
+                    vk_id for vk_id in vk_ids
+                    if vk_id not in known
+                    and vk_id not in state.favorites
+                    and vk_id not in state.seen
+                ]
+            state.queue = array("q", vk_ids)
+            state.user.history_cursor = 0
+            return len(state.queue)
+
+    async def get_queue(self, tg_user_id: int) -> list[int]:
+        async with self._lock():
+            return self._queue(tg_user_id).tolist()
+
+    async def stream_queue(self, tg_user_id: int, batch_size: int = 1000) -> AsyncIterator[int]:
+        async with self._lock():
+            snapshot = self._queue(tg_user_id)[:]
+        async for vk_id in _stream(snapshot, batch_size):
+            yield vk_id
+
+    async def get_current_vk_id(self, tg_user_id: int) -> Optional[int]:
+        async with self._lock():
+            state = self.store.users.get(tg_user_id)
+            if state is None:
+                return None
+            cursor = state.user.history_cursor
+            return state.queue[cursor] if 0 <= cursor < len(state.queue) else None
+
+    async def move_next(self, tg_user_id: int) -> Optional[int]:
+        async with self._lock():
+            state = self.store.users.get(tg_user_id)
+            if state is None or not state.user.history_cursor + 1 < len(state.queue):
+                return None
+            state = self._user_for_write(tg_user_id)
+            cursor = state.user.history_cursor
+            state.seen.add(state.queue[cursor])
+            state.user.history_cursor = cursor + 1
+            return state.queue[cursor + 1]
+
+    async def move_prev(self, tg_user_id: int) -> Optional[int]:
+        async with self._lock():
+            state = self.store.users.get(tg_user_id)
+            if state is None:
+                return None
+            cursor = state.user.history_cursor
+            if not 0 < cursor <= len(state.queue):
+                return None
+            state = self._user_for_write(tg_user_id)
+            if cursor < len(state.queue):
+                state.seen.add(state.queue[cursor])
+            state.user.history_cursor = cursor - 1
+            return state.queue[cursor - 1]
+
+    async def get_window(
+        self, tg_user_id: int, ahead: int = 3, behind: int = 0
+    ) -> QueueWindowDTO:
+        async with self._lock():
+            state = self.store.users.get(tg_user_id)
+            if state is None:
+                return QueueWindowDTO(cursor=0)
+
+            cursor = state.user.history_cursor
+            start = max(cursor - max(behind, 0), 0)
+            vk_ids = state.queue[start:cursor + max(ahead, 0) + 1].tolist()
+
+            window = QueueWindowDTO(cursor=cursor)
+            for idx, vk_id in enumerate(vk_ids, start):
+                if window.current_index is None and idx >= cursor:
+                    window.current_index = len(window.cards)
+                window.cards.append(self._card(vk_id))
+            return window
+
+    # ================= PROFILES =================
+
+    async def upsert_profile(self, profile: ProfileDTO) -> None:
+        await self.upsert_profiles([profile])
+
+    async def upsert_profiles(self, profiles: list[ProfileDTO]) -> None:
+        async with self._lock():
+            for p in profiles:
+                self._journal_profile(p.vk_user_id)
+                self.store.profiles[p.vk_user_id] = (p.first_name, p.last_name, p.domain)
+
+    async def get_profile(self, vk_user_id: int) -> Optional[ProfileDTO]:
+        async with self._lock():
+            return self._profile(vk_user_id)
+
+    async def set_photos(self, vk_user_id: int, photos: list[PhotoDTO]) -> None:
+        store = self.store
+        async with self._lock():
+            self._journal_owner(vk_user_id)
+            for photo_id in store.photos_by_owner.pop(vk_user_id, ()):
+                self._journal_photo(photo_id)
+                self._unlink_photo(store.photos.pop(photo_id))
+
+            ids = []
+            for p in photos:
+                store.last_photo_id += 1
+                row = _PhotoRow(
+                    store.last_photo_id, vk_user_id, p.photo_id, p.owner_id, p.url,
+                    p.likes_count, p.local_path, p.status or PhotoStatus.PENDING,
+                )
+                self._journal_photo(row.id)
+                self._link_photo(row)
+                ids.append(row.id)
+            if ids:
+                store.photos_by_owner[vk_user_id] = ids
+
+    async def get_photos(self, vk_user_id: int) -> list[PhotoDTO]:
+        async with self._lock():
+            return self._photos(vk_user_id)
+
+    async def get_profiles_many(self, vk_user_ids: list[int]) -> dict[int, ProfileDTO]:
+        async with self._lock():
+            profiles = {}
+            for vk_id in vk_user_ids:
+                profile = self._profile(vk_id)
+                if profile is not None:
+                    profiles[vk_id] = profile
+            return profiles
+
+    async def get_photos_many(self, vk_user_ids: list[int]) -> dict[int, list[PhotoDTO]]:
+        async with self._lock():
+            return {vk_id: self._photos(vk_id) for vk_id in vk_user_ids}
+
+    async def get_cards(self, vk_user_ids: list[int]) -> dict[int, CardDTO]:
+        async with self._lock():
+            return {vk_id: self._card(vk_id) for vk_id in vk_user_ids}
+
+    # ================= PHOTO FILES =================
+
+    async def claim_pending_photos(
+        self, limit: int, worker_id: str, lease_seconds: float = 300.0, max_attempts: int = 3
+    ) -> list[PhotoJobDTO]:
+        store = self.store
+        async with self._lock():
+            now = time.time()
+            # сначала выбор, потом возврат истёкших - как в одном запросе
+            # PostgresUserRepository: их заберёт следующий вызов
+            picked = heapq.nsmallest(limit, store.pending_photos)
+            expired = [
+                photo_id for photo_id in store.claimed_photos
+                if store.photos[photo_id].lease_until < now
+            ]
+            for photo_id in expired:
+                if store.photos[photo_id].attempts >= max_attempts:
+                    self._update_photo(
+                        photo_id,
+                        status=PhotoStatus.FAILED,
+                        claimed_by=None,
+                        lease_until=None,
+                        last_error="lease expired",
+                    )
+                else:
+                    self._update_photo(
+                        photo_id, status=PhotoStatus.PENDING, claimed_by=None, lease_until=None
+                    )
+
+            jobs = []
+            for photo_id in picked:
+                row = self._update_photo(
+                    photo_id,
+                    status=PhotoStatus.CLAIMED,
+                    claimed_by=worker_id,
+                    lease_until=now + lease_seconds,
+                )
+                row.attempts += 1
+                jobs.append(PhotoJobDTO(
+                    id=row.id,
+                    vk_user_id=row.vk_user_id,
+                    url=row.url,
+                    attempts=row.attempts,
+                    worker_id=worker_id,
+                ))
+            return jobs
+
+    async def complete_photos(self, jobs: list[PhotoJobDTO]) -> None:
+        async with self._lock():
+            for job in jobs:
+                if self._claimed_by(job):
+                    self._update_photo(
+                        job.id,
+                        local_path=job.local_path,
+                        status=PhotoStatus.DONE,
+                        claimed_by=None,
+                        lease_until=None,
+                        last_error=None,
+                    )
+
+    async def fail_photos(self, jobs: list[PhotoJobDTO], max_attempts: int = 3) -> None:
+        async with self._lock():
+            for job in jobs:
+                if self._claimed_by(job):
+                    attempts = self.store.photos[job.id].attempts
+                    self._update_photo(
+                        job.id,
+                        status=(
+                            PhotoStatus.FAILED if attempts >= max_attempts
+                            else PhotoStatus.PENDING
+                        ),
+                        claimed_by=None,
+                        lease_until=None,
+                        last_error=job.error,
+                    )
+
+    async def reset_photo_files(self, local_paths: list[str]) -> list[int]:
+        if not local_paths:
+            return []
+        paths = set(local_paths)
+        async with self._lock():
+            # вытеснение из кэша файлов редкое - индекс по local_path не держим
+            matched = [row.id for row in self.store.photos.values() if row.local_path in paths]
+            vk_user_ids = set()
+            for photo_id in matched:
+                row = self._update_photo(photo_id, local_path=None, status=PhotoStatus.PENDING)
+                vk_user_ids.add(row.vk_user_id)
+            return sorted(vk_user_ids)
+
+    # ================= INTERNAL =================
+
+    def _lock(self):
+        # внутри своей transaction() lock уже взят этим репозиторием
+        return _HELD if self._journal is not None else self.store.lock
+
+    def _user_for_write(self, tg_user_id: int) -> _UserState:
+        state = self.store.users.get(tg_user_id)
+        if self._journal is not None and tg_user_id not in self._journal.users:
+            self._journal.users[tg_user_id] = state.copy() if state is not None else None
+        if state is None:
+            state = self.store.users[tg_user_id] = _UserState(UserDTO(tg_user_id))
+        return state
+
+    def _favorites(self, tg_user_id: int) -> dict[int, int]:
+        state = self.store.users.get(tg_user_id)
+        return state.favorites if state is not None else {}
+
+    def _queue(self, tg_user_id: int) -> array:
+        state = self.store.users.get(tg_user_id)
+        return state.queue if state is not None else array("q")
+
+    def _profile(self, vk_user_id: int) -> Optional[ProfileDTO]:
+        profile = self.store.profiles.get(vk_user_id)
+        return ProfileDTO(vk_user_id, *profile) if profile is not None else None
+
+    def _photos(self, vk_user_id: int) -> list[PhotoDTO]:
+        photos = self.store.photos
+        return [photos[i].to_dto() for i in self.store.photos_by_owner.get(vk_user_id, ())]
+
+    def _card(self, vk_user_id: int) -> CardDTO:
+        return CardDTO(
+            vk_user_id=vk_user_id,
+            profile=self._profile(vk_user_id),
+            photos=self._photos(vk_user_id),
+        )
+
+    def _claimed_by(self, job: PhotoJobDTO) -> bool:
+        # complete/fail меняют строку, только пока она за тем же воркером
+        row = self.store.photos.get(job.id)
+        return row is not None and row.claimed_by == job.worker_id
+
+    def _update_photo(self, photo_id: int, **values) -> _PhotoRow:
+        self._journal_photo(photo_id)
+        row = self.store.photos[photo_id]
+        self._unlink_photo(row)
+        for name, value in values.items():
+            setattr(row, name, value)
+        self._link_photo(row)
+        return row
+
+    def _link_photo(self, row: _PhotoRow) -> None:
+        store = self.store
+        store.photos[row.id] = row
+        if row.status == PhotoStatus.PENDING:
+            store.pending_photos.add(row.id)
+        elif row.status == PhotoStatus.CLAIMED:
+            store.claimed_photos.add(row.id)
+
+    def _unlink_photo(self, row: _PhotoRow) -> None:
+        self.store.pending_photos.discard(row.id)
+        self.store.claimed_photos.discard(row.id)
+
+    def _journal_profile(self, vk_user_id: int) -> None:
+        journal = self._journal
+        if journal is not None and vk_user_id not in journal.profiles:
+            journal.profiles[vk_user_id] = self.store.profiles.get(vk_user_id)
+
+    def _journal_owner(self, vk_user_id: int) -> None:
+        journal = self._journal
+        if journal is not None and vk_user_id not in journal.owners:
+            ids = self.store.photos_by_owner.get(vk_user_id)
+            journal.owners[vk_user_id] = list(ids) if ids is not None else None
+
+    def _journal_photo(self, photo_id: int) -> None:
+        journal = self._journal
+        if journal is not None and photo_id not in journal.photos:
+            row = self.store.photos.get(photo_id)
+            journal.photos[photo_id] = replace(row) if row is not None else None
+
+    def _rollback(self) -> None:
+        store, journal = self.store, self._journal
+        _restore(store.users, journal.users)
+        _restore(store.profiles, journal.profiles)
+        _restore(store.photos_by_owner, journal.owners)
+        for photo_id, row in journal.photos.items():
+            current = store.photos.pop(photo_id, None)
+            if current is not None:
+                self._unlink_photo(current)
+            if row is not None:
+                self._link_photo(row)
+
+
+def _remove_from_queue(state: _UserState, vk_ids: set[int]) -> None:
+    # элементы до курсора, попавшие под удаление, сдвигают курсор назад
+    if not vk_ids or vk_ids.isdisjoint(state.queue):
+        return
+    cursor = state.user.history_cursor
+    shift = sum(1 for vk_id in state.queue[:cursor] if vk_id in vk_ids)
+    state.queue = array("q", [vk_id for vk_id in state.queue if vk_id not in vk_ids])
+    state.user.history_cursor = cursor - shift
+
+
+def _restore(target: dict, saved: dict) -> None:
+    for key, value in saved.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = value
+
+
+async def _stream(values, batch_size: int) -> AsyncIterator[int]:
+    # снимок на начало потока, между пачками цикл отдаётся другим задачам
+    for start in range(0, len(values), batch_size):
+        for vk_id in values[start:start + batch_size]:
+            yield vk_id
+        await asyncio.sleep(0)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
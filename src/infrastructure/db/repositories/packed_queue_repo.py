@@ -0,0 +1,220 @@
+from typing import AsyncIterator
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from src.infrastructure.db import invalidation
+from src.infrastructure.db.models import PackedQueue
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+
+
+# В этом режиме очередь пользователя - одна строка queue_packed с int[],
+# а history_cursor - 0-based индекс в массиве (в Postgres массивы с 1).
+# Свайп читает элемент массива по индексу вместе с UPDATE курсора.
+
+_GET_CURRENT = text(
+    """
+    SELECT q.vk_ids[u.history_cursor + 1]
+    FROM users u
+    JOIN queue_packed q ON q.tg_user_id = u.tg_user_id
+    WHERE u.tg_user_id = :tg_user_id
+    """
+)
+
+# UPDATE сам берёт блокировку строки users и перепроверяет условие на
+# свежей версии, поэтому параллельные тапы сдвигают курсор по очереди.
+# В RETURNING history_cursor уже новый.
+_MOVE_NEXT = text(
+    """
+    WITH moved AS (
+        UPDATE users u
+        SET history_cursor = u.history_cursor + 1, last_active_at = now()
+        FROM queue_packed q
+        WHERE u.tg_user_id = :tg_user_id
+          AND q.tg_user_id = u.tg_user_id
+          AND u.history_cursor + 1 < cardinality(q.vk_ids)
+        RETURNING q.vk_ids[u.history_cursor + 1] AS vk_id,
+                  q.vk_ids[u.history_cursor] AS left_id
+    ),
+    mark_seen AS (
+        INSERT INTO seen_profiles (tg_user_id, vk_profile_id)
+        SELECT :tg_user_id, left_id FROM moved WHERE left_id IS NOT NULL
+        ON CONFLICT DO NOTHING
+    )
+    SELECT vk_id FROM moved
+    """
+)
+
+_MOVE_PREV = text(
+    """
+    WITH moved AS (
+        UPDATE users u
+        SET history_cursor = u.history_cursor - 1, last_active_at = now()
+        FROM queue_packed q
+        WHERE u.tg_user_id = :tg_user_id
+          AND q.tg_user_id = u.tg_user_id
+          AND u.history_cursor > 0
+          AND u.history_cursor - 1 < cardinality(q.vk_ids)
+        RETURNING q.vk_ids[u.history_cursor + 1] AS vk_id,
+                  q.vk_ids[u.history_cursor + 2] AS left_id
+    ),
+    mark_seen AS (
+        INSERT INTO seen_profiles (tg_user_id, vk_profile_id)
+        SELECT :tg_user_id, left_id FROM moved WHERE left_id IS NOT NULL
+        ON CONFLICT DO NOTHING
+    )
+    SELECT vk_id FROM moved
+    """
+)
+
+_SET_QUEUE_FILTERED = text(
+    """
+    INSERT INTO queue_packed (tg_user_id, vk_ids)
+    SELECT :tg_user_id,
+           coalesce(array_agg(c.vk_id ORDER BY c.ord), '{}')
+    FROM unnest(CAST(:vk_ids AS integer[])) WITH ORDINALITY AS c(vk_id, ord)
+    WHERE NOT EXISTS (
+            SELECT 1 FROM blacklist b
+            WHERE b.tg_user_id = :tg_user_id AND b.vk_profile_id = c.vk_id
+        )
+      AND NOT EXISTS (
+            SELECT 1 FROM favorites f
+            WHERE f.tg_user_id = :tg_user_id AND f.vk_profile_id = c.vk_id
+        )
+      AND NOT EXISTS (
+            SELECT 1 FROM seen_profiles s
+            WHERE s.tg_user_id = :tg_user_id AND s.vk_profile_id = c.vk_id
+        )
+    ON CONFLICT (tg_user_id) DO UPDATE SET vk_ids = excluded.vk_ids
+    RETURNING cardinality(vk_ids)
+    """
+)
+
+# unnest отдаёт элементы в порядке массива
+_QUEUE_ITEMS = text(
+    """
+    SELECT unnest(vk_ids) FROM queue_packed WHERE tg_user_id = :tg_user_id
+    """
+)
+
+# срез [cursor - behind, cursor + ahead] массива; idx - 0-based индекс
+# элемента, как и курсор; LEFT JOIN даёт строку с курсором и без очереди
+_WINDOW = text(
+    """
+    SELECT u.history_cursor, w.idx, w.vk_id,
+           p.first_name, p.last_name, p.domain,
+           ph.id, ph.photo_id, ph.owner_id, ph.url, ph.likes_count,
+           ph.local_path, ph.status
+    FROM users u
+    LEFT JOIN queue_packed q ON q.tg_user_id = u.tg_user_id
+    LEFT JOIN LATERAL (
+        SELECT s.vk_id, greatest(u.history_cursor - :behind, 0) + s.i - 1 AS idx
+        FROM unnest(
+            q.vk_ids[greatest(u.history_cursor - :behind, 0) + 1
+                     : u.history_cursor + :ahead + 1]
+        ) WITH ORDINALITY AS s(vk_id, i)
+    ) w ON true
+    LEFT JOIN profiles p ON p.vk_user_id = w.vk_id
+    LEFT JOIN photos ph ON ph.vk_user_id = w.vk_id
+    WHERE u.tg_user_id = :tg_user_id
+    ORDER BY w.idx, ph.id
+    """
+)
+
+# элементы до курсора, попавшие под удаление, сдвигают курсор назад;
+# оба UPDATE видят исходный массив (общий снимок запроса)
+_REMOVE_FROM_QUEUE = text(
+    """
+    WITH packed AS (
+        UPDATE queue_packed
+        SET vk_ids = ARRAY(
+            SELECT t.x
+            FROM unnest(vk_ids) WITH ORDINALITY AS t(x, i)
+            WHERE t.x <> ALL(CAST(:vk_ids AS integer[]))
+            ORDER BY t.i
+        )
+        WHERE tg_user_id = :tg_user_id
+    )
+    UPDATE users u
+    SET history_cursor = u.history_cursor - (
+        SELECT count(*)
+        FROM queue_packed q, unnest(q.vk_ids) WITH ORDINALITY AS t(x, i)
+        WHERE q.tg_user_id = u.tg_user_id
+          AND t.i <= u.history_cursor
+          AND t.x = ANY(CAST(:vk_ids AS integer[]))
+    )
+    WHERE u.tg_user_id = :tg_user_id
+    """
+)
+
+
+class PackedQueueUserRepository(PostgresUserRepository):
+    """
+    PostgresUserRepository, который хранит очередь упакованным int[]
+    в queue_packed вместо строки queue на каждого кандидата.
+    """
+
+    _move_next_statement = _MOVE_NEXT
+    _move_prev_statement = _MOVE_PREV
+    _window_statement = _WINDOW
+
+    # ================= QUEUE =================
+
+    async def set_queue(
+        self, tg_user_id: int, vk_ids: list[int], exclude_known: bool = False
+    ) -> int:
+        user = await self._get_or_create_user_model(tg_user_id)
+        user.history_cursor = 0
+        await self.session.flush()
+
+        if exclude_known:
+            result = await self.session.execute(
+                _SET_QUEUE_FILTERED,
+                {"tg_user_id": tg_user_id, "vk_ids": list(vk_ids)},
+            )
+            size = result.scalar_one()
+        else:
+            stmt = pg_insert(PackedQueue).values(
+                tg_user_id=tg_user_id, vk_ids=list(vk_ids)
+            )
+            await self.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[PackedQueue.tg_user_id],
+                    set_={"vk_ids": stmt.excluded.vk_ids},
+                )
+            )
+            size = len(vk_ids)
+
+        self._invalidate(invalidation.USER, tg_user_id)
+        await self._commit()
+        return size
+
+    async def get_queue(self, tg_user_id: int) -> list[int]:
+        result = await self.session.execute(
+            select(PackedQueue.vk_ids).where(PackedQueue.tg_user_id == tg_user_id)
+        )
+        return list(result.scalar_one_or_none() or [])
+
+    async def stream_queue(self, tg_user_id: int, batch_size: int = 1000) -> AsyncIterator[int]:
+        # массив целиком читает сервер, клиент получает его по batch_size
+        async for vk_id in self._stream(_QUEUE_ITEMS, {"tg_user_id": tg_user_id}, batch_size):
+            yield vk_id
+
+    async def get_current_vk_id(self, tg_user_id: int) -> int | None:
+        result = await self.session.execute(
+            _GET_CURRENT, {"tg_user_id": tg_user_id}
+        )
+        return result.scalar_one_or_none()
+
+    # ================= INTERNAL =================
+
+    async def _clear_queue(self, tg_user_id: int) -> None:
+        await self.session.execute(
+            delete(PackedQueue).where(PackedQueue.tg_user_id == tg_user_id)
+        )
+
+    async def _remove_from_queue(self, tg_user_id: int, vk_ids: list[int]) -> None:
+        await self.session.execute(
+            _REMOVE_FROM_QUEUE,
+            {"tg_user_id": tg_user_id, "vk_ids": list(vk_ids)},
+        )
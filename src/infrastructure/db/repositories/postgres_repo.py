@@ -1,5 +1,14 @@
-from sqlalchemy import select, delete
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import AsyncIterator
+
+from sqlalchemy import (
+    Integer, Interval, String, any_, bindparam, case, exists, func, literal, select, delete,
+    insert, text, true, union, union_all, update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.infrastructure.db import invalidation
 from src.infrastructure.db.repositories.interfaces import UserRepository
 
 from src.infrastructure.db.models import (
@@ -9,31 +18,310 @@ from src.infrastructure.db.models import (
     FavoriteProfile,
     Blacklist,
     QueueItem,
+    SeenProfile,
+    PhotoStatus,
+)
+
+from src.infrastructure.db.schemas.dto import (
+    UserDTO, ProfileDTO, PhotoDTO, PhotoJobDTO, CardDTO, QueueWindowDTO, FavoritesPageDTO,
+)
+
+
+# начиная с этого размера очередь пишется через COPY (только asyncpg)
+QUEUE_COPY_THRESHOLD = 500
+
+
+def _build_window_statement():
+    # собирается один раз: построение и ключ кэша такого запроса на
+    # каждый вызов стоили дороже, чем его выполнение
+    users = User.__table__
+    queue = QueueItem.__table__
+    profiles = Profile.__table__
+    photos = Photo.__table__
+    tg_user_id = bindparam("tg_user_id", type_=Integer)
+
+    cursor = (
+        select(users.c.history_cursor)
+        .where(users.c.tg_user_id == tg_user_id)
+        .scalar_subquery()
+    )
+    # обе части идут по ix_queue_tg_user_id_position от курсора
+    before = (
+        select(queue.c.position, queue.c.vk_profile_id)
+        .where(queue.c.tg_user_id == tg_user_id, queue.c.position < cursor)
+        .order_by(queue.c.position.desc())
+        .limit(bindparam("behind", type_=Integer))
+    )
+    after = (
+        select(queue.c.position, queue.c.vk_profile_id)
+        .where(queue.c.tg_user_id == tg_user_id, queue.c.position >= cursor)
+        .order_by(queue.c.position)
+        .limit(bindparam("ahead", type_=Integer) + 1)
+    )
+    window = union_all(before, after).subquery("queue_window")
+
+    # пользователь без очереди всё равно даёт одну строку - с курсором
+    return (
+        select(
+            users.c.history_cursor,
+            window.c.position,
+            window.c.vk_profile_id,
+            profiles.c.first_name,
+            profiles.c.last_name,
+            profiles.c.domain,
+            photos.c.id,
+            photos.c.photo_id,
+            photos.c.owner_id,
+            photos.c.url,
+            photos.c.likes_count,
+            photos.c.local_path,
+            photos.c.status,
+        )
+        .select_from(users)
+        .outerjoin(window, true())
+        .outerjoin(profiles, profiles.c.vk_user_id == window.c.vk_profile_id)
+        .outerjoin(photos, photos.c.vk_user_id == window.c.vk_profile_id)
+        .where(users.c.tg_user_id == tg_user_id)
+        .order_by(window.c.position, photos.c.id)
+    )
+
+
+
+_WINDOW = _build_window_statement()
+
+# горячие чтения: Core-запросы по явным колонкам собираются один раз,
+# DTO строятся прямо из кортежей строк - без identity map, инструментации
+# атрибутов ORM, построения запроса и ключа кэша на каждый вызов.
+# Порядок колонок совпадает с порядком полей DTO.
+
+_users = User.__table__
+_profiles = Profile.__table__
+_photos = Photo.__table__
+_queue = QueueItem.__table__
+_favorites = FavoriteProfile.__table__
+_blacklist = Blacklist.__table__
+
+_USER_COLUMNS = (
+    _users.c.tg_user_id,
+    _users.c.vk_access_token,
+    _users.c.vk_user_id,
+    _users.c.filter_city_name,
+    _users.c.filter_city_id,
+    _users.c.filter_gender,
+    _users.c.filter_age_from,
+    _users.c.filter_age_to,
+    _users.c.history_cursor,
+)
+_PROFILE_COLUMNS = (
+    _profiles.c.vk_user_id,
+    _profiles.c.first_name,
+    _profiles.c.last_name,
+    _profiles.c.domain,
+)
+_PHOTO_COLUMNS = (
+    _photos.c.photo_id,
+    _photos.c.owner_id,
+    _photos.c.url,
+    _photos.c.likes_count,
+    _photos.c.local_path,
+    _photos.c.status,
 )
 
-from src.infrastructure.db.schemas.dto import UserDTO, ProfileDTO, PhotoDTO
+_USER_BY_ID = select(*_USER_COLUMNS).where(
+    _users.c.tg_user_id == bindparam("tg_user_id", type_=Integer)
+)
+
+_CURSOR = select(_users.c.history_cursor).where(
+    _users.c.tg_user_id == bindparam("tg_user_id", type_=Integer)
+)
+
+_CURRENT_VK_ID = (
+    select(_queue.c.vk_profile_id)
+    .where(
+        _queue.c.tg_user_id == bindparam("tg_user_id", type_=Integer),
+        _queue.c.position >= _CURSOR.scalar_subquery(),
+    )
+    .order_by(_queue.c.position)
+    .limit(1)
+)
 
+# избранное и очередь по порядку добавления; оба идут по индексу
+# (tg_user_id, id) / (tg_user_id, position) без сортировки
+_FAVORITES = (
+    select(_favorites.c.vk_profile_id)
+    .where(_favorites.c.tg_user_id == bindparam("tg_user_id", type_=Integer))
+    .order_by(_favorites.c.id)
+)
+
+# keyset: следующая страница начинается после id последней строки
+# предыдущей, без OFFSET - стоимость не зависит от номера страницы
+_FAVORITES_PAGE = (
+    select(_favorites.c.id, _favorites.c.vk_profile_id)
+    .where(
+        _favorites.c.tg_user_id == bindparam("tg_user_id", type_=Integer),
+        _favorites.c.id > bindparam("after_id", type_=Integer),
+    )
+    .order_by(_favorites.c.id)
+    .limit(bindparam("limit", type_=Integer))
+)
+
+# по uq_blacklist_tg_user_id_vk_profile_id - index-only scan без сортировки
+_BLACKLIST = (
+    select(_blacklist.c.vk_profile_id)
+    .where(_blacklist.c.tg_user_id == bindparam("tg_user_id", type_=Integer))
+    .order_by(_blacklist.c.vk_profile_id)
+)
+
+# обе части - точечные проверки по уникальным индексам (tg_user_id, vk_profile_id)
+_EXCLUDED = union(
+    select(_blacklist.c.vk_profile_id).where(
+        _blacklist.c.tg_user_id == bindparam("tg_user_id", type_=Integer),
+        _blacklist.c.vk_profile_id == any_(bindparam("vk_ids", type_=ARRAY(Integer))),
+    ),
+    select(_favorites.c.vk_profile_id).where(
+        _favorites.c.tg_user_id == bindparam("tg_user_id", type_=Integer),
+        _favorites.c.vk_profile_id == any_(bindparam("vk_ids", type_=ARRAY(Integer))),
+    ),
+)
+
+_QUEUE = (
+    select(_queue.c.vk_profile_id)
+    .where(_queue.c.tg_user_id == bindparam("tg_user_id", type_=Integer))
+    .order_by(_queue.c.position)
+)
+
+_PROFILE_BY_ID = select(*_PROFILE_COLUMNS).where(
+    _profiles.c.vk_user_id == bindparam("vk_user_id", type_=Integer)
+)
+
+_PROFILES_MANY = select(*_PROFILE_COLUMNS).where(
+    _profiles.c.vk_user_id == any_(bindparam("vk_user_ids", type_=ARRAY(Integer)))
+)
+
+_PHOTOS_BY_OWNER = (
+    select(*_PHOTO_COLUMNS)
+    .where(_photos.c.vk_user_id == bindparam("vk_user_id", type_=Integer))
+    .order_by(_photos.c.id)
+)
+
+_PHOTOS_MANY = (
+    select(_photos.c.vk_user_id, *_PHOTO_COLUMNS)
+    .where(_photos.c.vk_user_id == any_(bindparam("vk_user_ids", type_=ARRAY(Integer))))
+    .order_by(_photos.c.id)
+)
+
+# двойной тап: два INSERT одного tg_user_id не падают на PK, второй
+# получает существующую строку. SELECT видит снимок на начало запроса -
+# строку, вставленную параллельно и закоммиченную после него, вернёт
+# только повторный _USER_BY_ID.
+# text(): insert диалекта postgresql не кэшируется SQLAlchemy и
+# компилировался бы заново на каждый вызов
+_USER_COLUMN_LIST = ", ".join(column.name for column in _USER_COLUMNS)
+_CREATE_USER = text(f"""
+    WITH created AS (
+        INSERT INTO users (tg_user_id, history_cursor)
+        VALUES (:tg_user_id, 0)
+        ON CONFLICT (tg_user_id) DO NOTHING
+        RETURNING {_USER_COLUMN_LIST}
+    )
+    SELECT * FROM created
+    UNION ALL
+    SELECT {_USER_COLUMN_LIST} FROM users WHERE tg_user_id = :tg_user_id
+""")
+
+# свайп: FOR UPDATE в locked - параллельный двойной тап ждёт блокировку
+# строки users и читает уже сдвинутый курсор, а не перезаписывает его.
+# Карточка, с которой уходит пользователь, попадает в seen_profiles тем
+# же запросом, если курсор сдвинулся. text() - по той же причине, что
+# и _CREATE_USER: это был самый частый запрос бота.
+_MOVE_TEMPLATE = """
+    WITH locked AS (
+        SELECT history_cursor FROM users
+        WHERE tg_user_id = :tg_user_id
+        FOR UPDATE
+    ),
+    current_card AS (
+        SELECT tg_user_id, vk_profile_id FROM queue
+        WHERE tg_user_id = :tg_user_id
+          AND position >= (SELECT history_cursor FROM locked)
+        ORDER BY position
+        LIMIT 1
+    ),
+    target AS (
+        SELECT tg_user_id, position, vk_profile_id FROM queue
+        WHERE tg_user_id = :tg_user_id
+          AND {target}
+    ),
+    mark_seen AS (
+        INSERT INTO seen_profiles (tg_user_id, vk_profile_id)
+        SELECT tg_user_id, vk_profile_id FROM current_card
+        WHERE EXISTS (SELECT 1 FROM target)
+        ON CONFLICT DO NOTHING
+    )
+    UPDATE users SET history_cursor = target.position, last_active_at = now()
+    FROM target
+    WHERE users.tg_user_id = target.tg_user_id
+    RETURNING target.vk_profile_id
+"""
+
+# уведомление уходит вместе с COMMIT; свайпы не публикуются (см. _invalidate)
+_NOTIFY = text(f"SELECT pg_notify('{invalidation.CHANNEL}', :payload)")
+
+_MOVE_NEXT = text(_MOVE_TEMPLATE.format(target="""position >= (SELECT history_cursor FROM locked)
+        ORDER BY position
+        OFFSET 1 LIMIT 1"""))
+
+_MOVE_PREV = text(_MOVE_TEMPLATE.format(target="""position < (SELECT history_cursor FROM locked)
+        ORDER BY position DESC
+        LIMIT 1"""))
 
 
 class PostgresUserRepository(UserRepository):
+    # запросы свайпа и get_window; PackedQueueUserRepository подменяет свои
+    _move_next_statement = _MOVE_NEXT
+    _move_prev_statement = _MOVE_PREV
+    _window_statement = _WINDOW
+
     def __init__(self, session: AsyncSession):
         self.session = session
+        self._in_transaction = False
+        # вид ключа -> id, изменённые до ближайшего COMMIT
+        self._invalidations: dict[str, set[int]] = {}
+
+    # ================= UNIT OF WORK =================
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["PostgresUserRepository"]:
+        """
+        Внутри блока методы репозитория только делают flush,
+        commit выполняется один раз на выходе (rollback - при ошибке).
+        Вложенный блок присоединяется к внешнему.
+        """
+        if self._in_transaction:
+            yield self
+            return
+
+        self._in_transaction = True
+        try:
+            yield self
+            await self._publish_invalidations()
+            await self.session.commit()
+        except BaseException:
+            self._invalidations.clear()
+            await self.session.rollback()
+            raise
+        finally:
+            self._in_transaction = False
 
     # ================= USERS =================
 
     async def get_or_create_user(self, tg_user_id: int) -> UserDTO:
-        result = await self.session.execute(
-            select(User).where(User.tg_user_id == tg_user_id)
-        )
-        user = result.scalar_one_or_none()
-
-        if not user:
-            user = User(tg_user_id=tg_user_id)
-            self.session.add(user)
-            await self.session.commit()
-            await self.session.refresh(user)
-
-        return self._to_user_dto(user)
+        params = {"tg_user_id": tg_user_id}
+        row = (await self.session.execute(_CREATE_USER, params)).first()
+        if row is None:
+            row = (await self.session.execute(_USER_BY_ID, params)).one()
+        await self._commit()
+        return UserDTO(*row)
 
     async def upsert_user_token_and_vk_id(
         self, tg_user_id: int, vk_access_token: str, vk_user_id: int
@@ -41,7 +329,8 @@ class PostgresUserRepository(UserRepository):
         user = await self._get_or_create_user_model(tg_user_id)
         user.vk_access_token = vk_access_token
         user.vk_user_id = vk_user_id
-        await self.session.commit()
+        self._invalidate(invalidation.USER, tg_user_id)
+        await self._commit()
 
     async def update_filters(
         self,
@@ -61,31 +350,44 @@ class PostgresUserRepository(UserRepository):
         user.filter_city_id = city_id
         user.history_cursor = 0
 
-        await self.session.execute(
-            delete(QueueItem).where(QueueItem.tg_user_id == tg_user_id)
-        )
+        await self._clear_queue(tg_user_id)
 
-        await self.session.commit()
+        self._invalidate(invalidation.USER, tg_user_id)
+        await self._commit()
 
     async def get_cursor(self, tg_user_id: int) -> int:
-        result = await self.session.execute(
-            select(User.history_cursor).where(User.tg_user_id == tg_user_id)
-        )
+        result = await self.session.execute(_CURSOR, {"tg_user_id": tg_user_id})
         return result.scalar_one_or_none() or 0
 
     async def set_cursor(self, tg_user_id: int, cursor: int) -> None:
         user = await self._get_or_create_user_model(tg_user_id)
         user.history_cursor = cursor
-        await self.session.commit()
+        self._invalidate(invalidation.USER, tg_user_id)
+        await self._commit()
 
     # ================= FAVORITES =================
 
     async def add_favorite(self, tg_user_id: int, vk_profile_id: int) -> None:
-        self.session.add(FavoriteProfile(
-            tg_user_id=tg_user_id,
-            vk_profile_id=vk_profile_id
-        ))
-        await self.session.commit()
+        await self.add_favorites_many(tg_user_id, [vk_profile_id])
+
+    async def add_favorites_many(self, tg_user_id: int, vk_profile_ids: list[int]) -> None:
+        # повторное добавление - не ошибка: ON CONFLICT DO NOTHING вместо
+        # IntegrityError и отката сессии
+        if vk_profile_ids:
+            await self.session.execute(
+                pg_insert(FavoriteProfile).on_conflict_do_nothing(
+                    index_elements=[
+                        FavoriteProfile.tg_user_id,
+                        FavoriteProfile.vk_profile_id,
+                    ]
+                ),
+                [
+                    {"tg_user_id": tg_user_id, "vk_profile_id": vk_id}
+                    for vk_id in vk_profile_ids
+                ],
+            )
+            self._invalidate(invalidation.EXCLUDED, tg_user_id)
+        await self._commit()
 
     async def remove_favorite(self, tg_user_id: int, vk_profile_id: int) -> None:
         await self.session.execute(
@@ -94,172 +396,585 @@ class PostgresUserRepository(UserRepository):
                 FavoriteProfile.vk_profile_id == vk_profile_id,
             )
         )
-        await self.session.commit()
+        self._invalidate(invalidation.EXCLUDED, tg_user_id)
+        await self._commit()
 
     async def list_favorites(self, tg_user_id: int) -> list[int]:
+        result = await self.session.execute(_FAVORITES, {"tg_user_id": tg_user_id})
+        return list(result.scalars())
+
+    async def list_favorites_page(
+        self, tg_user_id: int, after_id: int | None = None, limit: int = 50
+    ) -> FavoritesPageDTO:
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        # на строку больше: так известно, есть ли следующая страница
         result = await self.session.execute(
-            select(FavoriteProfile.vk_profile_id)
-            .where(FavoriteProfile.tg_user_id == tg_user_id)
+            _FAVORITES_PAGE,
+            {"tg_user_id": tg_user_id, "after_id": after_id or 0, "limit": limit + 1},
         )
-        return list(result.scalars())
+        rows = result.all()
+
+        page = FavoritesPageDTO(vk_ids=[vk_id for _, vk_id in rows[:limit]])
+        if len(rows) > limit:
+            page.next_after_id = rows[limit - 1][0]
+        return page
+
+    async def stream_favorites(
+        self, tg_user_id: int, batch_size: int = 1000
+    ) -> AsyncIterator[int]:
+        async for vk_id in self._stream(_FAVORITES, {"tg_user_id": tg_user_id}, batch_size):
+            yield vk_id
 
     # ================= BLACKLIST =================
 
     async def add_blacklist(self, tg_user_id: int, vk_profile_id: int) -> None:
-        self.session.add(Blacklist(
-            tg_user_id=tg_user_id,
-            vk_profile_id=vk_profile_id
-        ))
-        await self.session.execute(
-            delete(QueueItem).where(
-                QueueItem.tg_user_id == tg_user_id,
-                QueueItem.vk_profile_id == vk_profile_id,
+        await self.add_blacklist_many(tg_user_id, [vk_profile_id])
+
+    async def add_blacklist_many(self, tg_user_id: int, vk_profile_ids: list[int]) -> None:
+        if vk_profile_ids:
+            await self.session.execute(
+                pg_insert(Blacklist).on_conflict_do_nothing(
+                    index_elements=[Blacklist.tg_user_id, Blacklist.vk_profile_id]
+                ),
+                [
+                    {"tg_user_id": tg_user_id, "vk_profile_id": vk_id}
+                    for vk_id in vk_profile_ids
+                ],
             )
-        )
-        await self.session.commit()
+            await self._remove_from_queue(tg_user_id, vk_profile_ids)
+            self._invalidate(invalidation.EXCLUDED, tg_user_id)
+        await self._commit()
 
-    # ================= QUEUE =================
+    async def list_blacklist(self, tg_user_id: int) -> list[int]:
+        result = await self.session.execute(_BLACKLIST, {"tg_user_id": tg_user_id})
+        return list(result.scalars())
 
-    async def set_queue(self, tg_user_id: int, vk_ids: list[int]) -> None:
-        await self.session.execute(
-            delete(QueueItem).where(QueueItem.tg_user_id == tg_user_id)
+    async def is_excluded_many(self, tg_user_id: int, vk_ids: list[int]) -> set[int]:
+        if not vk_ids:
+            return set()
+        result = await self.session.execute(
+            _EXCLUDED, {"tg_user_id": tg_user_id, "vk_ids": list(vk_ids)}
         )
+        return set(result.scalars())
 
-        for pos, vk_id in enumerate(vk_ids):
-            self.session.add(QueueItem(
-                tg_user_id=tg_user_id,
-                vk_profile_id=vk_id,
-                position=pos,
-            ))
+    # ================= QUEUE =================
 
+    async def set_queue(
+        self, tg_user_id: int, vk_ids: list[int], exclude_known: bool = False
+    ) -> int:
+        """
+        Заменяет очередь пользователя и сбрасывает курсор.
+
+        exclude_known=True отбрасывает прямо в БД анкеты из чёрного списка,
+        избранного и уже просмотренные. Возвращает длину новой очереди.
+        """
         user = await self._get_or_create_user_model(tg_user_id)
         user.history_cursor = 0
 
-        await self.session.commit()
+        await self._clear_queue(tg_user_id)
+
+        if exclude_known:
+            size = await self._insert_queue_filtered(tg_user_id, vk_ids)
+        else:
+            await self._insert_queue(tg_user_id, vk_ids)
+            size = len(vk_ids)
+
+        self._invalidate(invalidation.USER, tg_user_id)
+        await self._commit()
+        return size
 
     async def get_queue(self, tg_user_id: int) -> list[int]:
-        result = await self.session.execute(
-            select(QueueItem.vk_profile_id)
-            .where(QueueItem.tg_user_id == tg_user_id)
-            .order_by(QueueItem.position)
-        )
+        result = await self.session.execute(_QUEUE, {"tg_user_id": tg_user_id})
         return list(result.scalars())
 
+    async def stream_queue(self, tg_user_id: int, batch_size: int = 1000) -> AsyncIterator[int]:
+        async for vk_id in self._stream(_QUEUE, {"tg_user_id": tg_user_id}, batch_size):
+            yield vk_id
+
+    # history_cursor хранит position текущей карточки. После add_blacklist
+    # в нумерации бывают дыры, поэтому текущей считается первая строка
+    # с position >= cursor. Каждая операция - один запрос по индексу
+    # queue(tg_user_id, position), очередь целиком не читается.
+
     async def get_current_vk_id(self, tg_user_id: int) -> int | None:
-        queue = await self.get_queue(tg_user_id)
-        cursor = await self.get_cursor(tg_user_id)
-        if 0 <= cursor < len(queue):
-            return queue[cursor]
-        return None
+        result = await self.session.execute(_CURRENT_VK_ID, {"tg_user_id": tg_user_id})
+        return result.scalar_one_or_none()
 
     async def move_next(self, tg_user_id: int) -> int | None:
-        user = await self._get_or_create_user_model(tg_user_id)
-        queue = await self.get_queue(tg_user_id)
+        return await self._move(self._move_next_statement, tg_user_id)
 
-        if user.history_cursor + 1 < len(queue):
-            user.history_cursor += 1
-            await self.session.commit()
-            return queue[user.history_cursor]
+    async def move_prev(self, tg_user_id: int) -> int | None:
+        return await self._move(self._move_prev_statement, tg_user_id)
+
+    async def get_window(
+        self, tg_user_id: int, ahead: int = 3, behind: int = 0
+    ) -> QueueWindowDTO:
+        """
+        Текущая карточка, до `ahead` следующих и до `behind` предыдущих
+        вместе с профилями и фото - одним запросом.
+        """
+        result = await self.session.execute(
+            self._window_statement,
+            {"tg_user_id": tg_user_id, "ahead": max(ahead, 0), "behind": max(behind, 0)},
+        )
+        return _window_from_rows(result.all())
 
-        return None
+    # ================= PROFILES =================
 
-    async def move_prev(self, tg_user_id: int) -> int | None:
-        user = await self._get_or_create_user_model(tg_user_id)
-        queue = await self.get_queue(tg_user_id)
+    async def upsert_profile(self, profile: ProfileDTO) -> None:
+        await self.upsert_profiles([profile])
+
+    async def upsert_profiles(self, profiles: list[ProfileDTO]) -> None:
+        # ON CONFLICT не может дважды обновить одну строку в одном запросе,
+        # поэтому дубликаты внутри пачки схлопываются (побеждает последний)
+        rows = {
+            p.vk_user_id: {
+                "vk_user_id": p.vk_user_id,
+                "first_name": p.first_name,
+                "last_name": p.last_name,
+                "domain": p.domain,
+            }
+            for p in profiles
+        }
+        if not rows:
+            return
+
+        stmt = pg_insert(Profile)
+        await self.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[Profile.vk_user_id],
+                set_={
+                    "first_name": stmt.excluded.first_name,
+                    "last_name": stmt.excluded.last_name,
+                    "domain": stmt.excluded.domain,
+                },
+            ),
+            list(rows.values()),
+        )
+        self._invalidate(invalidation.PROFILE, *rows)
+        await self._commit()
 
-        if user.history_cursor > 0:
-            user.history_cursor -= 1
-            await self.session.commit()
-            return queue[user.history_cursor]
+    async def get_profile(self, vk_user_id: int) -> ProfileDTO | None:
+        result = await self.session.execute(_PROFILE_BY_ID, {"vk_user_id": vk_user_id})
+        row = result.first()
+        return ProfileDTO(*row) if row is not None else None
 
-        return None
+    async def set_photos(self, vk_user_id: int, photos: list[PhotoDTO]) -> None:
+        await self.session.execute(
+            delete(Photo).where(Photo.vk_user_id == vk_user_id)
+        )
 
-    # ================= PROFILES =================
+        if photos:
+            await self.session.execute(
+                insert(Photo),
+                [
+                    {
+                        "vk_user_id": vk_user_id,
+                        "photo_id": p.photo_id,
+                        "owner_id": p.owner_id,
+                        "url": p.url,
+                        "likes_count": p.likes_count,
+                        "local_path": p.local_path,
+                        "status": p.status or PhotoStatus.PENDING,
+                    }
+                    for p in photos
+                ],
+            )
+
+        self._invalidate(invalidation.PHOTOS, vk_user_id)
+        await self._commit()
+
+    async def get_photos(self, vk_user_id: int) -> list[PhotoDTO]:
+        result = await self.session.execute(_PHOTOS_BY_OWNER, {"vk_user_id": vk_user_id})
+        return [PhotoDTO(*row) for row in result]
+
+    # батч-чтение: один запрос `= ANY(:ids)` на таблицу вместо N+1
+
+    async def get_profiles_many(self, vk_user_ids: list[int]) -> dict[int, ProfileDTO]:
+        if not vk_user_ids:
+            return {}
 
-    async def upsert_profile(self, profile: ProfileDTO) -> None:
         result = await self.session.execute(
-            select(Profile).where(Profile.vk_user_id == profile.vk_user_id)
+            _PROFILES_MANY, {"vk_user_ids": list(vk_user_ids)}
         )
-        model = result.scalar_one_or_none()
+        return {row[0]: ProfileDTO(*row) for row in result}
 
-        if not model:
-            model = Profile(**profile.__dict__)
-            self.session.add(model)
-        else:
-            model.first_name = profile.first_name
-            model.last_name = profile.last_name
-            model.domain = profile.domain
+    async def get_photos_many(self, vk_user_ids: list[int]) -> dict[int, list[PhotoDTO]]:
+        photos: dict[int, list[PhotoDTO]] = {vk_id: [] for vk_id in vk_user_ids}
+        if not vk_user_ids:
+            return photos
 
-        await self.session.commit()
+        result = await self.session.execute(
+            _PHOTOS_MANY, {"vk_user_ids": list(vk_user_ids)}
+        )
+        for vk_user_id, *row in result:
+            photos[vk_user_id].append(PhotoDTO(*row))
+        return photos
+
+    async def get_cards(self, vk_user_ids: list[int]) -> dict[int, CardDTO]:
+        profiles = await self.get_profiles_many(vk_user_ids)
+        photos = await self.get_photos_many(vk_user_ids)
+        return {
+            vk_id: CardDTO(
+                vk_user_id=vk_id,
+                profile=profiles.get(vk_id),
+                photos=photos[vk_id],
+            )
+            for vk_id in vk_user_ids
+        }
+
+    # ================= PHOTO FILES =================
+
+    async def claim_pending_photos(
+        self, limit: int, worker_id: str, lease_seconds: float = 300.0, max_attempts: int = 3
+    ) -> list[PhotoJobDTO]:
+        """
+        Забирает до `limit` pending-строк на `worker_id` до истечения lease.
+
+        SKIP LOCKED: параллельные воркеры (в т.ч. в других процессах) берут
+        разные строки и не ждут друг друга. Тем же запросом строки с
+        истёкшим lease возвращаются в pending - их заберёт следующий вызов,
+        а исчерпавшие max_attempts (воркер падал на них) становятся failed.
+        """
+        photos = Photo.__table__
+        lease = literal(timedelta(seconds=lease_seconds), Interval())
+
+        expired = (
+            select(photos.c.id)
+            .where(
+                photos.c.status == PhotoStatus.CLAIMED,
+                photos.c.lease_until < func.now(),
+            )
+            .with_for_update(skip_locked=True)
+            .cte("expired")
+        )
+        exhausted = photos.c.attempts >= max_attempts
+        release = (
+            update(photos)
+            .where(photos.c.id.in_(select(expired.c.id)))
+            .values(
+                status=case((exhausted, PhotoStatus.FAILED), else_=PhotoStatus.PENDING),
+                claimed_by=None,
+                lease_until=None,
+                last_error=case((exhausted, "lease expired"), else_=photos.c.last_error),
+            )
+            .cte("released")
+        )
+        picked = (
+            select(photos.c.id)
+            .where(photos.c.status == PhotoStatus.PENDING)
+            .order_by(photos.c.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .cte("picked")
+        )
 
-    async def get_profile(self, vk_user_id: int) -> ProfileDTO | None:
         result = await self.session.execute(
-            select(Profile).where(Profile.vk_user_id == vk_user_id)
+            update(photos)
+            .where(photos.c.id == picked.c.id)
+            .values(
+                status=PhotoStatus.CLAIMED,
+                claimed_by=worker_id,
+                lease_until=func.now() + lease,
+                attempts=photos.c.attempts + 1,
+            )
+            .returning(photos.c.id, photos.c.vk_user_id, photos.c.url, photos.c.attempts)
+            .add_cte(release)
         )
-        model = result.scalar_one_or_none()
+        jobs = [
+            PhotoJobDTO(
+                id=row.id,
+                vk_user_id=row.vk_user_id,
+                url=row.url,
+                attempts=row.attempts,
+                worker_id=worker_id,
+            )
+            for row in result
+        ]
+        await self._commit()
+        return sorted(jobs, key=lambda job: job.id)
 
-        if not model:
-            return None
+    # complete/fail меняют строку, только пока она за тем же воркером:
+    # если lease истёк и строку забрал другой, поздний результат теряется
 
-        return ProfileDTO(
-            vk_user_id=model.vk_user_id,
-            first_name=model.first_name,
-            last_name=model.last_name,
-            domain=model.domain,
-        )
+    async def complete_photos(self, jobs: list[PhotoJobDTO]) -> None:
+        if not jobs:
+            return
 
-    async def set_photos(self, vk_user_id: int, photos: list[PhotoDTO]) -> None:
+        photos = Photo.__table__
         await self.session.execute(
-            delete(Photo).where(Photo.vk_user_id == vk_user_id)
+            update(photos)
+            .where(
+                photos.c.id == bindparam("job_id"),
+                photos.c.claimed_by.is_not_distinct_from(bindparam("job_worker")),
+            )
+            .values(
+                local_path=bindparam("job_path"),
+                status=PhotoStatus.DONE,
+                claimed_by=None,
+                lease_until=None,
+                last_error=None,
+            ),
+            [
+                {"job_id": job.id, "job_worker": job.worker_id, "job_path": job.local_path}
+                for job in jobs
+            ],
         )
+        self._invalidate(invalidation.PHOTOS, *(job.vk_user_id for job in jobs))
+        await self._commit()
 
-        for p in photos:
-            self.session.add(Photo(**p.__dict__))
-
-        await self.session.commit()
+    async def fail_photos(self, jobs: list[PhotoJobDTO], max_attempts: int = 3) -> None:
+        """Строка снова ждёт скачивания, пока attempts < max_attempts, потом failed."""
+        if not jobs:
+            return
 
-    async def get_photos(self, vk_user_id: int) -> list[PhotoDTO]:
+        photos = Photo.__table__
+        await self.session.execute(
+            update(photos)
+            .where(
+                photos.c.id == bindparam("job_id"),
+                photos.c.claimed_by.is_not_distinct_from(bindparam("job_worker")),
+            )
+            .values(
+                status=case(
+                    (photos.c.attempts >= max_attempts, PhotoStatus.FAILED),
+                    else_=PhotoStatus.PENDING,
+                ),
+                claimed_by=None,
+                lease_until=None,
+                last_error=bindparam("job_error"),
+            ),
+            [
+                {"job_id": job.id, "job_worker": job.worker_id, "job_error": job.error}
+                for job in jobs
+            ],
+        )
+        self._invalidate(invalidation.PHOTOS, *(job.vk_user_id for job in jobs))
+        await self._commit()
+
+    async def reset_photo_files(self, local_paths: list[str]) -> list[int]:
+        """
+        Файлы вытеснены из локального кэша: строки снова ждут скачивания.
+        Пути PhotoStore начинаются с его store_id, поэтому сбрасываются
+        только строки хранилища, которое вытеснило файлы.
+        Возвращает vk_user_id затронутых профилей.
+        """
+        if not local_paths:
+            return []
+
+        photos = Photo.__table__
         result = await self.session.execute(
-            select(Photo).where(Photo.vk_user_id == vk_user_id)
+            update(photos)
+            .where(photos.c.local_path == any_(literal(list(local_paths), ARRAY(String))))
+            .values(local_path=None, status=PhotoStatus.PENDING)
+            .returning(photos.c.vk_user_id)
         )
-        models = result.scalars().all()
-
-        return [
-            PhotoDTO(
-                photo_id=m.photo_id,
-                owner_id=m.owner_id,
-                url=m.url,
-                likes_count=m.likes_count,
-                local_path=m.local_path,
-                status=m.status,
-            )
-            for m in models
-        ]
+        vk_user_ids = sorted(set(result.scalars()))
+        self._invalidate(invalidation.PHOTOS, *vk_user_ids)
+        await self._commit()
+        return vk_user_ids
 
     # ================= INTERNAL =================
 
+    async def _commit(self) -> None:
+        if self._in_transaction:
+            await self.session.flush()
+        else:
+            await self._publish_invalidations()
+            await self.session.commit()
+
+    def _invalidate(self, kind: str, *ids: int) -> None:
+        """
+        Ключи кэшей других процессов, которые надо сбросить после COMMIT.
+
+        Свайпы (move_next/move_prev) не публикуются: это самый частый
+        запрос, а NOTIFY добавляет round trip и общую для всей БД
+        блокировку очереди уведомлений на COMMIT. Поэтому history_cursor
+        в UserDTO из кэша может отставать - актуальный курсор даёт
+        get_cursor, который не кэшируется.
+        """
+        self._invalidations.setdefault(kind, set()).update(ids)
+
+    async def _publish_invalidations(self) -> None:
+        if not self._invalidations:
+            return
+        payloads = invalidation.encode(self._invalidations, invalidation.origin())
+        self._invalidations = {}
+        for payload in payloads:
+            await self.session.execute(_NOTIFY, {"payload": payload})
+
     async def _get_or_create_user_model(self, tg_user_id: int) -> User:
+        # курсор двигается Core-запросом мимо identity map - перечитываем строку
         result = await self.session.execute(
-            select(User).where(User.tg_user_id == tg_user_id)
+            select(User)
+            .where(User.tg_user_id == tg_user_id)
+            .execution_options(populate_existing=True)
         )
         user = result.scalar_one_or_none()
 
-        if not user:
-            user = User(tg_user_id=tg_user_id)
-            self.session.add(user)
-            await self.session.flush()
+        if user:
+            # каждая запись пользователя - активность для retention
+            user.last_active_at = func.now()
+        else:
+            # не session.add: параллельная вставка той же строки упала бы на PK
+            await self.session.execute(
+                pg_insert(User).values(tg_user_id=tg_user_id, history_cursor=0)
+                .on_conflict_do_nothing()
+            )
+            result = await self.session.execute(
+                select(User).where(User.tg_user_id == tg_user_id)
+            )
+            user = result.scalar_one()
 
         return user
 
-    def _to_user_dto(self, user: User) -> UserDTO:
-        return UserDTO(
-            tg_user_id=user.tg_user_id,
-            vk_access_token=user.vk_access_token,
-            vk_user_id=user.vk_user_id,
-            filter_city_name=user.filter_city_name,
-            filter_city_id=user.filter_city_id,
-            filter_gender=user.filter_gender,
-            filter_age_from=user.filter_age_from,
-            filter_age_to=user.filter_age_to,
-            history_cursor=user.history_cursor,
-        )
\ No newline at end of file
+    async def _clear_queue(self, tg_user_id: int) -> None:
+        await self.session.execute(
+            delete(QueueItem).where(QueueItem.tg_user_id == tg_user_id)
+        )
+
+    async def _remove_from_queue(self, tg_user_id: int, vk_ids: list[int]) -> None:
+        await self.session.execute(
+            delete(QueueItem).where(
+                QueueItem.tg_user_id == tg_user_id,
+                QueueItem.vk_profile_id == any_(_int_array(vk_ids)),
+            )
+        )
+
+    async def _insert_queue(self, tg_user_id: int, vk_ids: list[int]) -> None:
+        """
+        Пишет очередь одним запросом вместо INSERT на каждый элемент.
+
+        Большие очереди на asyncpg идут через COPY в той же транзакции,
+        остальное - через multi-row INSERT (executemany).
+        """
+        if not vk_ids:
+            return
+
+        conn = await self.session.connection()
+
+        if len(vk_ids) >= QUEUE_COPY_THRESHOLD and conn.dialect.driver == "asyncpg":
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                QueueItem.__tablename__,
+                records=[
+                    (tg_user_id, vk_id, pos) for pos, vk_id in enumerate(vk_ids)
+                ],
+                columns=["tg_user_id", "vk_profile_id", "position"],
+            )
+            return
+
+        await self.session.execute(
+            insert(QueueItem),
+            [
+                {"tg_user_id": tg_user_id, "vk_profile_id": vk_id, "position": pos}
+                for pos, vk_id in enumerate(vk_ids)
+            ],
+        )
+
+    async def _stream(self, stmt, params: dict, batch_size: int) -> AsyncIterator:
+        """
+        Значения первой колонки из server-side курсора, по batch_size строк
+        за раз: память клиента не растёт с размером результата.
+        Курсор живёт в транзакции сессии - пока поток не дочитан или не
+        закрыт, сессию нельзя использовать для других запросов.
+        """
+        result = await self.session.stream_scalars(
+            stmt, params, execution_options={"yield_per": batch_size}
+        )
+        try:
+            # пачками: построчный async for переходит в greenlet на каждую строку
+            async for partition in result.partitions():
+                for value in partition:
+                    yield value
+        finally:
+            await result.close()
+
+    async def _move(self, stmt, tg_user_id: int) -> int | None:
+        result = await self.session.execute(stmt, {"tg_user_id": tg_user_id})
+        vk_id = result.scalar_one_or_none()
+        await self._commit()
+        return vk_id
+
+    async def _insert_queue_filtered(self, tg_user_id: int, vk_ids: list[int]) -> int:
+        """
+        INSERT ... SELECT из unnest(:ids) с анти-джойном по blacklist,
+        favorites и seen_profiles: кандидаты не поднимаются в Python.
+        Позиции остаются плотными и в исходном порядке.
+        """
+        if not vk_ids:
+            return 0
+
+        candidates = (
+            func.unnest(_int_array(vk_ids))
+            .table_valued("vk_id", with_ordinality="ord")
+            .render_derived(name="candidates")
+        )
+        vk_id = candidates.c.vk_id
+
+        rows = select(
+            literal(tg_user_id),
+            vk_id,
+            func.row_number().over(order_by=candidates.c.ord) - 1,
+        ).where(
+            ~exists().where(
+                Blacklist.tg_user_id == tg_user_id,
+                Blacklist.vk_profile_id == vk_id,
+            ),
+            ~exists().where(
+                FavoriteProfile.tg_user_id == tg_user_id,
+                FavoriteProfile.vk_profile_id == vk_id,
+            ),
+            ~exists().where(
+                SeenProfile.tg_user_id == tg_user_id,
+                SeenProfile.vk_profile_id == vk_id,
+            ),
+        )
+
+        result = await self.session.execute(
+            insert(QueueItem).from_select(
+                ["tg_user_id", "vk_profile_id", "position"], rows
+            )
+        )
+        return result.rowcount
+
+
+def _window_from_rows(rows) -> QueueWindowDTO:
+    """
+    Собирает окно из строк (cursor, key, vk_id, профиль..., фото...),
+    отсортированных по key. key - позиция или индекс в очереди: всё,
+    что меньше курсора, - карточки позади, первая с key >= cursor - текущая.
+    """
+    if not rows:
+        return QueueWindowDTO(cursor=0)
+
+    window = QueueWindowDTO(cursor=rows[0][0])
+    card = None
+    last_key = None
+
+    for (
+        cursor, key, vk_id, first_name, last_name, domain,
+        photo_pk, photo_id, owner_id, url, likes_count, local_path, status,
+    ) in rows:
+        if vk_id is None:
+            continue
+        if key != last_key:
+            last_key = key
+            profile = None
+            if first_name is not None:
+                profile = ProfileDTO(vk_id, first_name, last_name, domain)
+            card = CardDTO(vk_user_id=vk_id, profile=profile)
+            if window.current_index is None and key >= cursor:
+                window.current_index = len(window.cards)
+            window.cards.append(card)
+        if photo_pk is not None:
+            card.photos.append(
+                PhotoDTO(photo_id, owner_id, url, likes_count, local_path, status)
+            )
+
+    return window
+
+
+def _int_array(values: list[int]):
+    return literal(list(values), ARRAY(Integer))
@@ -0,0 +1,113 @@
+import abc
+import inspect
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from src.infrastructure.db.repositories.delegating_repo import DelegatingUserRepository
+from src.infrastructure.db.repositories.factory import create_user_repository
+from src.infrastructure.db.repositories.interfaces import UserRepository
+from src.infrastructure.db.schemas.dto import QueueWindowDTO
+from src.infrastructure.db.sharding import ShardSessions
+
+
+class ShardedUserRepository(UserRepository):
+    """
+    Направляет каждый вызов в репозиторий нужного шарда: методы с первым
+    аргументом tg_user_id - на шард пользователя, остальные (профили,
+    фото) - на profiles_shard.
+
+    transaction() открывает транзакцию на каждом шарде, к которому
+    обратились внутри блока, и коммитит их по очереди на выходе:
+    атомарность - в пределах шарда, не между шардами.
+
+    Репозиторий шарда шлёт pg_notify в базе шарда: InvalidationListener
+    для кэшей поверх него создаётся со всеми шардами (shards.asyncpg_dsns()).
+    """
+
+    def __init__(self, sessions: ShardSessions, queue_storage: Optional[str] = None):
+        self.sessions = sessions
+        self.shards = sessions.shards
+        self.queue_storage = queue_storage
+        self._repos: dict[int, UserRepository] = {}
+        self._transaction: Optional[AsyncExitStack] = None
+        self._in_transaction: set[int] = set()
+
+    # ================= UNIT OF WORK =================
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["ShardedUserRepository"]:
+        if self._transaction is not None:
+            yield self
+            return
+
+        async with AsyncExitStack() as stack:
+            self._transaction = stack
+            try:
+                yield self
+            finally:
+                self._transaction = None
+                self._in_transaction = set()
+
+    # ================= QUEUE =================
+
+    async def get_window(
+        self, tg_user_id: int, ahead: int = 3, behind: int = 0
+    ) -> QueueWindowDTO:
+        # очередь на шарде пользователя, карточки - на шарде профилей
+        shard = self.shards.shard_for(tg_user_id)
+        window = await (await self._repo(shard)).get_window(tg_user_id, ahead, behind)
+        if shard != self.shards.profiles_shard and window.cards:
+            profiles = await self._repo(self.shards.profiles_shard)
+            cards = await profiles.get_cards([card.vk_user_id for card in window.cards])
+            window.cards = [cards[card.vk_user_id] for card in window.cards]
+        return window
+
+    # ================= INTERNAL =================
+
+    async def _repo(self, shard: int) -> UserRepository:
+        repo = self._repos.get(shard)
+        if repo is None:
+            session = await self.sessions.get(shard)
+            repo = self._repos[shard] = create_user_repository(session, self.queue_storage)
+        if self._transaction is not None and shard not in self._in_transaction:
+            await self._transaction.enter_async_context(repo.transaction())
+            self._in_transaction.add(shard)
+        return repo
+
+    async def _repo_for(self, name: str, args: tuple, kwargs: dict) -> UserRepository:
+        if name in _BY_USER:
+            tg_user_id = args[0] if args else kwargs["tg_user_id"]
+            return await self._repo(self.shards.shard_for(tg_user_id))
+        return await self._repo(self.shards.profiles_shard)
+
+
+def _routed(name: str):
+    if inspect.isasyncgenfunction(getattr(DelegatingUserRepository, name)):
+        async def method(self, *args, **kwargs):
+            repo = await self._repo_for(name, args, kwargs)
+            async for value in getattr(repo, name)(*args, **kwargs):
+                yield value
+    else:
+        async def method(self, *args, **kwargs):
+            repo = await self._repo_for(name, args, kwargs)
+            return await getattr(repo, name)(*args, **kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"ShardedUserRepository.{name}"
+    return method
+
+
+def _first_argument(name: str) -> str:
+    params = list(inspect.signature(getattr(UserRepository, name)).parameters)
+    return params[1] if len(params) > 1 else ""
+
+
+_ROUTED = sorted(UserRepository.__abstractmethods__ - {"transaction", "get_window"})
+# шард выбирается по сигнатуре интерфейса: новый метод с tg_user_id
+# первым аргументом сам пойдёт на шард пользователя
+_BY_USER = frozenset(name for name in _ROUTED if _first_argument(name) == "tg_user_id")
+
+for _name in _ROUTED:
+    setattr(ShardedUserRepository, _name, _routed(_name))
+# методы добавлены после создания класса - ABC пересчитывает абстрактные
+abc.update_abstractmethods(ShardedUserRepository)
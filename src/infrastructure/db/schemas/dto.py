@@ -1,8 +1,11 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import List, Optional
 
+# DTO горячих чтений - slots: их создаётся по несколько на каждый свайп,
+# без __dict__ объект меньше и создаётся быстрее
 
-@dataclass
+
+@dataclass(slots=True)
 class UserDTO:
     tg_user_id: int
     vk_access_token: Optional[str] = None
@@ -15,7 +18,7 @@ class UserDTO:
     history_cursor: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class ProfileDTO:
     vk_user_id: int
     first_name: str
@@ -23,11 +26,46 @@ class ProfileDTO:
     domain: str
 
 
-@dataclass
+@dataclass(slots=True)
 class PhotoDTO:
     photo_id: int
     owner_id: int
     url: str
     likes_count: int
     local_path: Optional[str] = None
-    status: Optional[str] = None
\ No newline at end of file
+    status: Optional[str] = None
+
+
+@dataclass
+class PhotoJobDTO:
+    # строка photos, взятая воркером; local_path или error заполняет он же
+    id: int
+    vk_user_id: int
+    url: str
+    local_path: Optional[str] = None
+    attempts: int = 0
+    worker_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class CardDTO:
+    vk_user_id: int
+    profile: Optional[ProfileDTO] = None
+    photos: List[PhotoDTO] = field(default_factory=list)
+
+
+@dataclass
+class QueueWindowDTO:
+    cursor: int
+    # карточки по порядку очереди: behind до текущей, сама текущая, ahead после
+    cards: List[CardDTO] = field(default_factory=list)
+    # индекс текущей карточки в cards, None - очередь закончилась
+    current_index: Optional[int] = None
+
+
+@dataclass
+class FavoritesPageDTO:
+    vk_ids: List[int] = field(default_factory=list)
+    # after_id для следующей страницы, None - это последняя
+    next_after_id: Optional[int] = None
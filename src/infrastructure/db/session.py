@@ -1,5 +1,10 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -8,10 +13,153 @@ if not DATABASE_URL:
         "DATABASE_URL is not set. Please set environment variable."
     )
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-)
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class PoolSettings:
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = -1
+    pool_pre_ping: bool = False
+    # кэш подготовленных выражений asyncpg на одно соединение, 0 - выключен
+    statement_cache_size: int = 100
+    # сколько соединений warm_up(engine) открывает по умолчанию
+    warmup_connections: int = 0
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        default = cls()
+        return cls(
+            pool_size=int(os.getenv("DB_POOL_SIZE", default.pool_size)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", default.max_overflow)),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", default.pool_timeout)),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", default.pool_recycle)),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", default.pool_pre_ping),
+            statement_cache_size=int(
+                os.getenv("DB_STATEMENT_CACHE_SIZE", default.statement_cache_size)
+            ),
+            warmup_connections=int(
+                os.getenv("DB_WARMUP_CONNECTIONS", default.warmup_connections)
+            ),
+        )
+
+
+class PoolMetrics:
+    """Время ожидания соединения из пула и число таймаутов."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_total += seconds
+        if seconds > self.wait_max:
+            self.wait_max = seconds
+
+    def reset(self) -> None:
+        self.__init__()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool, который замеряет ожидание при checkout."""
+
+    def __init__(
+        self, *args, metrics: PoolMetrics | None = None, max_overflow: int = 10, **kwargs
+    ):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        self.metrics = metrics or PoolMetrics()
+        # у QueuePool лимит overflow есть только в приватном _max_overflow
+        self.max_overflow = max_overflow
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        # engine.dispose() пересоздаёт пул - метрики переживают это
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.record_wait(time.perf_counter() - started)
+
+
+def create_engine(url: str, settings: PoolSettings) -> AsyncEngine:
+    connect_args = {}
+    if "+asyncpg" in url:
+        connect_args["prepared_statement_cache_size"] = settings.statement_cache_size
+
+    return create_async_engine(
+        url,
+        echo=False,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping,
+        connect_args=connect_args,
+    )
+
+
+def pool_status(engine: AsyncEngine) -> dict:
+    """
+    Снимок состояния пула: занятость, насыщение и ожидание checkout.
+    Поля, которых пул не сообщает (лимит overflow, метрики ожидания у
+    пула не из create_engine), равны None.
+    """
+    pool = engine.pool
+    max_overflow = getattr(pool, "max_overflow", None)
+    checked_out = pool.checkedout()
+    metrics = getattr(pool, "metrics", None)
+
+    # max_overflow < 0 - overflow без ограничения, насыщения нет
+    saturation = None
+    if max_overflow is not None and max_overflow >= 0:
+        capacity = pool.size() + max_overflow
+        saturation = checked_out / capacity if capacity else 0.0
+
+    status = {
+        "size": pool.size(),
+        "max_overflow": max_overflow,
+        "checked_out": checked_out,
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "saturation": saturation,
+        "checkouts": None,
+        "timeouts": None,
+        "wait_avg_ms": None,
+        "wait_max_ms": None,
+    }
+    if metrics is not None:
+        status.update(
+            checkouts=metrics.checkouts,
+            timeouts=metrics.timeouts,
+            wait_avg_ms=(
+                metrics.wait_total / metrics.checkouts * 1000 if metrics.checkouts else 0.0
+            ),
+            wait_max_ms=metrics.wait_max * 1000,
+        )
+    return status
+
+
+settings = PoolSettings.from_env()
+
+engine = create_engine(DATABASE_URL, settings)
 
 SessionLocal = async_sessionmaker(
     engine,
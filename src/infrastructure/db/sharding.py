@@ -0,0 +1,115 @@
+"""
+Шардирование по tg_user_id на несколько баз Postgres.
+
+Таблицы пользователя (users, queue, queue_packed, favorites, blacklist,
+seen_profiles) лежат на шарде jump_hash(tg_user_id, N). Общие profiles и
+photos - на одном шарде profiles_shard (по умолчанию 0). Схема на всех
+шардах одинаковая: миграции прогоняются на каждом
+(DATABASE_URL=<url шарда> alembic upgrade head).
+
+DATABASE_SHARD_URLS - адреса шардов через запятую, порядок важен:
+шард - это индекс в списке. Новые шарды добавляются в конец, потом
+src/scripts/rebalance_shards.py переносит пользователей, у которых
+сменился шард.
+"""
+import os
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from src.infrastructure.db.invalidation import asyncpg_dsn
+from src.infrastructure.db.session import PoolSettings, create_engine, pool_status
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping, Veach): при росте N -> N+1 переезжает
+    только ~1/(N+1) ключей, и все - на новый шард. Таблица не нужна.
+    """
+    if buckets <= 0:
+        raise ValueError("buckets must be positive")
+    key &= 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_urls_from_env() -> list[str]:
+    urls = os.getenv("DATABASE_SHARD_URLS") or os.getenv("DATABASE_URL") or ""
+    return [url.strip() for url in urls.split(",") if url.strip()]
+
+
+class ShardSet:
+    """Движки и фабрики сессий всех шардов; пул у каждого шарда свой."""
+
+    def __init__(
+        self,
+        urls: list[str],
+        settings: Optional[PoolSettings] = None,
+        profiles_shard: int = 0,
+    ):
+        if not urls:
+            raise ValueError("at least one shard url is required")
+        if not 0 <= profiles_shard < len(urls):
+            raise ValueError(f"profiles_shard {profiles_shard} is out of range")
+
+        settings = settings or PoolSettings.from_env()
+        self.urls = list(urls)
+        self.profiles_shard = profiles_shard
+        self.engines: list[AsyncEngine] = [create_engine(url, settings) for url in urls]
+        self.sessionmakers = [
+            async_sessionmaker(engine, expire_on_commit=False) for engine in self.engines
+        ]
+
+    @classmethod
+    def from_env(cls) -> "ShardSet":
+        return cls(
+            shard_urls_from_env(),
+            profiles_shard=int(os.getenv("DB_PROFILES_SHARD", "0")),
+        )
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def shard_for(self, tg_user_id: int) -> int:
+        return jump_hash(tg_user_id, len(self.engines))
+
+    @asynccontextmanager
+    async def sessions(self) -> AsyncIterator["ShardSessions"]:
+        """Сессии открываются по мере обращения к шардам и закрываются на выходе."""
+        async with AsyncExitStack() as stack:
+            yield ShardSessions(self, stack)
+
+    def asyncpg_dsns(self) -> list[str]:
+        """
+        DSN всех шардов для InvalidationListener: каждый шард шлёт pg_notify
+        в своей базе, и слушать нужно все.
+        """
+        return [asyncpg_dsn(url) for url in self.urls]
+
+    def pool_status(self) -> list[dict]:
+        return [pool_status(engine) for engine in self.engines]
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+class ShardSessions:
+    """Ленивые сессии одного обработчика: по одной на шард."""
+
+    def __init__(self, shards: ShardSet, stack: AsyncExitStack):
+        self.shards = shards
+        self._stack = stack
+        self._sessions: dict[int, AsyncSession] = {}
+
+    async def get(self, shard: int) -> AsyncSession:
+        session = self._sessions.get(shard)
+        if session is None:
+            session = await self._stack.enter_async_context(self.shards.sessionmakers[shard]())
+            self._sessions[shard] = session
+        return session
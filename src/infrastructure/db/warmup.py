@@ -0,0 +1,55 @@
+import asyncio
+import contextlib
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.infrastructure.db.repositories.factory import create_user_repository
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.session import settings
+
+# id, которого заведомо нет в БД: прогрев только читает
+_WARMUP_ID = -1
+
+
+async def _prepare_hot_statements(repo: PostgresUserRepository) -> None:
+    # на asyncpg первое выполнение кладёт prepared statement в кэш
+    # соединения, дальше горячие запросы не платят за PREPARE
+    await repo.get_cursor(_WARMUP_ID)
+    await repo.get_current_vk_id(_WARMUP_ID)
+    await repo.get_queue(_WARMUP_ID)
+    await repo.list_favorites(_WARMUP_ID)
+    await repo.get_profile(_WARMUP_ID)
+    await repo.get_photos(_WARMUP_ID)
+    await repo.get_cards([_WARMUP_ID])
+
+
+async def warm_up(engine: AsyncEngine, connections: int | None = None) -> int:
+    """
+    Открывает `connections` соединений пула одновременно и готовит на
+    каждом горячие запросы репозитория. Возвращает число прогретых.
+    По умолчанию - DB_WARMUP_CONNECTIONS (settings.warmup_connections);
+    приложение вызывает `await warm_up(engine)` при старте.
+
+    Больше pool_size прогревать бессмысленно: overflow-соединения
+    закрываются сразу после возврата в пул.
+    """
+    if connections is None:
+        connections = settings.warmup_connections
+    connections = min(connections, engine.pool.size())
+    if connections <= 0:
+        return 0
+
+    async with contextlib.AsyncExitStack() as stack:
+        conns = [
+            await stack.enter_async_context(engine.connect())
+            for _ in range(connections)
+        ]
+
+        async def prepare(conn) -> None:
+            async with AsyncSession(bind=conn) as session:
+                await _prepare_hot_statements(create_user_repository(session))
+                await session.rollback()
+
+        await asyncio.gather(*(prepare(conn) for conn in conns))
+
+    return connections
@@ -0,0 +1,226 @@
+import fcntl
+import hashlib
+import os
+import secrets
+from collections import OrderedDict
+from typing import Optional
+
+LOCK_FILE = ".lock"
+ID_FILE = ".store_id"
+
+
+class PhotoStore:
+    """
+    Файлы фото на диске, адресованные по содержимому.
+
+    objects/ab/<sha256> - сам файл, одинаковые фото хранятся один раз.
+    refs/cd/<sha256 url> - symlink на объект: по нему повторный URL
+    находится без скачивания.
+
+    Объём ограничен max_bytes: evict() удаляет давно не читанные объекты
+    (LRU по порядку put/touch). Индекс LRU живёт в памяти, поэтому root
+    принадлежит одному экземпляру: flock на root/.lock не даёт второму
+    процессу открыть тот же каталог и вытеснять чужие файлы, пока первый
+    не вызвал close(). Методы синхронные и не содержат await - один
+    event loop.
+
+    У каждого root свой store_id (root/.store_id, задаётся при первом
+    открытии). Пути, которые отдаёт хранилище и которые пишутся в
+    photos.local_path, начинаются с него: "<store_id>/objects/ab/<sha256>".
+    По префиксу читатель находит диск с файлом (owner), а вытеснение
+    сбрасывает только строки своего хранилища.
+    """
+
+    def __init__(
+        self, root: str, max_bytes: int = 1024 ** 3, store_id: Optional[str] = None
+    ):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+
+        self.root = root
+        self.max_bytes = max_bytes
+        # путь объекта внутри root -> размер, от старых к новым
+        self._objects: OrderedDict[str, int] = OrderedDict()
+        self.total_bytes = 0
+        self._lock_fd: Optional[int] = self._lock(root)
+        try:
+            self.store_id = self._load_id(store_id)
+        except ValueError:
+            self.close()
+            raise
+        self._scan()
+
+    def close(self) -> None:
+        """Снимает блокировку root; сам экземпляр после этого не используется."""
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # ================= ЧТЕНИЕ =================
+
+    @staticmethod
+    def owner(local_path: str) -> str:
+        """store_id хранилища, в котором лежит файл local_path."""
+        return local_path.split("/", 1)[0]
+
+    def lookup(self, url: str) -> Optional[str]:
+        """Путь уже скачанного файла по URL или None."""
+        ref = self._ref_path(url)
+        target = self._resolve(ref)
+        if target is None:
+            return None
+        self._touch(target)
+        return self._public(target)
+
+    def path(self, local_path: str) -> str:
+        """Полный путь к файлу; local_path другого хранилища - ValueError."""
+        return self._full(self._own(local_path))
+
+    def touch(self, local_path: str) -> None:
+        self._touch(self._own(local_path))
+
+    def __contains__(self, local_path: str) -> bool:
+        store_id, _, name = local_path.partition("/")
+        return store_id == self.store_id and name in self._objects
+
+    # ================= ЗАПИСЬ =================
+
+    def put(self, url: str, data: bytes) -> str:
+        """Сохраняет содержимое, связывает с ним URL, возвращает путь."""
+        digest = hashlib.sha256(data).hexdigest()
+        local_path = os.path.join("objects", digest[:2], digest)
+
+        if local_path not in self._objects:
+            full = self._full(local_path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            # через временный файл: читатель не увидит недописанный объект
+            tmp = f"{full}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, full)
+            self._objects[local_path] = len(data)
+            self.total_bytes += len(data)
+        else:
+            self._touch(local_path)
+
+        self._link(url, local_path)
+        return self._public(local_path)
+
+    def evict(self) -> list[str]:
+        """
+        Удаляет самые старые объекты, пока объём больше max_bytes.
+        Возвращает их пути - строки photos с ними нужно сбросить.
+        Ссылки refs на удалённые объекты чистятся лениво в lookup().
+        """
+        evicted = []
+        while self.total_bytes > self.max_bytes and self._objects:
+            local_path, size = self._objects.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._full(local_path))
+            except FileNotFoundError:
+                pass
+            evicted.append(self._public(local_path))
+        return evicted
+
+    # ================= INTERNAL =================
+
+    def _public(self, local_path: str) -> str:
+        return f"{self.store_id}/{local_path}"
+
+    def _own(self, local_path: str) -> str:
+        store_id, _, name = local_path.partition("/")
+        if store_id != self.store_id:
+            raise ValueError(f"{local_path} belongs to photo store {store_id}")
+        return name
+
+    def _full(self, local_path: str) -> str:
+        return os.path.join(self.root, local_path)
+
+    def _touch(self, local_path: str) -> None:
+        if local_path in self._objects:
+            self._objects.move_to_end(local_path)
+            # mtime хранит порядок LRU между рестартами
+            os.utime(self._full(local_path))
+
+    def _load_id(self, store_id: Optional[str]) -> str:
+        id_file = self._full(ID_FILE)
+        try:
+            with open(id_file) as f:
+                saved = f.read().strip()
+        except FileNotFoundError:
+            saved = None
+
+        if saved is not None:
+            if store_id is not None and store_id != saved:
+                raise ValueError(f"photo store {self.root} has id {saved}, not {store_id}")
+            return saved
+
+        store_id = store_id or secrets.token_hex(4)
+        if not store_id or "/" in store_id:
+            raise ValueError("store_id must be a non-empty name without '/'")
+        with open(id_file, "w") as f:
+            f.write(store_id)
+        return store_id
+
+    @staticmethod
+    def _lock(root: str) -> int:
+        os.makedirs(root, exist_ok=True)
+        fd = os.open(os.path.join(root, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # блокировка снимается при закрытии fd, в том числе при падении процесса
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise RuntimeError(f"photo store {root} is already in use")
+        return fd
+
+    def _scan(self) -> None:
+        # порядок LRU после рестарта - по времени изменения файла
+        found = []
+        objects_dir = self._full("objects")
+        if os.path.isdir(objects_dir):
+            for entry in os.scandir(objects_dir):
+                if not entry.is_dir():
+                    continue
+                for obj in os.scandir(entry.path):
+                    if obj.name.endswith(".tmp"):
+                        continue
+                    st = obj.stat()
+                    local_path = os.path.join("objects", entry.name, obj.name)
+                    found.append((st.st_mtime, local_path, st.st_size))
+
+        for _, local_path, size in sorted(found):
+            self._objects[local_path] = size
+            self.total_bytes += size
+
+    def _ref_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self._full(os.path.join("refs", key[:2], key))
+
+    def _link(self, url: str, local_path: str) -> None:
+        ref = self._ref_path(url)
+        os.makedirs(os.path.dirname(ref), exist_ok=True)
+        # относительная ссылка: каталог можно переносить целиком
+        target = os.path.relpath(self._full(local_path), os.path.dirname(ref))
+        tmp = f"{ref}.{os.getpid()}.tmp"
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        os.symlink(target, tmp)
+        os.replace(tmp, ref)
+
+    def _resolve(self, ref: str) -> Optional[str]:
+        try:
+            target = os.readlink(ref)
+        except FileNotFoundError:
+            return None
+
+        full = os.path.normpath(os.path.join(os.path.dirname(ref), target))
+        local_path = os.path.relpath(full, self.root)
+        if local_path not in self._objects:
+            # объект вытеснен - ссылка больше не нужна
+            os.remove(ref)
+            return None
+        return local_path
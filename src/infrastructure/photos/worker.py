@@ -0,0 +1,166 @@
+import asyncio
+import os
+import socket
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from src.infrastructure.db.repositories.interfaces import UserRepository
+from src.infrastructure.db.schemas.dto import PhotoJobDTO
+from src.infrastructure.photos.store import PhotoStore
+
+
+def fetch_url(url: str, timeout: float) -> bytes:
+    # блокирующий вызов, выполняется в пуле потоков загрузчика
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+@dataclass
+class DownloadStats:
+    jobs: int = 0
+    fetched: int = 0
+    # фото, которые уже были в хранилище (или дублировали URL в пачке)
+    hits: int = 0
+    failed: int = 0
+    evicted: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        done = self.hits + self.fetched
+        return self.hits / done if done else 0.0
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class PhotoDownloader:
+    """
+    Забирает pending-фото пачками (claim_pending_photos), скачивает их в
+    PhotoStore и пишет local_path/status. Одновременно идёт не больше
+    `concurrency` загрузок; одинаковые URL скачиваются один раз.
+
+    Несколько процессов с разными worker_id работают с одной таблицей без
+    координатора: строку получает только один из них. Неудачная загрузка
+    повторяется, пока attempts < max_attempts.
+
+    У каждого процесса своё хранилище (свой root): local_path строки
+    начинается с его store_id, и вытеснение сбрасывает только свои строки.
+    Хранилище держит объём в пределах max_bytes - он должен быть больше
+    одной пачки, иначе пачка вытеснит сама себя.
+    """
+
+    def __init__(
+        self,
+        repo: UserRepository,
+        store: PhotoStore,
+        concurrency: int = 8,
+        batch_size: int = 100,
+        timeout: float = 10.0,
+        fetch: Callable[[str, float], bytes] = fetch_url,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 3,
+    ):
+        self.repo = repo
+        self.store = store
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.fetch = fetch
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # свой пул: в стандартном asyncio.to_thread всего cpu_count + 4 потока
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix="photo-fetch")
+        self.stats = DownloadStats()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    async def run(self, max_batches: Optional[int] = None) -> DownloadStats:
+        """Обрабатывает пачки, пока есть pending-строки (или max_batches)."""
+        batches = 0
+        retried = False
+        while max_batches is None or batches < max_batches:
+            if await self.run_once():
+                batches += 1
+                retried = False
+                continue
+            # claim возвращает истёкшие lease в pending, но берёт их только
+            # следующий вызов - пустая пачка ещё не значит, что очередь пуста
+            if retried:
+                break
+            retried = True
+        return self.stats
+
+    async def run_once(self) -> int:
+        jobs = await self.repo.claim_pending_photos(
+            self.batch_size, self.worker_id, self.lease_seconds, self.max_attempts
+        )
+        if not jobs:
+            return 0
+
+        started = time.perf_counter()
+        by_url: dict[str, list[PhotoJobDTO]] = {}
+        for job in jobs:
+            by_url.setdefault(job.url, []).append(job)
+
+        results = await asyncio.gather(*(self._download(url) for url in by_url))
+
+        done: list[PhotoJobDTO] = []
+        failed: list[PhotoJobDTO] = []
+        for (url, url_jobs), (local_path, error) in zip(by_url.items(), results):
+            # повторы одного URL в пачке не скачиваются заново
+            if local_path is not None:
+                self.stats.hits += len(url_jobs) - 1
+            for job in url_jobs:
+                job.local_path = local_path
+                job.error = error
+                (done if local_path is not None else failed).append(job)
+
+        evicted = self.store.evict()
+        # свежие файлы вытесняются последними, но если пачка сама больше
+        # max_bytes - её строки не отмечаются и вернутся в очередь по lease
+        done = [job for job in done if job.local_path in self.store]
+
+        await self.repo.complete_photos(done)
+        await self.repo.fail_photos(failed, self.max_attempts)
+        if evicted:
+            await self.repo.reset_photo_files(evicted)
+
+        self.stats.jobs += len(jobs)
+        self.stats.failed += len(failed)
+        self.stats.evicted += len(evicted)
+        self.stats.seconds += time.perf_counter() - started
+        return len(jobs)
+
+    async def _download(self, url: str) -> tuple[Optional[str], Optional[str]]:
+        """(local_path, None) или (None, текст ошибки)."""
+        local_path = self.store.lookup(url)
+        if local_path is not None:
+            self.stats.hits += 1
+            return local_path, None
+
+        async with self._semaphore:
+            try:
+                data = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.fetch, url, self.timeout
+                )
+            except (OSError, ValueError) as exc:
+                # сетевые и HTTP-ошибки urllib - подклассы OSError,
+                # ValueError - некорректный URL
+                return None, repr(exc)
+
+        self.stats.fetched += 1
+        self.stats.bytes += len(data)
+        return self.store.put(url, data), None
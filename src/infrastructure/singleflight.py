@@ -0,0 +1,81 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные одинаковые вызовы: пока загрузка по ключу
+    идёт, остальные вызовы с тем же ключом ждут её результат, а не
+    запускают свою.
+
+    Рассчитан на один event loop. Один объект можно разделить между
+    репозиториями разных сессий - так же, как TTLCache.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        # вызовы, получившие чужой результат без своего запроса
+        self.deduplicated = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                return await self._lead(key, load)
+
+            self.deduplicated += 1
+            try:
+                # shield: отмена ожидающего не отменяет загрузку для остальных
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    # отменили ведущего, а не нас - загружаем заново
+                    self.deduplicated -= 1
+                    continue
+                raise
+
+    def forget(self, match: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """
+        Следующие вызовы не присоединяются к уже идущим загрузкам ключей,
+        для которых match(key) истинно (без match - всех ключей).
+        Нужно после записи: начатое до неё чтение могло её не увидеть.
+        """
+        if match is None:
+            self._inflight.clear()
+            return
+        for key in [key for key in self._inflight if match(key)]:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self._inflight),
+            "dedup_rate": self.deduplicated / self.calls if self.calls else 0.0,
+        }
+
+    async def _lead(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        # исключение забирают ожидающие; если их нет - не пишем
+        # "Future exception was never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
@@ -0,0 +1,70 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Set
+
+# intersection: проход по массиву в C (~30 нс на элемент) против bisect
+# на каждого кандидата в Python (~0.5 мкс) - проход выгоднее, пока
+# массив длиннее кандидатов не больше чем в SCAN_RATIO раз
+SCAN_RATIO = 15
+
+# update с большим числом id пересобирает массив, а не вставляет по одному
+_REBUILD_AT = 32
+
+
+class SortedIdSet:
+    """
+    Множество id в отсортированном array('q'): 8 байт на id вместо
+    ~60 у set. Проверка - O(log n), вставка и удаление - O(n) сдвигом
+    памяти, что дёшево до сотен тысяч id.
+    """
+
+    __slots__ = ("_ids",)
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self._ids = array("q", sorted(set(ids)))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def __contains__(self, vk_id: int) -> bool:
+        i = bisect_left(self._ids, vk_id)
+        return i != len(self._ids) and self._ids[i] == vk_id
+
+    @property
+    def nbytes(self) -> int:
+        return self._ids.itemsize * len(self._ids)
+
+    def add(self, vk_id: int) -> None:
+        i = bisect_left(self._ids, vk_id)
+        if i == len(self._ids) or self._ids[i] != vk_id:
+            self._ids.insert(i, vk_id)
+
+    def update(self, ids: Iterable[int]) -> None:
+        ids = set(ids)
+        if len(ids) >= _REBUILD_AT:
+            self._ids = array("q", sorted(ids.union(self._ids)))
+            return
+        for vk_id in ids:
+            self.add(vk_id)
+
+    def discard(self, vk_id: int) -> None:
+        i = bisect_left(self._ids, vk_id)
+        if i != len(self._ids) and self._ids[i] == vk_id:
+            del self._ids[i]
+
+    def intersection(self, candidates: Set[int]) -> Set[int]:
+        """Кандидаты, которые есть в множестве."""
+        ids = self._ids
+        if len(ids) <= SCAN_RATIO * len(candidates):
+            return candidates.intersection(ids)
+
+        size = len(ids)
+        found = set()
+        for vk_id in candidates:
+            i = bisect_left(ids, vk_id)
+            if i != size and ids[i] == vk_id:
+                found.add(vk_id)
+        return found
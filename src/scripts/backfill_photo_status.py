@@ -0,0 +1,71 @@
+"""
+Переводит в pending фото, добавленные до очереди скачивания.
+
+Строкам photos со status IS NULL ставится 'pending', и их берёт воркер.
+
+Миграция 109f0b7d3429 только задаёт значение по умолчанию - старые строки
+переводит этот скрипт, короткими транзакциями по окнам первичного ключа,
+чтобы не держать блокировку всей таблицы. Повторный запуск безопасен.
+
+Запуск:
+    python -m src.scripts.backfill_photo_status [--batch-size 5000 --pause 0.05]
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.infrastructure.db.session import engine
+
+_BACKFILL = text(
+    """
+    WITH batch AS (
+        SELECT id FROM photos
+        WHERE id > :after
+        ORDER BY id
+        LIMIT :limit
+    ),
+    updated AS (
+        UPDATE photos p SET status = 'pending'
+        FROM batch b
+        WHERE p.id = b.id AND p.status IS NULL
+        RETURNING 1
+    )
+    SELECT (SELECT max(id) FROM batch), (SELECT count(*) FROM updated)
+    """
+)
+
+
+async def backfill(
+    batch_size: int = 5_000, pause: float = 0.05, db_engine: AsyncEngine = engine
+) -> int:
+    """Возвращает число переведённых в pending строк."""
+    total = 0
+    after = 0
+    while after is not None:
+        async with db_engine.begin() as conn:
+            after, rows = (await conn.execute(
+                _BACKFILL, {"after": after, "limit": batch_size}
+            )).one()
+        total += rows
+        if pause:
+            await asyncio.sleep(pause)
+    return total
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    parser.add_argument("--pause", type=float, default=0.05)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = await backfill(args.batch_size, args.pause)
+    print(f"pending: {rows} rows in {time.perf_counter() - started:.1f}s")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
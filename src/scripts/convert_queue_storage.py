@@ -0,0 +1,101 @@
+"""
+Переносит очереди между режимами хранения (rows <-> packed) и переводит
+history_cursor в индекс. Целевое хранилище перезаписывается целиком,
+источник очищается, если не передан --keep-source.
+
+Запуск:
+    python -m src.scripts.convert_queue_storage --to packed
+    python -m src.scripts.convert_queue_storage --to rows
+
+После переноса выставьте DB_QUEUE_STORAGE в тот же режим.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.infrastructure.db.session import engine
+
+# Оба направления сначала очищают целевое хранилище: строки, оставшиеся
+# от прошлого прогона с --keep-source, не переживают перенос у
+# пользователей, чья очередь с тех пор опустела.
+TO_PACKED = [
+    "DELETE FROM queue_packed",
+    # в rows курсор - position, в дырах после add_blacklist он
+    # указывает на следующую строку; индекс - число строк до неё
+    """
+    UPDATE users u
+    SET history_cursor = (
+        SELECT count(*) FROM queue q
+        WHERE q.tg_user_id = u.tg_user_id AND q.position < u.history_cursor
+    )
+    WHERE EXISTS (SELECT 1 FROM queue q WHERE q.tg_user_id = u.tg_user_id)
+    """,
+    # позиции уплотняются под новый курсор: строки, оставленные
+    # --keep-source, остаются верными, если вернуться в rows
+    """
+    UPDATE queue q
+    SET position = r.rn - 1
+    FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY tg_user_id ORDER BY position
+        ) AS rn
+        FROM queue
+    ) r
+    WHERE q.id = r.id AND q.position <> r.rn - 1
+    """,
+    """
+    INSERT INTO queue_packed (tg_user_id, vk_ids)
+    SELECT tg_user_id, array_agg(vk_profile_id ORDER BY position)
+    FROM queue
+    GROUP BY tg_user_id
+    """,
+]
+
+TO_ROWS = [
+    "DELETE FROM queue",
+    # position = индекс, поэтому курсор остаётся как есть
+    """
+    INSERT INTO queue (tg_user_id, vk_profile_id, position)
+    SELECT p.tg_user_id, t.vk_id, t.i - 1
+    FROM queue_packed p, unnest(p.vk_ids) WITH ORDINALITY AS t(vk_id, i)
+    """,
+]
+
+CLEAR_SOURCE = {
+    "packed": "DELETE FROM queue",
+    "rows": "DELETE FROM queue_packed",
+}
+
+
+async def convert(target: str, keep_source: bool = False, db_engine: AsyncEngine = engine) -> None:
+    statements = list(TO_PACKED if target == "packed" else TO_ROWS)
+    if not keep_source:
+        statements.append(CLEAR_SOURCE[target])
+
+    # одной транзакцией: бот в это время видит либо старое, либо новое
+    async with db_engine.begin() as conn:
+        for sql in statements:
+            started = time.perf_counter()
+            result = await conn.execute(text(sql))
+            first_line = " ".join(sql.split())[:60]
+            print(
+                f"{result.rowcount:>10} rows  {time.perf_counter() - started:6.2f}s  "
+                f"{first_line}"
+            )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--to", choices=("packed", "rows"), required=True)
+    parser.add_argument("--keep-source", action="store_true")
+    args = parser.parse_args()
+
+    await convert(args.to, args.keep_source)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
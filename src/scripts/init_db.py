@@ -1,4 +1,10 @@
-from sqlalchemy.ext.asyncio import AsyncEngine
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.infrastructure.db.invalidation import asyncpg_dsn
 from src.infrastructure.db.models import Base
 
 
@@ -12,4 +18,38 @@ async def init_db(engine: AsyncEngine) -> None:
     - при первом запуске проекта
     """
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def create_databases(
+    server_url: str | URL, prefix: str, count: int, truncate: bool = False
+) -> list[str]:
+    """
+    Базы <prefix>_<n> на сервере server_url со схемой init_db: создаются,
+    если их нет; truncate=True очищает все таблицы. Возвращает их URL.
+    Общий помощник тестов (фикстура make_databases) и бенчмарков.
+    """
+    base = make_url(server_url)
+    admin = await asyncpg.connect(asyncpg_dsn(base))
+    try:
+        existing = {r[0] for r in await admin.fetch("SELECT datname FROM pg_database")}
+        urls = []
+        for n in range(count):
+            name = f"{prefix}_{n}"
+            if name not in existing:
+                await admin.execute(f'CREATE DATABASE "{name}"')
+            urls.append(base.set(database=name).render_as_string(hide_password=False))
+    finally:
+        await admin.close()
+
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    for url in urls:
+        engine = create_async_engine(url, poolclass=NullPool)
+        try:
+            await init_db(engine)
+            if truncate:
+                async with engine.begin() as conn:
+                    await conn.execute(text(f"TRUNCATE {tables}"))
+        finally:
+            await engine.dispose()
+    return urls
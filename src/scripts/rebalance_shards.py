@@ -0,0 +1,197 @@
+"""
+Переносит пользователей на шарды, которые им назначает jump_hash для
+нового списка шардов (см. src/infrastructure/db/sharding.py).
+
+Проходит по всем пользователям каждого шарда (и --drain - шардов,
+которые выводятся) и переносит тех, кто лежит не на своём шарде:
+users, queue, queue_packed, favorites, blacklist, seen_profiles.
+profiles и photos остаются на шарде профилей.
+
+Пачка пользователей переносится так: на источнике строки users
+блокируются FOR UPDATE и читаются, на приёмнике их старые копии
+удаляются и пишутся заново через COPY, приёмник коммитится, затем
+источник удаляет свои строки. Обрыв между коммитами оставляет копию на
+обоих шардах - повторный запуск перезапишет её, поэтому скрипт можно
+просто перезапустить. Бот на время переноса лучше остановить: записи
+пользователей, сделанные по старому списку шардов после копирования,
+потеряются.
+
+Запуск:
+    DATABASE_SHARD_URLS=<новый список> python -m src.scripts.rebalance_shards
+        [--drain <url,...>] [--batch-size 500] [--dry-run]
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from src.infrastructure.db.models import (
+    Blacklist, FavoriteProfile, PackedQueue, QueueItem, SeenProfile, User,
+)
+from src.infrastructure.db.session import PoolSettings, create_engine
+from src.infrastructure.db.sharding import jump_hash, shard_urls_from_env
+
+# (таблица, порядок строк). Суррогатные id не переносятся: у приёмника
+# своя последовательность, порядок избранного сохраняет ORDER BY id.
+# users первой: queue и queue_packed ссылаются на неё
+_TABLES = [
+    (User.__table__, "tg_user_id"),
+    (QueueItem.__table__, "tg_user_id, position"),
+    (PackedQueue.__table__, "tg_user_id"),
+    (FavoriteProfile.__table__, "id"),
+    (Blacklist.__table__, "id"),
+    (SeenProfile.__table__, "tg_user_id, vk_profile_id"),
+]
+
+
+def _columns(table) -> list[str]:
+    return [
+        c.name for c in table.columns
+        if not (c.primary_key and c.name == "id")
+    ]
+
+
+# все tg_user_id шарда, включая тех, у кого есть только избранное
+# или чёрный список без строки users
+_USER_IDS = text(
+    """
+    SELECT tg_user_id FROM users
+    UNION SELECT tg_user_id FROM favorites
+    UNION SELECT tg_user_id FROM blacklist
+    UNION SELECT tg_user_id FROM seen_profiles
+    ORDER BY 1
+    """
+)
+
+_LOCK_USERS = text("SELECT tg_user_id FROM users WHERE tg_user_id = ANY(:ids) FOR UPDATE")
+
+
+@dataclass
+class RebalanceReport:
+    scanned: int = 0
+    moved: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    # (источник, приёмник) -> пользователей
+    routes: dict[tuple[int, int], int] = field(default_factory=lambda: defaultdict(int))
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+async def _copy_users(src: AsyncConnection, dst: AsyncConnection, ids: list[int]) -> int:
+    """Переносит пачку пользователей в уже открытых транзакциях; возвращает число строк."""
+    params = {"ids": ids}
+    await src.execute(_LOCK_USERS, params)
+
+    rows = {}
+    for table, order in _TABLES:
+        columns = _columns(table)
+        result = await src.execute(text(
+            f"SELECT {', '.join(columns)} FROM {table.name} "
+            f"WHERE tg_user_id = ANY(:ids) ORDER BY {order}"
+        ), params)
+        rows[table.name] = (columns, [tuple(row) for row in result])
+
+    # копия от прошлого прерванного запуска: удаляем, дети раньше users
+    for table, _ in reversed(_TABLES):
+        await dst.execute(text(f"DELETE FROM {table.name} WHERE tg_user_id = ANY(:ids)"), params)
+
+    raw = (await dst.get_raw_connection()).driver_connection
+    copied = 0
+    for table, _ in _TABLES:
+        columns, records = rows[table.name]
+        if records:
+            await raw.copy_records_to_table(table.name, records=records, columns=columns)
+            copied += len(records)
+
+    for table, _ in reversed(_TABLES):
+        await src.execute(text(f"DELETE FROM {table.name} WHERE tg_user_id = ANY(:ids)"), params)
+    return copied
+
+
+async def _move(source: AsyncEngine, target: AsyncEngine, ids: list[int]) -> int:
+    async with source.connect() as src, target.connect() as dst:
+        async with src.begin():
+            async with dst.begin():
+                rows = await _copy_users(src, dst, ids)
+            # приёмник закоммичен - теперь можно удалить у источника
+    return rows
+
+
+async def rebalance(
+    urls: list[str],
+    drain: list[str] = (),
+    batch_size: int = 500,
+    dry_run: bool = False,
+) -> RebalanceReport:
+    settings = PoolSettings(pool_size=2, max_overflow=0)
+    sources = list(urls) + [url for url in drain if url not in urls]
+    engines = {url: create_engine(url, settings) for url in sources}
+    report = RebalanceReport()
+    started = time.perf_counter()
+
+    try:
+        for source_index, url in enumerate(sources):
+            pending: dict[int, list[int]] = defaultdict(list)
+
+            async def flush(target: int) -> None:
+                ids = pending.pop(target)
+                report.moved += len(ids)
+                report.routes[(source_index, target)] += len(ids)
+                if not dry_run:
+                    report.rows += await _move(engines[url], engines[urls[target]], ids)
+
+            # список id читается потоком на отдельном соединении
+            async with engines[url].connect() as scan:
+                result = await scan.stream_scalars(_USER_IDS, execution_options={"yield_per": 5_000})
+                async for partition in result.partitions():
+                    for tg_user_id in partition:
+                        report.scanned += 1
+                        target = jump_hash(tg_user_id, len(urls))
+                        if urls[target] == url:
+                            continue
+                        pending[target].append(tg_user_id)
+                        if len(pending[target]) >= batch_size:
+                            await flush(target)
+
+            for target in list(pending):
+                await flush(target)
+    finally:
+        for engine in engines.values():
+            await engine.dispose()
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--drain", default="", help="шарды, которые выводятся, через запятую")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    urls = shard_urls_from_env()
+    report = await rebalance(
+        urls,
+        drain=[url.strip() for url in args.drain.split(",") if url.strip()],
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+    )
+    for (source, target), users in sorted(report.routes.items()):
+        print(f"shard {source} -> {target}: {users} users")
+    print(
+        f"scanned={report.scanned} moved={report.moved} rows={report.rows} "
+        f"{report.seconds:.2f}s {report.rows_per_second:.0f} rows/s"
+        + (" (dry run)" if args.dry_run else "")
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,397 @@
+"""
+Чистка данных брошенных аккаунтов небольшими пачками.
+
+Политики:
+    queue   - очереди (queue и queue_packed) пользователей без активности
+              дольше --queue-days
+    tokens  - vk_access_token пользователей без активности дольше --token-days
+    seen    - просмотренные профили (seen_profiles) пользователей без
+              активности дольше --seen-days
+    photos  - фото профилей, на которые не ссылается ни одна очередь
+              и ни одно избранное
+
+Каждая пачка - отдельная короткая транзакция с lock_timeout: строки,
+занятые ботом, не ждутся, а пачка повторяется позже. Между пачками -
+пауза --pause, чтобы чистка не забирала диск и autovacuum у бота.
+
+Запуск:
+    python -m src.scripts.retention [--policies queue,tokens,seen,photos]
+        [--queue-days 30 --token-days 90 --seen-days 180 --batch-size 5000 --pause 0.05]
+"""
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from src.infrastructure.db.session import engine
+
+POLICIES = ("queue", "tokens", "seen", "photos")
+
+# пользователи с устаревшей активностью и очередью - по первичному ключу, окнами
+_STALE_QUEUE_USERS = text(
+    """
+    SELECT u.tg_user_id FROM users u
+    WHERE u.tg_user_id > :after AND u.last_active_at < :cutoff
+      AND (EXISTS (SELECT 1 FROM queue q WHERE q.tg_user_id = u.tg_user_id)
+           OR EXISTS (SELECT 1 FROM queue_packed p WHERE p.tg_user_id = u.tg_user_id))
+    ORDER BY u.tg_user_id
+    LIMIT :limit
+    """
+)
+
+# Неактивные пользователи окна, которых сейчас не трогает бот: FOR SHARE
+# держит их строку users до конца пачки (свайп ждёт её, а не пишет
+# активность посреди удаления), SKIP LOCKED пропускает пользователя с
+# незакоммиченным свайпом - его строки удалит следующий прогон, если он
+# снова станет неактивным
+_LOCK_STALE_USERS = """
+    SELECT u.tg_user_id FROM users u
+    WHERE u.tg_user_id = ANY(:ids) AND u.last_active_at < :cutoff
+    ORDER BY u.tg_user_id
+    FOR SHARE SKIP LOCKED
+"""
+
+# Пачка строк queue с конца очередей: вернувшийся посреди чистки
+# пользователь получит укороченную очередь, а не дыры в её середине
+_PURGE_QUEUE = text(
+    f"""
+    WITH owners AS ({_LOCK_STALE_USERS}),
+    doomed AS (
+        SELECT q.id FROM queue q
+        WHERE q.tg_user_id IN (SELECT tg_user_id FROM owners)
+        ORDER BY q.tg_user_id DESC, q.position DESC
+        LIMIT :limit
+    )
+    DELETE FROM queue q
+    USING doomed d
+    WHERE q.id = d.id
+    """
+)
+
+_STALE_SEEN_USERS = text(
+    """
+    SELECT u.tg_user_id FROM users u
+    WHERE u.tg_user_id > :after AND u.last_active_at < :cutoff
+      AND EXISTS (SELECT 1 FROM seen_profiles s WHERE s.tg_user_id = u.tg_user_id)
+    ORDER BY u.tg_user_id
+    LIMIT :limit
+    """
+)
+
+_PURGE_SEEN = text(
+    f"""
+    WITH owners AS ({_LOCK_STALE_USERS})
+    DELETE FROM seen_profiles
+    WHERE ctid = ANY(ARRAY(
+        SELECT s.ctid FROM seen_profiles s
+        WHERE s.tg_user_id IN (SELECT tg_user_id FROM owners)
+        LIMIT :limit
+    ))
+    """
+)
+
+_PURGE_PACKED = text(
+    f"""
+    WITH owners AS ({_LOCK_STALE_USERS})
+    DELETE FROM queue_packed p
+    WHERE p.tg_user_id IN (SELECT tg_user_id FROM owners)
+    """
+)
+
+# окно по первичному ключу: каждая пачка трогает не больше :limit строк
+# и не пересматривает уже пройденные
+_PURGE_TOKENS = text(
+    """
+    WITH batch AS (
+        SELECT tg_user_id FROM users
+        WHERE tg_user_id > :after
+        ORDER BY tg_user_id
+        LIMIT :limit
+    ),
+    cleared AS (
+        UPDATE users u SET vk_access_token = NULL
+        FROM batch b
+        WHERE u.tg_user_id = b.tg_user_id
+          AND u.vk_access_token IS NOT NULL
+          AND u.last_active_at < :cutoff
+        RETURNING 1
+    )
+    SELECT (SELECT max(tg_user_id) FROM batch), (SELECT count(*) FROM cleared)
+    """
+)
+
+# id профилей, которые ещё могут показать или открыть из избранного.
+# Снимок на начало прогона отсекает живые профили дёшево; профиль,
+# попавший в очередь или избранное позже, ловит перепроверка в пачке
+_LIVE_PROFILES = [
+    "CREATE TEMP TABLE retention_live (vk_id integer PRIMARY KEY)",
+    """
+    INSERT INTO retention_live
+    SELECT vk_profile_id FROM queue
+    UNION SELECT unnest(vk_ids) FROM queue_packed
+    UNION SELECT vk_profile_id FROM favorites
+    """,
+    "ANALYZE retention_live",
+]
+
+# Снимок мог устареть, поэтому фото, мёртвые по нему, перепроверяются по
+# queue, favorites и queue_packed в том же DELETE. Индексов по vk_profile_id
+# нет: пачка с такими фото стоит проход по каждой таблице, пачка живых -
+# только проверку по снимку
+_PURGE_PHOTOS = text(
+    """
+    WITH batch AS (
+        SELECT id, vk_user_id FROM photos
+        WHERE id > :after
+        ORDER BY id
+        LIMIT :limit
+    ),
+    doomed AS MATERIALIZED (
+        SELECT b.id, b.vk_user_id FROM batch b
+        WHERE NOT EXISTS (SELECT 1 FROM retention_live l WHERE l.vk_id = b.vk_user_id)
+    ),
+    deleted AS (
+        DELETE FROM photos p
+        USING doomed d
+        WHERE p.id = d.id
+          AND NOT EXISTS (SELECT 1 FROM queue q WHERE q.vk_profile_id = d.vk_user_id)
+          AND NOT EXISTS (SELECT 1 FROM favorites f WHERE f.vk_profile_id = d.vk_user_id)
+          AND NOT EXISTS (
+            SELECT 1 FROM queue_packed qp, unnest(qp.vk_ids) AS v(vk_id)
+            WHERE v.vk_id = d.vk_user_id
+        )
+        RETURNING 1
+    )
+    SELECT (SELECT max(id) FROM batch), (SELECT count(*) FROM deleted)
+    """
+)
+
+
+@dataclass
+class RetentionConfig:
+    policies: tuple[str, ...] = POLICIES
+    queue_days: float = 30.0
+    token_days: float = 90.0
+    seen_days: float = 180.0
+    batch_size: int = 5_000
+    # пользователей за одну выборку в политиках queue и seen
+    users_per_scan: int = 500
+    pause: float = 0.05
+    lock_timeout_ms: int = 1_000
+    # попыток одной пачки при lock_timeout, потом политика останавливается
+    lock_retries: int = 3
+
+
+@dataclass
+class PolicyReport:
+    name: str
+    rows: int = 0
+    batches: int = 0
+    lock_timeouts: int = 0
+    seconds: float = 0.0
+    completed: bool = True
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class RetentionReport:
+    policies: list[PolicyReport] = field(default_factory=list)
+
+    @property
+    def rows(self) -> int:
+        return sum(p.rows for p in self.policies)
+
+
+class _Batches:
+    """Короткие транзакции с lock_timeout и паузой между ними."""
+
+    def __init__(self, conn: AsyncConnection, config: RetentionConfig, report: PolicyReport):
+        self.conn = conn
+        self.config = config
+        self.report = report
+
+    async def run(self, batch: Callable[[], Awaitable[int]]) -> Optional[int]:
+        """Выполняет batch() в своей транзакции; None - не дождались блокировок."""
+        for attempt in range(self.config.lock_retries + 1):
+            try:
+                async with self.conn.begin():
+                    await self.conn.execute(
+                        text(f"SET LOCAL lock_timeout = {int(self.config.lock_timeout_ms)}")
+                    )
+                    rows = await batch()
+            except DBAPIError as exc:
+                # 55P03 lock_not_available
+                if getattr(exc.orig, "sqlstate", None) != "55P03":
+                    raise
+                self.report.lock_timeouts += 1
+                await asyncio.sleep(self.config.pause * (attempt + 2))
+                continue
+
+            self.report.rows += rows
+            self.report.batches += 1
+            if self.config.pause:
+                await asyncio.sleep(self.config.pause)
+            return rows
+
+        self.report.completed = False
+        return None
+
+
+async def purge_queues(conn: AsyncConnection, config: RetentionConfig, report: PolicyReport) -> None:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=config.queue_days)
+    await _purge_users(
+        conn, config, report, cutoff, _STALE_QUEUE_USERS, [_PURGE_QUEUE, _PURGE_PACKED]
+    )
+
+
+async def purge_seen(conn: AsyncConnection, config: RetentionConfig, report: PolicyReport) -> None:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=config.seen_days)
+    await _purge_users(conn, config, report, cutoff, _STALE_SEEN_USERS, [_PURGE_SEEN])
+
+
+async def purge_tokens(conn: AsyncConnection, config: RetentionConfig, report: PolicyReport) -> None:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=config.token_days)
+    await _walk(conn, config, report, _PURGE_TOKENS, {"cutoff": cutoff})
+
+
+async def purge_photos(conn: AsyncConnection, config: RetentionConfig, report: PolicyReport) -> None:
+    # временная таблица живёт в соединении - все пачки идут через него же
+    async with conn.begin():
+        for sql in _LIVE_PROFILES:
+            await conn.execute(text(sql))
+    try:
+        await _walk(conn, config, report, _PURGE_PHOTOS, {})
+    finally:
+        async with conn.begin():
+            await conn.execute(text("DROP TABLE IF EXISTS retention_live"))
+
+
+async def _purge_users(
+    conn: AsyncConnection,
+    config: RetentionConfig,
+    report: PolicyReport,
+    cutoff: datetime,
+    scan,
+    purges: list,
+) -> None:
+    # scan выбирает окно неактивных пользователей, purges удаляют их строки
+    batches = _Batches(conn, config, report)
+    after = 0
+
+    while True:
+        async with conn.begin():
+            result = await conn.execute(
+                scan, {"after": after, "cutoff": cutoff, "limit": config.users_per_scan}
+            )
+            ids = list(result.scalars())
+        if not ids:
+            return
+        after = ids[-1]
+        params = {"ids": ids, "cutoff": cutoff, "limit": config.batch_size}
+
+        for stmt in purges:
+            async def batch(stmt=stmt) -> int:
+                return (await conn.execute(stmt, params)).rowcount
+
+            # пачки по ctid, пока у этих пользователей есть строки
+            while True:
+                rows = await batches.run(batch)
+                if rows is None:
+                    return
+                if rows < config.batch_size:
+                    break
+
+
+async def _walk(
+    conn: AsyncConnection,
+    config: RetentionConfig,
+    report: PolicyReport,
+    stmt,
+    params: dict,
+) -> None:
+    # stmt возвращает (последний ключ окна, обработано строк)
+    batches = _Batches(conn, config, report)
+    after = 0
+
+    async def batch() -> int:
+        nonlocal after
+        last, rows = (await conn.execute(
+            stmt, {**params, "after": after, "limit": config.batch_size}
+        )).one()
+        after = last
+        return rows
+
+    while after is not None:
+        if await batches.run(batch) is None:
+            return
+
+
+RUNNERS = {
+    "queue": purge_queues,
+    "tokens": purge_tokens,
+    "seen": purge_seen,
+    "photos": purge_photos,
+}
+
+
+async def run_retention(
+    config: RetentionConfig, db_engine: AsyncEngine = engine
+) -> RetentionReport:
+    report = RetentionReport()
+    async with db_engine.connect() as conn:
+        for name in config.policies:
+            if name not in RUNNERS:
+                raise ValueError(f"unknown retention policy: {name}")
+            policy = PolicyReport(name)
+            started = time.perf_counter()
+            await RUNNERS[name](conn, config, policy)
+            policy.seconds = time.perf_counter() - started
+            report.policies.append(policy)
+    return report
+
+
+def print_report(report: RetentionReport) -> None:
+    for p in report.policies:
+        status = "" if p.completed else "  STOPPED: lock timeouts"
+        print(
+            f"{p.name:<8} rows={p.rows:<9} batches={p.batches:<6} "
+            f"lock_timeouts={p.lock_timeouts:<3} {p.seconds:7.2f}s "
+            f"{p.rows_per_second:10.0f} rows/s{status}"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--policies", default=",".join(POLICIES))
+    parser.add_argument("--queue-days", type=float, default=RetentionConfig.queue_days)
+    parser.add_argument("--token-days", type=float, default=RetentionConfig.token_days)
+    parser.add_argument("--seen-days", type=float, default=RetentionConfig.seen_days)
+    parser.add_argument("--batch-size", type=int, default=RetentionConfig.batch_size)
+    parser.add_argument("--pause", type=float, default=RetentionConfig.pause)
+    parser.add_argument("--lock-timeout-ms", type=int, default=RetentionConfig.lock_timeout_ms)
+    args = parser.parse_args()
+
+    config = RetentionConfig(
+        policies=tuple(p.strip() for p in args.policies.split(",") if p.strip()),
+        queue_days=args.queue_days,
+        token_days=args.token_days,
+        seen_days=args.seen_days,
+        batch_size=args.batch_size,
+        pause=args.pause,
+        lock_timeout_ms=args.lock_timeout_ms,
+    )
+    print_report(await run_retention(config))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+from src.infrastructure.db.repositories.memory_repo import InMemoryUserRepository
+
+# без DATABASE_URL session.py падает при импорте: тесты, которым нужен
+# Postgres, не собираются, остальные (и memory-бэкенд repo) работают
+if not os.getenv("DATABASE_URL"):
+    collect_ignore = [
+        "test_backfill_photo_status.py",
+        "test_bulk_copy.py",
+        "test_convert_queue_storage.py",
+        "test_query_plans.py",
+        "test_repository.py",
+        "test_retention.py",
+        "test_session.py",
+        "test_sharding.py",
+    ]
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def _dispose_engine():
+    # у каждого теста свой event loop, а соединения пула привязаны к циклу,
+    # в котором были открыты - закрываем их после теста
+    yield
+    session_module = sys.modules.get("src.infrastructure.db.session")
+    if session_module is not None:
+        await session_module.engine.dispose()
+
+
+@pytest_asyncio.fixture(params=["memory", "rows", "packed"])
+async def repo(request):
+    """
+    Пустой репозиторий каждого бэкенда для общих тестов интерфейса.
+
+    Postgres-бэкенды работают в транзакции, которая в конце теста
+    откатывается: commit репозитория - это savepoint внутри неё.
+    """
+    if request.param == "memory":
+        yield InMemoryUserRepository()
+        return
+    if not os.getenv("DATABASE_URL"):
+        pytest.skip("DATABASE_URL is not set")
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from src.infrastructure.db.repositories.factory import create_user_repository
+    from src.infrastructure.db.session import engine
+
+    async with engine.connect() as conn:
+        await conn.begin()
+        # очередь скачивания фото общая: чужие строки не должны попасть
+        # в claim_pending_photos, откат вернёт их
+        await conn.execute(text(
+            "UPDATE photos SET status = 'failed' WHERE status IN ('pending', 'claimed')"
+        ))
+        session = AsyncSession(
+            bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False
+        )
+        try:
+            yield create_user_repository(session, request.param)
+        finally:
+            await session.close()
+            await conn.rollback()
+
+
+@pytest_asyncio.fixture
+async def make_databases():
+    """
+    Фабрика отдельных баз <prefix>_<n> на сервере DATABASE_URL: создаются
+    при первом запуске, схема - init_db, все таблицы пустые.
+    """
+    from src.scripts.init_db import create_databases
+
+    async def make(prefix: str, count: int) -> list[str]:
+        return await create_databases(os.environ["DATABASE_URL"], prefix, count, truncate=True)
+
+    return make
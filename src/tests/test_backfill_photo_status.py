@@ -0,0 +1,43 @@
+"""
+Перевод старых фото в очередь скачивания в отдельной базе
+vkt_backfill_test_0 на сервере DATABASE_URL.
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+from src.infrastructure.db.session import PoolSettings, create_engine
+from src.scripts.backfill_photo_status import backfill
+
+
+@pytest_asyncio.fixture
+async def db_engine(make_databases):
+    (url,) = await make_databases("vkt_backfill_test", 1)
+    engine = create_engine(url, PoolSettings(pool_size=1))
+    yield engine
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_backfill_marks_only_rows_without_status(db_engine):
+    async with db_engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO profiles (vk_user_id, first_name, last_name, domain) VALUES (1, '', '', '')"
+        ))
+        await conn.execute(text(
+            """
+            INSERT INTO photos (vk_user_id, photo_id, owner_id, url, likes_count, status)
+            SELECT 1, n, 1, 'https://vk.test/' || n, 0,
+                   CASE WHEN n % 3 = 0 THEN 'done' END
+            FROM generate_series(1, 10) n
+            """
+        ))
+
+    assert await backfill(batch_size=4, pause=0, db_engine=db_engine) == 7
+    assert await backfill(batch_size=4, pause=0, db_engine=db_engine) == 0
+
+    async with db_engine.connect() as conn:
+        statuses = dict(list(await conn.execute(
+            text("SELECT status, count(*) FROM photos GROUP BY status")
+        )))
+    assert statuses == {"pending": 7, "done": 3}
@@ -0,0 +1,123 @@
+"""
+Выгрузка и загрузка через COPY между двумя локальными базами
+vkt_bulk_test_<n> на сервере DATABASE_URL.
+"""
+from contextlib import asynccontextmanager
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.infrastructure.db.repositories.factory import create_user_repository
+from src.infrastructure.db.schemas.dto import PhotoDTO, ProfileDTO
+from src.infrastructure.db.session import PoolSettings, create_engine
+from src.scripts.bulk_copy import export, import_
+
+
+@pytest_asyncio.fixture
+async def urls(make_databases):
+    return await make_databases("vkt_bulk_test", 2)
+
+
+@asynccontextmanager
+async def _repo(url: str, queue_storage: str = "rows"):
+    engine = create_engine(url, PoolSettings(pool_size=1))
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield create_user_repository(session, queue_storage)
+    finally:
+        await engine.dispose()
+
+
+async def _fill(url: str) -> None:
+    async with _repo(url) as repo:
+        await repo.upsert_profiles(
+            [ProfileDTO(v, f"f{v}", f"l{v}", f"d{v}") for v in range(10, 16)]
+        )
+        for v in (10, 11, 15):
+            await repo.set_photos(
+                v, [PhotoDTO(p, v, f"https://vk.test/{v}/{p}", p) for p in (1, 2)]
+            )
+        # новые фильтры сбрасывают очередь - до set_queue
+        await repo.update_filters(1, "Москва", 1, 20, 30)
+        await repo.set_queue(1, [10, 11, 12])
+        await repo.move_next(1)
+        await repo.add_favorites_many(1, [12, 10])
+        await repo.add_blacklist(1, 13)
+        await repo.set_queue(2, [15])
+    async with _repo(url, "packed") as repo:
+        await repo.set_queue(3, [14])
+
+
+async def _rows(url: str, sql: str) -> list[tuple]:
+    engine = create_engine(url, PoolSettings(pool_size=1))
+    try:
+        async with engine.connect() as conn:
+            return [tuple(row) for row in await conn.execute(text(sql))]
+    finally:
+        await engine.dispose()
+
+
+_SNAPSHOT = [
+    "SELECT tg_user_id, filter_city_name, filter_gender, history_cursor FROM users ORDER BY 1",
+    "SELECT tg_user_id, vk_profile_id, position FROM queue ORDER BY 1, 3",
+    "SELECT tg_user_id, vk_ids FROM queue_packed ORDER BY 1",
+    "SELECT tg_user_id, vk_profile_id FROM favorites ORDER BY id",
+    "SELECT tg_user_id, vk_profile_id FROM blacklist ORDER BY 1, 2",
+    "SELECT vk_user_id, first_name FROM profiles ORDER BY 1",
+    "SELECT vk_user_id, photo_id, url FROM photos ORDER BY 1, 2",
+]
+
+
+async def _snapshot(url: str) -> list[list[tuple]]:
+    return [await _rows(url, sql) for sql in _SNAPSHOT]
+
+
+@pytest.mark.asyncio
+async def test_export_selected_users_and_import_twice(urls, tmp_path):
+    source, target = urls
+    await _fill(source)
+
+    exported = await export(source, tmp_path, users=[1, 3], compressed=True, jobs=2)
+    rows = {t.table: t.rows for t in exported.tables}
+    # пользователь 2 и профиль 15 из его очереди не выгружаются, 13 - только в чёрном списке
+    assert rows["users"] == 2 and rows["queue"] == 3 and rows["queue_packed"] == 1
+    assert rows["profiles"] == 4 and rows["photos"] == 4
+    assert (tmp_path / "photos.bin.gz").exists()
+
+    for _ in range(2):
+        await import_(target, tmp_path, jobs=2)
+        users, queue, packed, favorites, blacklist, profiles, photos = await _snapshot(target)
+        assert users == [(1, "Москва", 1, 1), (3, None, None, 0)]
+        assert queue == [(1, 10, 0), (1, 11, 1), (1, 12, 2)]
+        assert packed == [(3, [14])]
+        assert favorites == [(1, 12), (1, 10)]
+        assert blacklist == [(1, 13)]
+        assert [p[0] for p in profiles] == [10, 11, 12, 14]
+        assert [p[:2] for p in photos] == [(10, 1), (10, 2), (11, 1), (11, 2)]
+
+
+@pytest.mark.asyncio
+async def test_full_export_overwrites_stale_copy(urls, tmp_path):
+    source, target = urls
+    await _fill(source)
+    # устаревшая копия пользователя 1 на приёмнике
+    async with _repo(target) as repo:
+        await repo.upsert_profiles([ProfileDTO(v, "old", "old", "old") for v in (10, 99)])
+        await repo.set_photos(10, [PhotoDTO(7, 10, "https://vk.test/old", 0)])
+        await repo.set_queue(1, [99, 10])
+        await repo.add_favorite(1, 99)
+
+    exported = await export(source, tmp_path, jobs=1)
+    imported = await import_(target, tmp_path, jobs=3)
+    assert imported.rows == exported.rows
+
+    users, queue, packed, favorites, blacklist, profiles, photos = await _snapshot(target)
+    expected = await _snapshot(source)
+    assert (users, queue, packed, blacklist, photos) == (
+        expected[0], expected[1], expected[2], expected[4], expected[6]
+    )
+    # избранное и профили сливаются, а не заменяются
+    assert favorites == [(1, 99), (1, 12), (1, 10)]
+    assert profiles == sorted(expected[5] + [(99, "old")])
@@ -0,0 +1,161 @@
+import pytest
+
+from src.infrastructure.cache import TTLCache
+from src.infrastructure.db.repositories.cached_repo import (
+    CachedUserRepository, excluded_key, profile_key,
+)
+from src.infrastructure.db.repositories.delegating_repo import DelegatingUserRepository
+from src.infrastructure.db.repositories.memory_repo import InMemoryUserRepository
+from src.infrastructure.db.schemas.dto import ProfileDTO
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lru_eviction_by_entry_count():
+    cache = TTLCache(max_entries=2)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry_and_counters():
+    clock = FakeClock()
+    cache = TTLCache(max_entries=10, ttl=5, clock=clock)
+
+    cache.set("a", 1)
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5.0
+    assert cache.get("a") is None
+
+    assert cache.hits == 1
+    assert cache.misses == 1
+    assert len(cache) == 0
+
+
+def test_peek_does_not_count_or_reorder():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    assert cache.peek("a") == 1 and cache.peek("x", 0) == 0
+    cache.set("c", 3)
+    assert cache.peek("a") is None
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_invalidate_bumps_only_its_key_version():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1)
+    a, b = cache.version("a"), cache.version("b")
+
+    cache.invalidate("a")
+
+    assert cache.get("a") is None
+    assert cache.version("a") > a
+    assert cache.version("b") == b
+
+    # версии вытесненных ключей не теряются: они поднимают общий порог
+    a = cache.version("a")
+    cache.invalidate("x")
+    cache.invalidate("y")
+    assert cache.version("a") >= a
+    assert cache.version("x") < cache.version("y") == cache.tick
+
+    cache.clear()
+    assert cache.version("b") == cache.version("y") == cache.tick
+
+
+class HookedRepository(DelegatingUserRepository):
+    """Вызывает during() посреди get_profile - запись другой задачи во время загрузки."""
+
+    during = None
+
+    async def get_profile(self, vk_user_id):
+        profile = await self.inner.get_profile(vk_user_id)
+        if self.during is not None:
+            await self.during()
+        return profile
+
+
+@pytest.mark.asyncio
+async def test_load_is_dropped_only_if_its_key_was_invalidated():
+    inner = HookedRepository(InMemoryUserRepository())
+    repo = CachedUserRepository(inner)
+    await repo.upsert_profiles([ProfileDTO(10, "a", "b", "c")])
+    await repo.set_queue(2, [10])
+
+    # чужой свайп не мешает сохранить профиль
+    inner.during = lambda: repo.move_next(2)
+    await repo.get_profile(10)
+    assert repo.cache.peek(profile_key(10)) is not None
+
+    # а обновление этого же профиля - мешает
+    repo.cache.invalidate(profile_key(10))
+    inner.during = lambda: repo.upsert_profiles([ProfileDTO(10, "x", "y", "z")])
+    assert (await repo.get_profile(10)).first_name == "a"
+    assert repo.cache.peek(profile_key(10)) is None
+
+
+class CountingRepository(DelegatingUserRepository):
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.loads = 0
+
+    async def list_blacklist(self, tg_user_id):
+        self.loads += 1
+        return await self.inner.list_blacklist(tg_user_id)
+
+
+@pytest.mark.asyncio
+async def test_delegating_transaction_yields_decorator():
+    repo = CountingRepository(InMemoryUserRepository())
+
+    async with repo.transaction() as tx:
+        assert tx is repo
+        await tx.list_blacklist(1)
+    assert repo.loads == 1
+
+
+@pytest.mark.asyncio
+async def test_exclusion_filter_is_loaded_once_and_updated_in_place():
+    inner = CountingRepository(InMemoryUserRepository())
+    repo = CachedUserRepository(inner)
+    await inner.add_blacklist(1, 10)
+    await inner.add_favorite(1, 20)
+
+    assert await repo.is_excluded_many(1, [10, 20, 30]) == {10, 20}
+    await repo.add_blacklist(1, 30)
+    await repo.add_favorites_many(1, [40, 20])
+    await repo.remove_favorite(1, 20)
+    await repo.add_favorite(1, 10)
+    await repo.remove_favorite(1, 10)
+    assert await repo.is_excluded_many(1, [10, 20, 30, 40, 50]) == {10, 30, 40}
+    assert inner.loads == 1
+
+    # в транзакции фильтр сбрасывается: её откат не оставит его неверным
+    with pytest.raises(RuntimeError):
+        async with repo.transaction():
+            await repo.add_blacklist(1, 50)
+            assert await repo.is_excluded_many(1, [50]) == {50}
+            raise RuntimeError("boom")
+    assert await repo.is_excluded_many(1, [50]) == set()
+    assert inner.loads == 2
+
+    # запись другого процесса (InvalidationListener)
+    await inner.add_blacklist(1, 60)
+    repo.cache.invalidate(excluded_key(1))
+    assert await repo.is_excluded_many(1, [60]) == {60}
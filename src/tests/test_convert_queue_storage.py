@@ -0,0 +1,63 @@
+"""
+Перенос очередей между режимами хранения в отдельной базе
+vkt_convert_test_0 на сервере DATABASE_URL: скрипт меняет все очереди.
+"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.infrastructure.db.repositories.factory import create_user_repository
+from src.infrastructure.db.session import PoolSettings, create_engine
+from src.scripts.convert_queue_storage import convert
+
+
+@pytest_asyncio.fixture
+async def db_engine(make_databases):
+    (url,) = await make_databases("vkt_convert_test", 1)
+    engine = create_engine(url, PoolSettings(pool_size=1))
+    yield engine
+    await engine.dispose()
+
+
+async def _rows(engine, sql: str) -> list[tuple]:
+    async with engine.connect() as conn:
+        return [tuple(row) for row in await conn.execute(text(sql))]
+
+
+@pytest.mark.asyncio
+async def test_convert_renumbers_positions_and_drops_stale_queues(db_engine):
+    async with AsyncSession(db_engine, expire_on_commit=False) as session:
+        rows = create_user_repository(session, "rows")
+        await rows.set_queue(1, [10, 20, 30, 40])
+        await rows.move_next(1)
+        await rows.move_next(1)
+        # дыра в позициях перед курсором: курсор 2 -> индекс 1
+        await rows.add_blacklist(1, 10)
+        await rows.set_queue(2, [50])
+        assert await rows.get_current_vk_id(1) == 30
+
+    await convert("packed", keep_source=True, db_engine=db_engine)
+    assert await _rows(db_engine, "SELECT tg_user_id, position FROM queue ORDER BY 1, 2") == [
+        (1, 0), (1, 1), (1, 2), (2, 0)
+    ]
+    async with AsyncSession(db_engine, expire_on_commit=False) as session:
+        for storage in ("rows", "packed"):
+            repo = create_user_repository(session, storage)
+            assert await repo.get_current_vk_id(1) == 30
+
+    # очередь пользователя 2 опустела после прошлого прогона с --keep-source
+    async with db_engine.begin() as conn:
+        await conn.execute(text("DELETE FROM queue WHERE tg_user_id = 2"))
+    await convert("packed", db_engine=db_engine)
+    assert await _rows(db_engine, "SELECT tg_user_id, vk_ids FROM queue_packed") == [
+        (1, [20, 30, 40])
+    ]
+    assert await _rows(db_engine, "SELECT count(*) FROM queue") == [(0,)]
+
+    await convert("rows", db_engine=db_engine)
+    assert await _rows(db_engine, "SELECT vk_profile_id, position FROM queue ORDER BY 2") == [
+        (20, 0), (30, 1), (40, 2)
+    ]
+    async with AsyncSession(db_engine, expire_on_commit=False) as session:
+        assert await create_user_repository(session, "rows").get_current_vk_id(1) == 30
@@ -0,0 +1,151 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import text
+
+from src.infrastructure.cache import TTLCache
+from src.infrastructure.db import invalidation
+from src.infrastructure.db.invalidation import InvalidationListener, asyncpg_dsn
+from src.infrastructure.db.repositories.cached_repo import (
+    excluded_key, photos_key, profile_key, user_key,
+)
+from src.infrastructure.db.schemas.dto import ProfileDTO, PhotoDTO
+
+needs_db = pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL is not set")
+
+VK = 910_022_000
+
+
+def test_encode_splits_payloads_and_decodes_back(monkeypatch):
+    payloads = invalidation.encode({"u": {3, 1}, "p": [10], "ph": []})
+    assert payloads == ["u:1,3;p:10"]
+    assert invalidation.decode(payloads[0]) == [user_key(1), user_key(3), profile_key(10)]
+    assert invalidation.decode("x:1;ph:5") == [photos_key(5)]
+    assert invalidation.decode("e:7") == [excluded_key(7)]
+
+    monkeypatch.setattr(invalidation, "MAX_PAYLOAD", 16)
+    payloads = invalidation.encode({"p": range(100, 106), "u": [7]})
+    assert all(len(p) <= 16 for p in payloads)
+    keys = [key for p in payloads for key in invalidation.decode(p)]
+    assert keys == [profile_key(v) for v in range(100, 106)] + [user_key(7)]
+
+    # origin повторяется в каждом payload и не даёт ключей
+    payloads = invalidation.encode({"p": range(100, 106)}, "ab.1")
+    assert all(len(p) <= 16 and invalidation.source_of(p) == "ab.1" for p in payloads)
+    keys = [key for p in payloads for key in invalidation.decode(p)]
+    assert keys == [profile_key(v) for v in range(100, 106)]
+    assert invalidation.source_of("p:1") is None
+
+
+async def _wait_for(predicate, timeout: float = 5.0) -> None:
+    async def poll():
+        while not predicate():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+@needs_db
+@pytest.mark.asyncio
+async def test_listener_evicts_keys_written_by_other_sessions():
+    from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+    from src.infrastructure.db.session import SessionLocal
+
+    cache = TTLCache(ttl=3600)
+    # как listener другого процесса: записи этого приходят ему чужими
+    listener = InvalidationListener(
+        asyncpg_dsn(os.environ["DATABASE_URL"]), [cache], skip_own=False
+    ).start()
+    try:
+        await listener.wait_listening(5)
+        for key in (profile_key(VK + 1), photos_key(VK + 1), user_key(VK + 2)):
+            cache.set(key, "stale")
+
+        async with SessionLocal() as session:
+            repo = PostgresUserRepository(session)
+            await repo.upsert_profile(ProfileDTO(VK + 1, "a", "b", "c"))
+            await _wait_for(lambda: cache.get(profile_key(VK + 1)) is None)
+
+            # уведомления транзакции уходят одним COMMIT, откат их отменяет
+            with pytest.raises(RuntimeError):
+                async with repo.transaction():
+                    await repo.set_cursor(VK + 2, 1)
+                    raise RuntimeError("boom")
+            async with repo.transaction():
+                await repo.set_photos(VK + 1, [PhotoDTO(1, VK + 1, "https://vk.test/1", 0)])
+                await repo.set_cursor(VK + 2, 0)
+            await _wait_for(lambda: cache.get(photos_key(VK + 1)) is None)
+            assert cache.get(user_key(VK + 2)) is None
+            assert listener.events == 2
+    finally:
+        await listener.stop()
+
+
+@needs_db
+@pytest.mark.asyncio
+async def test_listener_reconnects_and_clears_cache():
+    from src.infrastructure.db.session import engine
+
+    cache = TTLCache(ttl=3600)
+    listener = InvalidationListener(
+        asyncpg_dsn(os.environ["DATABASE_URL"]), [cache],
+        channel="vkt_invalidate_test", ping_interval=0.2, reconnect_delay=0.05,
+    ).start()
+    try:
+        await listener.wait_listening(5)
+        cache.set(profile_key(VK + 3), "stale")
+
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                "WHERE application_name = :name"
+            ), {"name": invalidation.APPLICATION_NAME})
+        await _wait_for(lambda: listener.reconnects == 1 and listener.listening)
+        # пропущенные за время обрыва события не придут - кэш пуст
+        assert len(cache) == 0
+
+        async with engine.begin() as conn:
+            await conn.execute(text("SELECT pg_notify('vkt_invalidate_test', 'p:1')"))
+        await _wait_for(lambda: listener.events == 1)
+    finally:
+        await listener.stop()
+
+
+@needs_db
+@pytest.mark.asyncio
+async def test_own_notifications_keep_exclusion_filter():
+    from sqlalchemy import event
+
+    from src.infrastructure.db.repositories.cached_repo import CachedUserRepository
+    from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+    from src.infrastructure.db.session import SessionLocal, engine
+
+    tg = VK + 4
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    cache = TTLCache(ttl=3600)
+    listener = InvalidationListener(asyncpg_dsn(os.environ["DATABASE_URL"]), [cache]).start()
+    try:
+        await listener.wait_listening(5)
+        async with SessionLocal() as session:
+            repo = CachedUserRepository(PostgresUserRepository(session), cache)
+            async with engine.begin() as conn:
+                await conn.execute(text("DELETE FROM blacklist WHERE tg_user_id = :tg"), {"tg": tg})
+            assert await repo.is_excluded_many(tg, [VK + 10, VK + 11]) == set()
+
+            await repo.add_blacklist(tg, VK + 10)
+            # своё уведомление дошло и пропущено - фильтр остался в кэше
+            await _wait_for(lambda: listener.skipped == 1)
+
+            event.listen(engine.sync_engine, "before_cursor_execute", count)
+            try:
+                assert await repo.is_excluded_many(tg, [VK + 10, VK + 11]) == {VK + 10}
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", count)
+            assert statements == 0 and listener.events == 0
+    finally:
+        await listener.stop()
@@ -0,0 +1,32 @@
+import pytest
+
+from src.infrastructure.db.metrics import RepositoryMetrics
+
+
+def test_track_counts_calls_errors_and_buckets():
+    metrics = RepositoryMetrics(buckets=(0.1, 1.0))
+
+    with metrics.track("get_profile"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.track("get_profile"):
+            raise ValueError
+
+    snapshot = metrics.snapshot()["get_profile"]
+    assert snapshot["calls"] == 2
+    assert snapshot["errors"] == 1
+    assert snapshot["latency_buckets"] == {"0.1": 2, "1.0": 0, "+Inf": 0}
+
+
+def test_render_prometheus():
+    metrics = RepositoryMetrics(buckets=(0.1,))
+    with metrics.track("move_next"):
+        pass
+
+    text = metrics.render_prometheus(prefix="repo")
+
+    assert "# TYPE repo_calls_total counter" in text
+    assert 'repo_calls_total{method="move_next"} 1' in text
+    assert 'repo_latency_seconds_bucket{method="move_next",le="0.1"} 1' in text
+    assert 'repo_latency_seconds_bucket{method="move_next",le="+Inf"} 1' in text
+    assert 'repo_latency_seconds_count{method="move_next"} 1' in text
@@ -0,0 +1,232 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.infrastructure.db.schemas.dto import PhotoJobDTO
+from src.infrastructure.photos.store import PhotoStore
+from src.infrastructure.photos.worker import PhotoDownloader
+
+
+class PhotoHandler(BaseHTTPRequestHandler):
+    # /photo/<n> - n КБ содержимого, /same/<n> - одинаковые байты, прочее - 404
+    def do_GET(self):
+        kind, _, n = self.path.strip("/").partition("/")
+        if kind == "photo":
+            body = n.encode() * 1024
+        elif kind == "same":
+            body = b"same" * 256
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def photo_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PhotoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+class FakePhotoRepository:
+    """Только методы PHOTO FILES, которые вызывает PhotoDownloader."""
+
+    def __init__(self, urls: list[str]):
+        self.rows = {
+            i: {"url": url, "status": "pending", "local_path": None, "attempts": 0, "error": None}
+            for i, url in enumerate(urls, start=1)
+        }
+
+    async def claim_pending_photos(
+        self, limit: int, worker_id: str, lease_seconds: float = 300.0, max_attempts: int = 3
+    ) -> list[PhotoJobDTO]:
+        pending = [i for i, row in self.rows.items() if row["status"] == "pending"]
+        jobs = []
+        for i in pending[:limit]:
+            row = self.rows[i]
+            row["status"] = "claimed"
+            row["attempts"] += 1
+            jobs.append(PhotoJobDTO(i, 1, row["url"], attempts=row["attempts"], worker_id=worker_id))
+        return jobs
+
+    async def complete_photos(self, jobs: list[PhotoJobDTO]) -> None:
+        for job in jobs:
+            self.rows[job.id].update(status="done", local_path=job.local_path)
+
+    async def fail_photos(self, jobs: list[PhotoJobDTO], max_attempts: int = 3) -> None:
+        for job in jobs:
+            row = self.rows[job.id]
+            row["status"] = "failed" if row["attempts"] >= max_attempts else "pending"
+            row["error"] = job.error
+
+    async def reset_photo_files(self, local_paths: list[str]) -> list[int]:
+        for row in self.rows.values():
+            if row["local_path"] in local_paths:
+                row.update(status="pending", local_path=None)
+        return [1]
+
+
+def test_store_deduplicates_content_and_evicts_lru(tmp_path):
+    store = PhotoStore(str(tmp_path), max_bytes=2500)
+
+    a = store.put("http://x/a", b"a" * 1000)
+    assert store.put("http://x/a-copy", b"a" * 1000) == a
+    assert store.total_bytes == 1000
+    assert store.lookup("http://x/a-copy") == a
+
+    b = store.put("http://x/b", b"b" * 1000)
+    store.touch(a)
+    store.put("http://x/c", b"c" * 1000)
+
+    assert store.evict() == [b]
+    assert store.lookup("http://x/b") is None
+    assert store.lookup("http://x/a") == a
+
+    # root занят, пока хранилище не закрыто
+    with pytest.raises(RuntimeError):
+        PhotoStore(str(tmp_path))
+    store.close()
+
+    # после рестарта объекты и ссылки находятся на диске
+    reopened = PhotoStore(str(tmp_path), max_bytes=2500)
+    assert reopened.total_bytes == 2000
+    assert reopened.lookup("http://x/a") == a
+    with open(reopened.path(a), "rb") as f:
+        assert f.read() == b"a" * 1000
+
+
+@pytest.mark.asyncio
+async def test_downloader_fetches_once_per_url(tmp_path, photo_server):
+    urls = [
+        f"{photo_server}/photo/1",
+        f"{photo_server}/photo/2",
+        f"{photo_server}/photo/1",   # тот же URL в пачке
+        f"{photo_server}/same/1",
+        f"{photo_server}/same/2",    # другой URL, то же содержимое
+        f"{photo_server}/missing",
+    ]
+    repo = FakePhotoRepository(urls)
+    store = PhotoStore(str(tmp_path), max_bytes=10 * 1024 ** 2)
+
+    downloader = PhotoDownloader(repo, store, concurrency=2, batch_size=4, max_attempts=1)
+    stats = await downloader.run()
+    downloader.close()
+
+    assert stats.jobs == 6
+    assert stats.fetched == 4
+    assert stats.hits == 1
+    assert stats.failed == 1
+    assert stats.bytes > 0 and stats.bytes_per_second > 0
+    assert repo.rows[1]["local_path"] == repo.rows[3]["local_path"]
+    assert repo.rows[4]["local_path"] == repo.rows[5]["local_path"]
+    assert repo.rows[6]["status"] == "failed"
+    assert "404" in repo.rows[6]["error"]
+
+    # повторный прогон по тем же URL целиком из хранилища
+    downloader = PhotoDownloader(FakePhotoRepository(urls[:2]), store)
+    stats = await downloader.run()
+    downloader.close()
+    assert stats.fetched == 0 and stats.hit_rate == 1.0
+
+
+@pytest.mark.asyncio
+async def test_downloader_evicts_and_resets_rows(tmp_path, photo_server):
+    urls = [f"{photo_server}/photo/{n}" for n in range(1, 7)]
+    repo = FakePhotoRepository(urls)
+    # ~1 КБ на фото, места на три
+    store = PhotoStore(str(tmp_path), max_bytes=3 * 1024)
+
+    downloader = PhotoDownloader(repo, store, batch_size=2)
+    stats = await downloader.run(max_batches=3)
+    downloader.close()
+
+    assert stats.evicted == 3
+    assert store.total_bytes <= store.max_bytes
+    statuses = [repo.rows[i]["status"] for i in sorted(repo.rows)]
+    assert statuses.count("done") == 3
+    assert statuses.count("pending") == 3
+
+
+@pytest.mark.asyncio
+async def test_eviction_resets_only_own_store_rows(tmp_path, photo_server):
+    # два загрузчика качают одни и те же фото в свои каталоги
+    repo = FakePhotoRepository([f"{photo_server}/photo/{n}" for n in (1, 2, 1, 2)])
+    first = PhotoStore(str(tmp_path / "a"), max_bytes=10 * 1024 ** 2, store_id="a")
+    second = PhotoStore(str(tmp_path / "b"), max_bytes=10 * 1024 ** 2)
+
+    for store in (first, second):
+        downloader = PhotoDownloader(repo, store, batch_size=2)
+        await downloader.run(max_batches=1)
+        downloader.close()
+    paths = [repo.rows[i]["local_path"] for i in sorted(repo.rows)]
+    assert [PhotoStore.owner(p) for p in paths] == ["a", "a", second.store_id, second.store_id]
+    with pytest.raises(ValueError):
+        first.path(paths[2])
+
+    first.max_bytes = 1
+    await repo.reset_photo_files(first.evict())
+    assert [repo.rows[i]["status"] for i in sorted(repo.rows)] == [
+        "pending", "pending", "done", "done"
+    ]
+
+    # id сохраняется в каталоге и не меняется при открытии
+    first.close()
+    with pytest.raises(ValueError):
+        PhotoStore(str(tmp_path / "a"), store_id="other")
+    assert PhotoStore(str(tmp_path / "a")).store_id == "a"
+
+
+@pytest.mark.asyncio
+async def test_downloader_retries_until_max_attempts(tmp_path, photo_server):
+    repo = FakePhotoRepository([f"{photo_server}/photo/1", f"{photo_server}/missing"])
+    store = PhotoStore(str(tmp_path), max_bytes=10 * 1024 ** 2)
+
+    downloader = PhotoDownloader(repo, store, worker_id="w1", max_attempts=3)
+    stats = await downloader.run()
+    downloader.close()
+
+    # первая пачка - обе строки, дальше только неудачная, пока не кончатся попытки
+    assert stats.jobs == 4
+    assert stats.failed == 3
+    assert repo.rows[1]["attempts"] == 1 and repo.rows[1]["status"] == "done"
+    assert repo.rows[2]["attempts"] == 3 and repo.rows[2]["status"] == "failed"
+
+
+class ExpiredLeaseRepository(FakePhotoRepository):
+    """Строка 1 взята упавшим воркером: claim возвращает её в pending, но не берёт."""
+
+    def __init__(self, urls: list[str]):
+        super().__init__(urls)
+        self.rows[1]["status"] = "claimed"
+
+    async def claim_pending_photos(
+        self, limit: int, worker_id: str, lease_seconds: float = 300.0, max_attempts: int = 3
+    ) -> list[PhotoJobDTO]:
+        expired = [row for row in self.rows.values() if row["status"] == "claimed"]
+        jobs = await super().claim_pending_photos(limit, worker_id, lease_seconds, max_attempts)
+        for row in expired:
+            row["status"] = "pending"
+        return jobs
+
+
+@pytest.mark.asyncio
+async def test_downloader_picks_up_released_rows(tmp_path, photo_server):
+    repo = ExpiredLeaseRepository([f"{photo_server}/photo/1"])
+    store = PhotoStore(str(tmp_path), max_bytes=10 * 1024 ** 2)
+
+    downloader = PhotoDownloader(repo, store)
+    stats = await downloader.run()
+    downloader.close()
+
+    assert stats.jobs == 1
+    assert repo.rows[1]["status"] == "done"
@@ -0,0 +1,163 @@
+"""
+Регрессия планов запросов: каждый запрос PostgresUserRepository
+на большом наборе данных должен идти по индексу, а не Seq Scan.
+
+Данные сидятся внутри транзакции, которая в конце откатывается.
+Размер задаётся через PLAN_TEST_ROWS: по умолчанию 50k строк на таблицу -
+этого хватает, чтобы Seq Scan проигрывал индексу; прогон на объёмах
+продакшена - PLAN_TEST_ROWS=1000000.
+"""
+import json
+import os
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.infrastructure.db.repositories.packed_queue_repo import PackedQueueUserRepository
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import ProfileDTO, PhotoDTO
+from src.infrastructure.db.session import engine
+
+ROWS = int(os.getenv("PLAN_TEST_ROWS", "50000"))
+USERS = max(ROWS // 10, 1)
+# сдвиг id, чтобы не пересекаться с данными других тестов
+BASE = 1_000_000_000
+
+REPO_TABLES = {
+    "users", "queue", "queue_packed", "favorites", "blacklist", "seen_profiles",
+    "profiles", "photos",
+}
+
+SEED = [
+    """
+    INSERT INTO users (tg_user_id, history_cursor)
+    SELECT :base + g, 0 FROM generate_series(1, :users) g
+    """,
+    """
+    INSERT INTO queue (tg_user_id, vk_profile_id, position)
+    SELECT :base + g % :users + 1, :base + g, g / :users FROM generate_series(1, :rows) g
+    """,
+    """
+    INSERT INTO queue_packed (tg_user_id, vk_ids)
+    SELECT tg_user_id, array_agg(vk_profile_id ORDER BY position)
+    FROM queue WHERE tg_user_id > :base GROUP BY tg_user_id
+    """,
+    """
+    INSERT INTO favorites (tg_user_id, vk_profile_id)
+    SELECT :base + g % :users + 1, :base + g FROM generate_series(1, :rows) g
+    """,
+    """
+    INSERT INTO blacklist (tg_user_id, vk_profile_id)
+    SELECT :base + g % :users + 1, :base + g FROM generate_series(1, :rows) g
+    """,
+    """
+    INSERT INTO seen_profiles (tg_user_id, vk_profile_id)
+    SELECT :base + g % :users + 1, :base + g FROM generate_series(1, :rows) g
+    """,
+    """
+    INSERT INTO profiles (vk_user_id, first_name, last_name, domain)
+    SELECT :base + g, 'first', 'last', 'id' || g FROM generate_series(1, :rows) g
+    """,
+    """
+    INSERT INTO photos (vk_user_id, photo_id, owner_id, url, likes_count)
+    SELECT :base + g, g, g, 'https://vk.test/' || g, 0 FROM generate_series(1, :rows) g
+    """,
+]
+
+# id из середины засиженного диапазона, чтобы планировщик видел реальную
+# селективность, а не пустые значения за пределами статистики
+TG = BASE + USERS // 2
+VK = BASE + ROWS // 2
+
+
+async def exercise(repo: PostgresUserRepository) -> None:
+    await repo.get_or_create_user(TG)
+    await repo.upsert_user_token_and_vk_id(TG, "token", VK)
+    await repo.get_cursor(TG)
+    await repo.set_cursor(TG, 1)
+    await repo.get_current_vk_id(TG)
+    await repo.move_next(TG)
+    await repo.move_prev(TG)
+    await repo.get_queue(TG)
+    [vk_id async for vk_id in repo.stream_queue(TG)]
+    await repo.get_window(TG, ahead=3, behind=1)
+
+    await repo.add_favorite(TG, BASE + ROWS + 1)
+    await repo.list_favorites(TG)
+    page = await repo.list_favorites_page(TG, limit=2)
+    await repo.list_favorites_page(TG, page.next_after_id, limit=2)
+    [vk_id async for vk_id in repo.stream_favorites(TG)]
+    await repo.remove_favorite(TG, BASE + ROWS + 1)
+    await repo.add_blacklist(TG, VK)
+
+    await repo.upsert_profile(ProfileDTO(VK, "a", "b", "c"))
+    await repo.get_profile(VK)
+    await repo.set_photos(VK, [PhotoDTO(1, VK, "https://vk.test/x", 0)])
+    await repo.get_photos(VK)
+    jobs = await repo.claim_pending_photos(10, "plan-test")
+    for job in jobs:
+        job.local_path = f"objects/{job.id}"
+    await repo.complete_photos(jobs)
+    await repo.fail_photos(jobs)
+    await repo.reset_photo_files([f"objects/{job.id}" for job in jobs])
+
+    await repo.set_queue(TG, [1, 2, 3])
+    await repo.set_queue(TG, [VK, VK + 1, BASE + 1], exclude_known=True)
+    await repo.update_filters(TG, "Москва", 1, 18, 30)
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in REPO_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "repo_cls", [PostgresUserRepository, PackedQueueUserRepository], ids=["rows", "packed"]
+)
+async def test_repository_queries_use_indexes(repo_cls):
+    captured: list[tuple[str, tuple]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            captured.append((statement, parameters))
+
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            for sql in SEED:
+                await conn.execute(text(sql), {"base": BASE, "users": USERS, "rows": ROWS})
+            await conn.execute(text("ANALYZE"))
+
+            session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint")
+            event.listen(engine.sync_engine, "before_cursor_execute", capture)
+            try:
+                await exercise(repo_cls(session))
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", capture)
+                await session.close()
+
+            failures = []
+            for statement, parameters in captured:
+                verb = statement.lstrip().split(None, 1)[0].upper()
+                if verb not in {"SELECT", "UPDATE", "DELETE", "INSERT", "WITH"}:
+                    continue
+                result = await conn.exec_driver_sql(
+                    "EXPLAIN (FORMAT JSON) " + statement, parameters
+                )
+                plan = result.scalar_one()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                tables = seq_scans(plan[0]["Plan"])
+                if tables:
+                    failures.append(f"Seq Scan on {tables}: {statement}")
+
+            assert captured
+            assert not failures, "\n\n".join(failures)
+        finally:
+            await trans.rollback()
@@ -1,6 +1,17 @@
+import asyncio
+
 import pytest
-from src.infrastructure.db.session import SessionLocal
+from sqlalchemy import event, text
+from src.infrastructure.db.metrics import RepositoryMetrics
+from src.infrastructure.db.models import PhotoStatus
+from src.infrastructure.db.session import SessionLocal, engine
 from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.repositories.packed_queue_repo import PackedQueueUserRepository
+from src.infrastructure.db.repositories.cached_repo import CachedUserRepository
+from src.infrastructure.db.repositories.coalescing_repo import CoalescingUserRepository
+from src.infrastructure.db.repositories.instrumented_repo import InstrumentedUserRepository
+from src.infrastructure.db.schemas.dto import ProfileDTO, PhotoDTO
+from src.infrastructure.singleflight import SingleFlight
 
 
 @pytest.mark.asyncio
@@ -10,4 +21,486 @@ async def test_user_creation():
 
         user = await repo.get_or_create_user(123)
 
-        assert user.tg_user_id == 123
\ No newline at end of file
+        assert user.tg_user_id == 123
+
+@pytest.mark.asyncio
+async def test_set_queue_bulk():
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+
+        await repo.set_queue(124, [10, 20, 30])
+        assert await repo.get_queue(124) == [10, 20, 30]
+        assert await repo.get_cursor(124) == 0
+
+        big = list(range(1000, 3000))
+        await repo.set_queue(124, big)
+        assert await repo.get_queue(124) == big
+
+
+@pytest.mark.asyncio
+async def test_cursor_navigation():
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+
+        await repo.set_queue(125, [10, 20, 30, 40])
+        assert await repo.get_current_vk_id(125) == 10
+        assert await repo.move_prev(125) is None
+
+        assert await repo.move_next(125) == 20
+        assert await repo.move_next(125) == 30
+        assert await repo.get_current_vk_id(125) == 30
+        assert (await repo.get_or_create_user(125)).history_cursor == 2
+
+        # текущая карточка ушла в чёрный список - показываем следующую
+        await repo.add_blacklist(125, 30)
+        assert await repo.get_current_vk_id(125) == 40
+        assert await repo.move_next(125) is None
+        assert await repo.move_prev(125) == 20
+        assert await repo.move_next(125) == 40
+
+
+@pytest.mark.asyncio
+async def test_move_next_concurrent_taps():
+    async with SessionLocal() as session:
+        await PostgresUserRepository(session).set_queue(126, [1, 2, 3, 4, 5])
+
+    async def tap():
+        async with SessionLocal() as session:
+            return await PostgresUserRepository(session).move_next(126)
+
+    results = await asyncio.gather(*(tap() for _ in range(3)))
+
+    assert sorted(results) == [2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_transaction_single_commit_and_rollback():
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        await repo.set_queue(127, [1, 2, 3])
+
+        async with repo.transaction():
+            await repo.add_favorite(127, 500)
+            await repo.move_next(127)
+            assert session.in_transaction()
+
+        with pytest.raises(RuntimeError):
+            async with repo.transaction():
+                await repo.add_favorite(127, 501)
+                await repo.move_next(127)
+                raise RuntimeError("boom")
+
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        assert await repo.get_current_vk_id(127) == 2
+        assert 500 in await repo.list_favorites(127)
+        assert 501 not in await repo.list_favorites(127)
+        await repo.remove_favorite(127, 500)
+
+
+@pytest.mark.asyncio
+async def test_cached_repository_invalidation():
+    async with SessionLocal() as session:
+        repo = CachedUserRepository(PostgresUserRepository(session))
+
+        await repo.upsert_profile(ProfileDTO(7001, "Анна", "Иванова", "anna"))
+        assert (await repo.get_profile(7001)).first_name == "Анна"
+        assert (await repo.get_profile(7001)).first_name == "Анна"
+
+        await repo.upsert_profile(ProfileDTO(7001, "Анна", "Петрова", "anna"))
+        assert (await repo.get_profile(7001)).last_name == "Петрова"
+
+        await repo.get_or_create_user(128)
+        await repo.update_filters(128, "Казань", 1, 20, 30)
+        assert (await repo.get_or_create_user(128)).filter_city_name == "Казань"
+
+        assert repo.stats()["hits"] == 1
+        assert repo.stats()["misses"] == 4
+
+
+@pytest.mark.asyncio
+async def test_batch_reads():
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+
+        await repo.upsert_profile(ProfileDTO(7101, "A", "A", "a"))
+        await repo.upsert_profile(ProfileDTO(7102, "B", "B", "b"))
+        await repo.set_photos(7101, [
+            PhotoDTO(1, 7101, "https://vk.test/1.jpg", 5),
+            PhotoDTO(2, 7101, "https://vk.test/2.jpg", 3),
+        ])
+
+        profiles = await repo.get_profiles_many([7101, 7102, 7199])
+        assert set(profiles) == {7101, 7102}
+
+        photos = await repo.get_photos_many([7101, 7102])
+        assert [p.photo_id for p in photos[7101]] == [1, 2]
+        assert photos[7102] == []
+
+        cards = await repo.get_cards([7101, 7199])
+        assert cards[7101].profile.first_name == "A"
+        assert len(cards[7101].photos) == 2
+        assert cards[7199].profile is None
+
+
+@pytest.mark.asyncio
+async def test_upsert_profiles_bulk():
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+
+        await repo.upsert_profile(ProfileDTO(7201, "Old", "Old", "old"))
+        assert (await repo.get_profile(7201)).first_name == "Old"
+
+        await repo.upsert_profiles([
+            ProfileDTO(7201, "New", "New", "new"),
+            ProfileDTO(7202, "B", "B", "b"),
+            ProfileDTO(7202, "B2", "B2", "b2"),
+        ])
+
+        profiles = await repo.get_profiles_many([7201, 7202])
+        assert profiles[7201].first_name == "New"
+        assert profiles[7202].first_name == "B2"
+
+        await repo.set_photos(7202, [PhotoDTO(n, 7202, f"https://vk.test/{n}", n) for n in range(5)])
+        await repo.set_photos(7202, [PhotoDTO(9, 7202, "https://vk.test/9", 0)])
+        assert [p.photo_id for p in await repo.get_photos(7202)] == [9]
+
+
+@pytest.mark.asyncio
+async def test_idempotent_favorites_and_blacklist():
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        await repo.set_queue(129, [1, 2, 3, 4])
+
+        await repo.add_favorite(129, 800)
+        await repo.add_favorite(129, 800)
+        await repo.add_favorites_many(129, [800, 801, 801])
+        assert sorted(await repo.list_favorites(129)) == [800, 801]
+
+        await repo.add_blacklist(129, 2)
+        await repo.add_blacklist(129, 2)
+        await repo.add_blacklist_many(129, [3, 4, 4])
+        assert await repo.get_queue(129) == [1]
+
+        await repo.remove_favorite(129, 800)
+        await repo.remove_favorite(129, 801)
+
+
+@pytest.mark.asyncio
+async def test_set_queue_excludes_known_profiles():
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+
+        await repo.set_queue(130, [1, 2, 3])
+        assert await repo.move_next(130) == 2  # 1 просмотрена
+
+        await repo.add_blacklist(130, 4)
+        await repo.add_favorite(130, 5)
+
+        size = await repo.set_queue(130, [1, 4, 5, 6, 7], exclude_known=True)
+
+        assert size == 2
+        assert await repo.get_queue(130) == [6, 7]
+        assert await repo.get_current_vk_id(130) == 6
+        await repo.remove_favorite(130, 5)
+
+
+@pytest.mark.asyncio
+async def test_instrumented_repository_counts_statements():
+    metrics = RepositoryMetrics()
+    metrics.attach(engine)
+    try:
+        async with SessionLocal() as session:
+            repo = InstrumentedUserRepository(PostgresUserRepository(session), metrics)
+
+            await repo.set_queue(131, [1, 2, 3])
+            await repo.get_current_vk_id(131)
+            await repo.get_queue(131)
+    finally:
+        metrics.detach(engine)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["get_current_vk_id"]["calls"] == 1
+    assert snapshot["get_current_vk_id"]["statements"] == 1
+    assert snapshot["get_queue"]["rows"] == 3
+    assert snapshot["set_queue"]["statements"] >= 2
+
+
+@pytest.mark.asyncio
+async def test_packed_queue_navigation():
+    async with SessionLocal() as session:
+        repo = PackedQueueUserRepository(session)
+
+        assert await repo.set_queue(132, [10, 20, 30, 40, 50]) == 5
+        assert await repo.get_queue(132) == [10, 20, 30, 40, 50]
+        assert await repo.get_current_vk_id(132) == 10
+        assert await repo.move_prev(132) is None
+
+        assert await repo.move_next(132) == 20
+        assert await repo.move_next(132) == 30
+        assert await repo.get_cursor(132) == 2
+
+        # удаление до курсора сдвигает его, текущая карточка не меняется
+        await repo.add_blacklist_many(132, [10, 40])
+        assert await repo.get_queue(132) == [20, 30, 50]
+        assert await repo.get_current_vk_id(132) == 30
+        assert await repo.move_next(132) == 50
+        assert await repo.move_next(132) is None
+        assert await repo.move_prev(132) == 30
+
+        size = await repo.set_queue(132, [10, 20, 30, 60, 70], exclude_known=True)
+        # 10 в чёрном списке, 20/30/50 просмотрены
+        assert size == 2
+        assert await repo.get_queue(132) == [60, 70]
+        assert await repo.get_current_vk_id(132) == 60
+
+
+@pytest.mark.asyncio
+async def test_packed_queue_concurrent_taps():
+    async with SessionLocal() as session:
+        await PackedQueueUserRepository(session).set_queue(133, list(range(1, 11)))
+
+    async def tap():
+        async with SessionLocal() as session:
+            return await PackedQueueUserRepository(session).move_next(133)
+
+    results = await asyncio.gather(*(tap() for _ in range(5)))
+
+    assert sorted(results) == [2, 3, 4, 5, 6]
+    async with SessionLocal() as session:
+        assert await PackedQueueUserRepository(session).get_cursor(133) == 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "repo_cls", [PostgresUserRepository, PackedQueueUserRepository], ids=["rows", "packed"]
+)
+async def test_get_window(repo_cls):
+    async with SessionLocal() as session:
+        repo = repo_cls(session)
+        await repo.upsert_profiles([ProfileDTO(7301, "a", "b", "c"), ProfileDTO(7302, "d", "e", "f")])
+        await repo.set_photos(7301, [PhotoDTO(1, 7301, "u1", 5), PhotoDTO(2, 7301, "u2", 1)])
+
+        await repo.set_queue(134, [7300, 7301, 7302, 7303, 7304])
+        await repo.move_next(134)
+
+        window = await repo.get_window(134, ahead=2, behind=1)
+        assert window.cursor == 1
+        assert [c.vk_user_id for c in window.cards] == [7300, 7301, 7302, 7303]
+        assert window.current_index == 1
+
+        current = window.cards[window.current_index]
+        assert current.profile.first_name == "a"
+        assert [p.url for p in current.photos] == ["u1", "u2"]
+        assert window.cards[3].profile is None
+
+        # конец очереди: окно обрезается, текущей карточки нет
+        await repo.set_cursor(134, 5)
+        window = await repo.get_window(134, ahead=2, behind=2)
+        assert [c.vk_user_id for c in window.cards] == [7303, 7304]
+        assert window.current_index is None
+
+        empty = await repo.get_window(999_999_134)
+        assert empty.cards == [] and empty.current_index is None
+
+
+@pytest.mark.asyncio
+async def test_cached_get_window_warms_profiles():
+    async with SessionLocal() as session:
+        repo = CachedUserRepository(PostgresUserRepository(session))
+        await repo.upsert_profile(ProfileDTO(7401, "a", "b", "c"))
+        await repo.set_queue(135, [7401])
+
+        window = await repo.get_window(135)
+        assert window.cards[0].profile.vk_user_id == 7401
+
+        before = repo.stats()["hits"]
+        assert (await repo.get_profile(7401)).first_name == "a"
+        assert repo.stats()["hits"] == before + 1
+
+
+@pytest.mark.asyncio
+async def test_photo_file_status_updates():
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        await repo.upsert_profile(ProfileDTO(7501, "a", "b", "c"))
+        await repo.set_photos(7501, [
+            PhotoDTO(1, 7501, "https://vk.test/7501_1.jpg", 0),
+            PhotoDTO(2, 7501, "https://vk.test/7501_2.jpg", 0),
+        ])
+        assert {p.status for p in await repo.get_photos(7501)} == {PhotoStatus.PENDING}
+
+        # очередь скачивания общая: убираем из неё строки других тестов
+        await session.execute(text(
+            "UPDATE photos SET status = 'failed' "
+            "WHERE status = 'pending' AND vk_user_id <> 7501"
+        ))
+        first = await repo.claim_pending_photos(1, "w1")
+        second = await repo.claim_pending_photos(10, "w2")
+        # строка уже за w1 - второй воркер получает другую
+        assert len(first) == 1 and len(second) == 1
+        assert first[0].id != second[0].id
+        assert await repo.claim_pending_photos(10, "w3") == []
+
+        first[0].local_path = "objects/aa/7501"
+        second[0].error = "HTTPError 404"
+        await repo.complete_photos(first)
+        await repo.fail_photos(second, max_attempts=1)
+        photos = sorted(await repo.get_photos(7501), key=lambda p: p.photo_id)
+        assert [(p.status, p.local_path) for p in photos] == [
+            (PhotoStatus.DONE, "objects/aa/7501"),
+            (PhotoStatus.FAILED, None),
+        ]
+
+        assert await repo.reset_photo_files(["objects/aa/7501"]) == [7501]
+        assert {p.status for p in await repo.get_photos(7501)} == {
+            PhotoStatus.PENDING, PhotoStatus.FAILED,
+        }
+
+
+@pytest.mark.asyncio
+async def test_photo_claim_lease_expires():
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        await repo.upsert_profile(ProfileDTO(7502, "a", "b", "c"))
+        await repo.set_photos(7502, [PhotoDTO(1, 7502, "https://vk.test/7502_1.jpg", 0)])
+        await session.execute(text(
+            "UPDATE photos SET status = 'failed' "
+            "WHERE status IN ('pending', 'claimed') AND vk_user_id <> 7502"
+        ))
+
+        # воркер взял строку и пропал: lease истекает, строку берёт другой
+        [lost] = await repo.claim_pending_photos(10, "w1", lease_seconds=0)
+        assert await repo.claim_pending_photos(10, "w2") == []
+        [job] = await repo.claim_pending_photos(10, "w2")
+        assert job.id == lost.id and job.attempts == 2
+
+        # поздний результат первого воркера не перетирает строку
+        lost.error = "timeout"
+        await repo.fail_photos([lost], max_attempts=1)
+        job.local_path = "objects/bb/7502"
+        await repo.complete_photos([job])
+        [photo] = await repo.get_photos(7502)
+        assert (photo.status, photo.local_path) == (PhotoStatus.DONE, "objects/bb/7502")
+
+        # воркер падает на строке раз за разом: после max_attempts она failed
+        await repo.set_photos(7502, [PhotoDTO(2, 7502, "https://vk.test/7502_2.jpg", 0)])
+        [crashed] = await repo.claim_pending_photos(10, "w1", lease_seconds=0, max_attempts=1)
+        assert await repo.claim_pending_photos(10, "w2", max_attempts=1) == []
+        assert await repo.claim_pending_photos(10, "w2", max_attempts=1) == []
+        [photo] = await repo.get_photos(7502)
+        assert (photo.status, crashed.attempts) == (PhotoStatus.FAILED, 1)
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_user_concurrent_inserts():
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM users WHERE tg_user_id = 136"))
+
+    async def tap():
+        async with SessionLocal() as session:
+            return await PostgresUserRepository(session).get_or_create_user(136)
+
+    users = await asyncio.gather(*(tap() for _ in range(5)))
+
+    assert {(u.tg_user_id, u.history_cursor) for u in users} == {(136, 0)}
+
+
+@pytest.mark.asyncio
+async def test_coalescing_repository_shares_reads():
+    async with SessionLocal() as session:
+        await PostgresUserRepository(session).set_queue(137, [1, 2, 3])
+
+    flight = SingleFlight()
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    async def handler(read):
+        # как в боте: у каждого обработчика своя сессия, flight общий
+        async with SessionLocal() as session:
+            return await read(CoalescingUserRepository(PostgresUserRepository(session), flight))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        results = await asyncio.gather(
+            *(handler(lambda repo: repo.get_or_create_user(137)) for _ in range(3)),
+            *(handler(lambda repo: repo.get_cursor(137)) for _ in range(3)),
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+    assert [u.tg_user_id for u in results[:3]] == [137] * 3
+    assert results[3:] == [0, 0, 0]
+    assert statements == 2
+    assert flight.stats()["deduplicated"] == 4
+
+    # запись отцепляет чтение: после move_next курсор читается заново
+    async with SessionLocal() as session:
+        repo = CoalescingUserRepository(PostgresUserRepository(session), flight)
+        await repo.move_next(137)
+        assert await repo.get_cursor(137) == 1
+
+
+@pytest.mark.asyncio
+async def test_favorites_pages_and_stream():
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        await repo.get_or_create_user(138)
+        await repo.add_favorites_many(138, [50, 10, 40, 20, 30])
+
+        vk_ids, after_id = [], None
+        while True:
+            page = await repo.list_favorites_page(138, after_id, limit=2)
+            vk_ids.extend(page.vk_ids)
+            after_id = page.next_after_id
+            if after_id is None:
+                break
+
+        # порядок добавления, ровно 5 элементов за 3 страницы
+        assert vk_ids == [50, 10, 40, 20, 30]
+        assert page.vk_ids == [30]
+        assert await repo.list_favorites(138) == vk_ids
+        assert [v async for v in repo.stream_favorites(138, batch_size=2)] == vk_ids
+
+        # страница ровно до конца списка - следующей нет
+        full = await repo.list_favorites_page(138, limit=5)
+        assert full.next_after_id is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "repo_cls", [PostgresUserRepository, PackedQueueUserRepository], ids=["rows", "packed"]
+)
+async def test_stream_queue(repo_cls):
+    async with SessionLocal() as session:
+        repo = repo_cls(session)
+        await repo.set_queue(139, list(range(1000, 1025)))
+
+        assert [v async for v in repo.stream_queue(139, batch_size=10)] == list(range(1000, 1025))
+
+        # поток можно бросить на середине, сессия остаётся рабочей
+        async for vk_id in repo.stream_queue(139, batch_size=10):
+            if vk_id == 1003:
+                break
+        assert await repo.get_cursor(139) == 0
+
+
+@pytest.mark.asyncio
+async def test_instrumented_stream_counts_one_call():
+    metrics = RepositoryMetrics()
+    metrics.attach(engine)
+    try:
+        async with SessionLocal() as session:
+            inner = PostgresUserRepository(session)
+            await inner.set_queue(140, [1, 2, 3])
+            repo = InstrumentedUserRepository(inner, metrics)
+            assert [v async for v in repo.stream_queue(140, batch_size=1)] == [1, 2, 3]
+    finally:
+        metrics.detach(engine)
+
+    stats = metrics.snapshot()["stream_queue"]
+    assert stats["calls"] == 1 and stats["errors"] == 0
+    assert stats["statements"] == 1
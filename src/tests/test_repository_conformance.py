@@ -0,0 +1,247 @@
+"""
+Общие тесты UserRepository: фикстура repo (conftest.py) прогоняет каждый
+тест на in-memory бэкенде и на Postgres в обоих режимах очереди.
+"""
+import asyncio
+
+import pytest
+
+from src.infrastructure.db.models import PhotoStatus
+from src.infrastructure.db.repositories.memory_repo import (
+    InMemoryStore, InMemoryUserRepository,
+)
+from src.infrastructure.db.schemas.dto import ProfileDTO, PhotoDTO
+
+# id вне диапазонов других тестов: в Postgres могут остаться их строки
+TG = 910_021_000
+VK = 910_021_000
+
+
+@pytest.mark.asyncio
+async def test_users_and_filters(repo):
+    user = await repo.get_or_create_user(TG + 1)
+    assert (user.tg_user_id, user.history_cursor, user.vk_user_id) == (TG + 1, 0, None)
+    assert await repo.get_cursor(TG + 2) == 0
+
+    await repo.upsert_user_token_and_vk_id(TG + 1, "token", 42)
+    await repo.set_queue(TG + 1, [VK + 1, VK + 2, VK + 3])
+    await repo.set_cursor(TG + 1, 2)
+    assert (await repo.get_or_create_user(TG + 1)).history_cursor == 2
+
+    # новые фильтры - новый поиск: очередь и курсор сбрасываются
+    await repo.update_filters(TG + 1, "Москва", 1, 20, 30, city_id=1)
+    user = await repo.get_or_create_user(TG + 1)
+    assert (user.vk_access_token, user.vk_user_id, user.filter_city_name) == ("token", 42, "Москва")
+    assert (user.filter_gender, user.filter_age_from, user.filter_age_to) == (1, 20, 30)
+    assert user.history_cursor == 0
+    assert await repo.get_queue(TG + 1) == []
+
+
+@pytest.mark.asyncio
+async def test_queue_navigation_and_blacklist(repo):
+    queue = [VK + 10, VK + 20, VK + 30, VK + 40]
+    assert await repo.set_queue(TG + 3, queue) == 4
+    assert [v async for v in repo.stream_queue(TG + 3, batch_size=3)] == queue
+    assert await repo.move_prev(TG + 3) is None
+
+    assert await repo.move_next(TG + 3) == VK + 20
+    assert await repo.move_next(TG + 3) == VK + 30
+    assert await repo.get_current_vk_id(TG + 3) == VK + 30
+
+    # текущая карточка ушла в чёрный список - текущей становится следующая,
+    # удаление позади курсора сдвигает его назад
+    await repo.add_blacklist(TG + 3, VK + 30)
+    assert await repo.get_current_vk_id(TG + 3) == VK + 40
+    await repo.add_blacklist_many(TG + 3, [VK + 10, VK + 10])
+    assert await repo.get_queue(TG + 3) == [VK + 20, VK + 40]
+    assert await repo.get_current_vk_id(TG + 3) == VK + 40
+
+    assert await repo.move_next(TG + 3) is None
+    assert await repo.move_prev(TG + 3) == VK + 20
+
+    # просмотренные, избранное и чёрный список не попадают в новую очередь
+    await repo.add_favorite(TG + 3, VK + 50)
+    size = await repo.set_queue(
+        TG + 3, [VK + 10, VK + 20, VK + 30, VK + 40, VK + 50, VK + 60], exclude_known=True
+    )
+    assert size == 1
+    assert await repo.get_queue(TG + 3) == [VK + 60]
+
+
+@pytest.mark.asyncio
+async def test_favorites(repo):
+    await repo.get_or_create_user(TG + 4)
+    await repo.add_favorites_many(TG + 4, [VK + 5, VK + 1, VK + 4, VK + 1])
+    await repo.add_favorite(TG + 4, VK + 2)
+    await repo.add_favorite(TG + 4, VK + 3)
+    await repo.remove_favorite(TG + 4, VK + 4)
+    await repo.remove_favorite(TG + 4, VK + 99)
+    # повторное добавление после удаления - в конец
+    await repo.add_favorite(TG + 4, VK + 4)
+
+    expected = [VK + 5, VK + 1, VK + 2, VK + 3, VK + 4]
+    assert await repo.list_favorites(TG + 4) == expected
+    assert [v async for v in repo.stream_favorites(TG + 4, batch_size=2)] == expected
+
+    vk_ids, after_id = [], None
+    while True:
+        page = await repo.list_favorites_page(TG + 4, after_id, limit=2)
+        vk_ids.extend(page.vk_ids)
+        after_id = page.next_after_id
+        if after_id is None:
+            break
+    assert vk_ids == expected
+    assert (await repo.list_favorites_page(TG + 4, limit=5)).next_after_id is None
+    # при limit=0 пустые страницы шли бы без конца: rows[limit - 1] - это rows[-1]
+    with pytest.raises(ValueError):
+        await repo.list_favorites_page(TG + 4, limit=0)
+    assert await repo.list_favorites(TG + 5) == []
+
+
+@pytest.mark.asyncio
+async def test_blacklist_and_exclusions(repo):
+    assert await repo.list_blacklist(TG + 6) == []
+    assert await repo.is_excluded_many(TG + 6, [VK + 1]) == set()
+
+    await repo.add_blacklist_many(TG + 6, [VK + 3, VK + 1])
+    await repo.add_blacklist(TG + 6, VK + 2)
+    await repo.add_favorites_many(TG + 6, [VK + 2, VK + 7])
+    # снятие из избранного не снимает чёрный список
+    await repo.remove_favorite(TG + 6, VK + 2)
+
+    assert await repo.list_blacklist(TG + 6) == [VK + 1, VK + 2, VK + 3]
+    candidates = [VK + 1, VK + 2, VK + 5, VK + 7, VK + 7, VK + 8]
+    assert await repo.is_excluded_many(TG + 6, candidates) == {VK + 1, VK + 2, VK + 7}
+    assert await repo.is_excluded_many(TG + 6, []) == set()
+    assert await repo.is_excluded_many(TG + 7, candidates) == set()
+
+
+@pytest.mark.asyncio
+async def test_profiles_photos_and_window(repo):
+    await repo.upsert_profiles([
+        ProfileDTO(VK + 1, "a", "b", "c"),
+        ProfileDTO(VK + 2, "d", "e", "f"),
+        ProfileDTO(VK + 1, "x", "b", "c"),
+    ])
+    await repo.set_photos(VK + 1, [PhotoDTO(1, VK + 1, "https://vk.test/1", 5)])
+    await repo.set_photos(VK + 1, [
+        PhotoDTO(2, VK + 1, "https://vk.test/2", 3),
+        PhotoDTO(3, VK + 1, "https://vk.test/3", 1, status=PhotoStatus.DONE),
+    ])
+
+    assert (await repo.get_profile(VK + 1)).first_name == "x"
+    assert await repo.get_profile(VK + 9) is None
+    assert [(p.photo_id, p.status) for p in await repo.get_photos(VK + 1)] == [
+        (2, PhotoStatus.PENDING), (3, PhotoStatus.DONE),
+    ]
+    assert set(await repo.get_profiles_many([VK + 1, VK + 2, VK + 9])) == {VK + 1, VK + 2}
+    assert {k: len(v) for k, v in (await repo.get_photos_many([VK + 1, VK + 2])).items()} == {
+        VK + 1: 2, VK + 2: 0,
+    }
+    cards = await repo.get_cards([VK + 2, VK + 9])
+    assert cards[VK + 2].profile.last_name == "e" and cards[VK + 9].profile is None
+
+    await repo.set_queue(TG + 6, [VK + 1, VK + 2, VK + 9])
+    await repo.move_next(TG + 6)
+    window = await repo.get_window(TG + 6, ahead=5, behind=1)
+    assert window.cursor == 1 and window.current_index == 1
+    assert [c.vk_user_id for c in window.cards] == [VK + 1, VK + 2, VK + 9]
+    assert len(window.cards[0].photos) == 2 and window.cards[2].profile is None
+
+    empty = await repo.get_window(TG + 7)
+    assert empty.cards == [] and empty.current_index is None
+
+
+@pytest.mark.asyncio
+async def test_photo_jobs(repo):
+    await repo.upsert_profile(ProfileDTO(VK + 1, "a", "b", "c"))
+    await repo.set_photos(VK + 1, [
+        PhotoDTO(n, VK + 1, f"https://vk.test/{n}", 0) for n in range(1, 4)
+    ])
+
+    first = await repo.claim_pending_photos(2, "w1")
+    second = await repo.claim_pending_photos(10, "w2")
+    assert len(first) == 2 and len(second) == 1
+    assert first[0].id < first[1].id < second[0].id
+    assert await repo.claim_pending_photos(10, "w3") == []
+
+    first[0].local_path = "objects/aa/1"
+    first[1].error = "HTTPError 404"
+    await repo.complete_photos([first[0]])
+    await repo.fail_photos([first[1]], max_attempts=1)
+    # чужой воркер не может закрыть строку
+    second[0].worker_id = "w3"
+    await repo.complete_photos(second)
+
+    assert [(p.status, p.local_path) for p in await repo.get_photos(VK + 1)] == [
+        (PhotoStatus.DONE, "objects/aa/1"),
+        (PhotoStatus.FAILED, None),
+        (PhotoStatus.CLAIMED, None),
+    ]
+    assert await repo.reset_photo_files(["objects/aa/1"]) == [VK + 1]
+    [job] = await repo.claim_pending_photos(10, "w4")
+    assert (job.id, job.attempts) == (first[0].id, 2)
+
+
+@pytest.mark.asyncio
+async def test_transaction_rolls_back(repo):
+    await repo.set_queue(TG + 8, [VK + 1, VK + 2])
+    await repo.upsert_profile(ProfileDTO(VK + 1, "a", "b", "c"))
+
+    with pytest.raises(RuntimeError):
+        async with repo.transaction():
+            await repo.move_next(TG + 8)
+            await repo.add_favorite(TG + 8, VK + 1)
+            await repo.upsert_profile(ProfileDTO(VK + 1, "x", "y", "z"))
+            await repo.set_photos(VK + 1, [PhotoDTO(1, VK + 1, "https://vk.test/1", 0)])
+            raise RuntimeError("boom")
+
+    assert await repo.get_cursor(TG + 8) == 0
+    assert await repo.list_favorites(TG + 8) == []
+    assert (await repo.get_profile(VK + 1)).first_name == "a"
+    assert await repo.get_photos(VK + 1) == []
+
+    async with repo.transaction():
+        await repo.move_next(TG + 8)
+        async with repo.transaction():
+            await repo.add_favorite(TG + 8, VK + 1)
+    assert await repo.get_cursor(TG + 8) == 1
+    assert await repo.list_favorites(TG + 8) == [VK + 1]
+
+
+@pytest.mark.asyncio
+async def test_memory_concurrent_taps_and_isolation():
+    store = InMemoryStore()
+    await InMemoryUserRepository(store).set_queue(TG + 9, [1, 2, 3, 4, 5])
+
+    results = await asyncio.gather(
+        *(InMemoryUserRepository(store).move_next(TG + 9) for _ in range(3))
+    )
+    assert sorted(results) == [2, 3, 4]
+
+    # чужой репозиторий ждёт конца транзакции и не видит её промежуточных записей
+    writer, reader = InMemoryUserRepository(store), InMemoryUserRepository(store)
+    async with writer.transaction():
+        await writer.set_cursor(TG + 9, 0)
+        read = asyncio.create_task(reader.get_cursor(TG + 9))
+        await asyncio.sleep(0)
+        assert not read.done()
+        await writer.set_cursor(TG + 9, 1)
+    assert await read == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_snapshot_roundtrip(tmp_path):
+    path = str(tmp_path / "state.pickle")
+    repo = InMemoryUserRepository(InMemoryStore.open(path))
+    await repo.set_queue(TG + 10, [1, 2, 3])
+    await repo.move_next(TG + 10)
+    await repo.add_favorite(TG + 10, 7)
+    await repo.set_photos(VK + 1, [PhotoDTO(1, VK + 1, "https://vk.test/1", 0)])
+    await repo.store.snapshot()
+
+    restored = InMemoryUserRepository(InMemoryStore.open(path))
+    assert await restored.get_queue(TG + 10) == [1, 2, 3]
+    assert await restored.get_current_vk_id(TG + 10) == 2
+    assert await restored.list_favorites(TG + 10) == [7]
+    assert len(await restored.claim_pending_photos(10, "w1")) == 1
@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from src.infrastructure.db.repositories.packed_queue_repo import PackedQueueUserRepository
+from src.infrastructure.db.repositories.postgres_repo import PostgresUserRepository
+from src.infrastructure.db.schemas.dto import PhotoDTO, ProfileDTO
+from src.infrastructure.db.session import SessionLocal, engine
+from src.scripts.retention import _PURGE_PHOTOS, _PURGE_QUEUE, RetentionConfig, run_retention
+
+STALE, ACTIVE = 141, 142
+
+
+async def seed() -> None:
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        for tg in (STALE, ACTIVE):
+            await repo.upsert_user_token_and_vk_id(tg, f"token{tg}", tg)
+            await repo.set_queue(tg, list(range(7600, 7625)))
+        await repo.upsert_profiles([ProfileDTO(vk, "a", "b", "c") for vk in (7600, 7699)])
+        await repo.set_photos(7600, [PhotoDTO(1, 7600, "https://vk.test/7600.jpg", 0)])
+        await repo.set_photos(7699, [PhotoDTO(1, 7699, "https://vk.test/7699.jpg", 0)])
+
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO seen_profiles (tg_user_id, vk_profile_id) "
+            "SELECT tg, v FROM unnest(CAST(:tgs AS integer[])) tg, generate_series(7600, 7611) v "
+            "ON CONFLICT DO NOTHING"
+        ), {"tgs": [STALE, ACTIVE]})
+        await conn.execute(text(
+            "UPDATE users SET last_active_at = now() - interval '400 days' "
+            "WHERE tg_user_id = :tg"
+        ), {"tg": STALE})
+
+
+async def count(sql: str, **params) -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(text(sql), params)).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_retention_purges_stale_data_in_batches():
+    await seed()
+
+    report = await run_retention(RetentionConfig(batch_size=10, pause=0))
+
+    by_name = {p.name: p for p in report.policies}
+    # 25 строк очереди пачками по 10
+    assert by_name["queue"].rows == 25 and by_name["queue"].batches >= 3
+    assert by_name["tokens"].rows >= 1
+    assert by_name["seen"].rows == 12 and by_name["seen"].batches >= 2
+    assert all(p.completed for p in report.policies)
+
+    assert await count("SELECT count(*) FROM queue WHERE tg_user_id = :tg", tg=STALE) == 0
+    assert await count("SELECT count(*) FROM queue WHERE tg_user_id = :tg", tg=ACTIVE) == 25
+    assert await count(
+        "SELECT count(*) FROM users WHERE tg_user_id = :tg AND vk_access_token IS NULL", tg=STALE
+    ) == 1
+    assert await count(
+        "SELECT count(*) FROM users WHERE tg_user_id = :tg AND vk_access_token IS NULL", tg=ACTIVE
+    ) == 0
+    assert await count("SELECT count(*) FROM seen_profiles WHERE tg_user_id = :tg", tg=STALE) == 0
+    assert await count("SELECT count(*) FROM seen_profiles WHERE tg_user_id = :tg", tg=ACTIVE) == 12
+    # 7600 в очереди активного пользователя, 7699 - ни у кого
+    assert await count("SELECT count(*) FROM photos WHERE vk_user_id = 7600") == 1
+    assert await count("SELECT count(*) FROM photos WHERE vk_user_id = 7699") == 0
+
+
+@pytest.mark.asyncio
+async def test_retention_skips_locked_rows_and_touch_on_swipe():
+    await seed()
+    async with engine.connect() as conn:
+        before = (await conn.execute(text(
+            "SELECT last_active_at FROM users WHERE tg_user_id = :tg"
+        ), {"tg": ACTIVE})).scalar_one()
+
+    async with SessionLocal() as session:
+        await PostgresUserRepository(session).move_next(ACTIVE)
+    async with engine.connect() as conn:
+        after = (await conn.execute(text(
+            "SELECT last_active_at FROM users WHERE tg_user_id = :tg"
+        ), {"tg": ACTIVE})).scalar_one()
+    assert after > before
+
+    # бот держит блокировку строк очереди - чистка не ждёт её дольше lock_timeout
+    async with engine.connect() as holder:
+        await holder.begin()
+        await holder.execute(text(
+            "SELECT 1 FROM queue WHERE tg_user_id = :tg FOR UPDATE"
+        ), {"tg": STALE})
+
+        config = RetentionConfig(
+            policies=("queue",), batch_size=10, pause=0.01,
+            lock_timeout_ms=50, lock_retries=1,
+        )
+        report = await asyncio.wait_for(run_retention(config), timeout=10)
+        await holder.rollback()
+
+    [policy] = report.policies
+    assert not policy.completed and policy.lock_timeouts == 2
+    assert await count("SELECT count(*) FROM queue WHERE tg_user_id = :tg", tg=STALE) == 25
+
+
+@pytest.mark.asyncio
+async def test_photo_purge_rechecks_live_references():
+    await seed()
+    async with SessionLocal() as session:
+        repo = PostgresUserRepository(session)
+        await repo.upsert_profiles([ProfileDTO(vk, "a", "b", "c") for vk in (7697, 7698)])
+        for vk in (7697, 7698, 7699):
+            await repo.set_photos(vk, [PhotoDTO(1, vk, f"https://vk.test/{vk}.jpg", 0)])
+        await repo.add_favorite(ACTIVE, 7698)
+        await PackedQueueUserRepository(session).set_queue(143, [7697])
+
+    # снимок живых профилей сделан до того, как они попали в очереди и избранное
+    async with engine.connect() as conn:
+        async with conn.begin():
+            await conn.execute(text(
+                "CREATE TEMP TABLE retention_live (vk_id integer PRIMARY KEY) ON COMMIT DROP"
+            ))
+            await conn.execute(_PURGE_PHOTOS, {"after": 0, "limit": 1_000_000})
+
+    for vk, left in ((7600, 1), (7697, 1), (7698, 1), (7699, 0)):
+        assert await count("SELECT count(*) FROM photos WHERE vk_user_id = :vk", vk=vk) == left
+
+
+@pytest.mark.asyncio
+async def test_queue_purge_cuts_tail_and_skips_users_being_swiped():
+    await seed()
+    params = {"ids": [STALE], "cutoff": datetime.now(timezone.utc) - timedelta(days=30)}
+
+    async with engine.begin() as conn:
+        assert (await conn.execute(_PURGE_QUEUE, {**params, "limit": 10})).rowcount == 10
+    # оставшаяся очередь - начало исходной, без дыр
+    async with engine.connect() as conn:
+        positions = list((await conn.execute(text(
+            "SELECT position FROM queue WHERE tg_user_id = :tg ORDER BY position"
+        ), {"tg": STALE})).scalars())
+    assert positions == list(range(15))
+
+    # незакоммиченный свайп держит строку users - пользователь пропускается
+    async with engine.connect() as swipe:
+        await swipe.begin()
+        await swipe.execute(text(
+            "UPDATE users SET last_active_at = last_active_at WHERE tg_user_id = :tg"
+        ), {"tg": STALE})
+        async with engine.begin() as conn:
+            assert (await conn.execute(_PURGE_QUEUE, {**params, "limit": 10})).rowcount == 0
+        await swipe.rollback()
+    assert await count("SELECT count(*) FROM queue WHERE tg_user_id = :tg", tg=STALE) == 15
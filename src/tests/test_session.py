@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.infrastructure.db import session, warmup
+from src.infrastructure.db.session import DATABASE_URL, PoolSettings, engine, pool_status
+from src.infrastructure.db.warmup import warm_up
+
+
+def test_pool_settings_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "1800")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "true")
+    monkeypatch.setenv("DB_STATEMENT_CACHE_SIZE", "500")
+    monkeypatch.setenv("DB_WARMUP_CONNECTIONS", "4")
+
+    settings = PoolSettings.from_env()
+
+    assert settings.pool_size == 20
+    assert settings.max_overflow == 0
+    assert settings.pool_recycle == 1800
+    assert settings.pool_pre_ping is True
+    assert settings.statement_cache_size == 500
+    assert settings.warmup_connections == 4
+    assert settings.pool_timeout == PoolSettings().pool_timeout
+
+
+@pytest.mark.asyncio
+async def test_warm_up_fills_pool():
+    checkouts = pool_status(engine)["checkouts"]
+
+    warmed = await warm_up(engine, connections=3)
+
+    status = pool_status(engine)
+    assert warmed == 3
+    assert status["idle"] >= 3
+    assert status["checked_out"] == 0
+    assert status["checkouts"] >= checkouts + 3
+
+
+@pytest.mark.asyncio
+async def test_warm_up_defaults_to_settings(monkeypatch):
+    monkeypatch.setattr(warmup, "settings", PoolSettings(warmup_connections=2))
+
+    assert await warm_up(engine) == 2
+
+
+@pytest.mark.asyncio
+async def test_pool_status_of_plain_pool():
+    plain = create_async_engine(DATABASE_URL, pool_size=2, max_overflow=-1)
+    try:
+        async with plain.connect():
+            status = pool_status(plain)
+    finally:
+        await plain.dispose()
+
+    assert status["size"] == 2 and status["checked_out"] == 1
+    assert status["max_overflow"] is None and status["saturation"] is None
+    assert status["checkouts"] is None
+
+
+def test_pool_status_of_instrumented_pool():
+    status = pool_status(engine)
+
+    assert status["max_overflow"] == session.settings.max_overflow
+    assert status["saturation"] is not None and status["checkouts"] is not None
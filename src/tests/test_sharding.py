@@ -0,0 +1,142 @@
+"""
+Шардирование на нескольких локальных базах: vkt_shard_test_<n> на том же
+сервере, что и DATABASE_URL, создаются при первом запуске.
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+from src.infrastructure.cache import TTLCache
+from src.infrastructure.db.invalidation import InvalidationListener
+from src.infrastructure.db.repositories.cached_repo import profile_key, user_key
+from src.infrastructure.db.repositories.sharded_repo import ShardedUserRepository
+from src.infrastructure.db.schemas.dto import ProfileDTO, PhotoDTO
+from src.infrastructure.db.session import PoolSettings
+from src.infrastructure.db.sharding import ShardSet, jump_hash
+from src.scripts.rebalance_shards import rebalance
+
+SHARDS = 3
+
+
+@pytest_asyncio.fixture
+async def shard_urls(make_databases):
+    return await make_databases("vkt_shard_test", SHARDS)
+
+
+def _tg_on(shard: int, shards: int, start: int = 1) -> int:
+    return next(tg for tg in range(start, 10_000) if jump_hash(tg, shards) == shard)
+
+
+async def _count(shards: ShardSet, shard: int, table: str, tg_user_id: int) -> int:
+    async with shards.engines[shard].connect() as conn:
+        return (await conn.execute(
+            text(f"SELECT count(*) FROM {table} WHERE tg_user_id = :tg"), {"tg": tg_user_id}
+        )).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_sharded_repository_routes_by_user(shard_urls):
+    shards = ShardSet(shard_urls[:2], PoolSettings(pool_size=2))
+    tg0, tg1 = _tg_on(0, 2), _tg_on(1, 2)
+    try:
+        async with shards.sessions() as sessions:
+            repo = ShardedUserRepository(sessions)
+            await repo.upsert_profiles([ProfileDTO(v, "a", "b", "c") for v in (11, 12)])
+            await repo.set_photos(12, [PhotoDTO(1, 12, "https://vk.test/12", 0)])
+            for tg in (tg0, tg1):
+                await repo.set_queue(tg, [11, 12, 13])
+                await repo.add_favorite(tg, 12)
+            assert await repo.move_next(tg1) == 12
+            assert [v async for v in repo.stream_queue(tg1)] == [11, 12, 13]
+
+            # окно с шарда 1: очередь оттуда, карточки - с шарда профилей
+            window = await repo.get_window(tg1, ahead=1, behind=1)
+            assert [c.vk_user_id for c in window.cards] == [11, 12, 13]
+            assert window.current_index == 1
+            assert window.cards[1].profile.first_name == "a"
+            assert len(window.cards[1].photos) == 1 and window.cards[2].profile is None
+
+            # откат транзакции на обоих шардах
+            with pytest.raises(RuntimeError):
+                async with repo.transaction():
+                    await repo.add_favorite(tg0, 13)
+                    await repo.add_favorite(tg1, 13)
+                    await repo.upsert_profile(ProfileDTO(13, "x", "y", "z"))
+                    raise RuntimeError("boom")
+            assert await repo.list_favorites(tg0) == [12]
+            assert await repo.list_favorites(tg1) == [12]
+            assert await repo.get_profile(13) is None
+
+        assert [await _count(shards, s, "queue", tg0) for s in (0, 1)] == [3, 0]
+        assert [await _count(shards, s, "queue", tg1) for s in (0, 1)] == [0, 3]
+        assert [status["size"] for status in shards.pool_status()] == [2, 2]
+    finally:
+        await shards.dispose()
+
+
+@pytest.mark.asyncio
+async def test_listener_hears_every_shard(shard_urls):
+    shards = ShardSet(shard_urls[:2], PoolSettings(pool_size=1), profiles_shard=1)
+    tg0, tg1 = _tg_on(0, 2), _tg_on(1, 2)
+    cache = TTLCache(ttl=3600)
+    listener = InvalidationListener(shards.asyncpg_dsns(), [cache], skip_own=False).start()
+    try:
+        await listener.wait_listening(5)
+        keys = [user_key(tg0), user_key(tg1), profile_key(21)]
+        for key in keys:
+            cache.set(key, "stale")
+
+        async with shards.sessions() as sessions:
+            repo = ShardedUserRepository(sessions)
+            # пользователи на шардах 0 и 1, профиль - на шарде 1
+            for tg in (tg0, tg1):
+                await repo.update_filters(tg, "Москва", 1, 20, 30)
+            await repo.upsert_profile(ProfileDTO(21, "a", "b", "c"))
+
+        async def evicted():
+            while any(cache.peek(key) is not None for key in keys):
+                await asyncio.sleep(0.01)
+        await asyncio.wait_for(evicted(), 5)
+    finally:
+        await listener.stop()
+        await shards.dispose()
+
+
+@pytest.mark.asyncio
+async def test_rebalance_moves_users_to_new_shard(shard_urls):
+    users = list(range(1, 61))
+    old = ShardSet(shard_urls[:2], PoolSettings(pool_size=2))
+    try:
+        async with old.sessions() as sessions:
+            repo = ShardedUserRepository(sessions)
+            for tg in users:
+                await repo.set_queue(tg, [tg * 10 + k for k in range(5)])
+                await repo.move_next(tg)
+                await repo.add_favorites_many(tg, [3, 1, 2])
+                await repo.add_blacklist(tg, tg * 10 + 4)
+    finally:
+        await old.dispose()
+
+    report = await rebalance(shard_urls, batch_size=7)
+    expected = [tg for tg in users if jump_hash(tg, 3) != jump_hash(tg, 2)]
+    assert report.moved == len(expected) > 0
+    # jump hash: при добавлении шарда переезжают только на новый
+    assert set(report.routes) <= {(0, 2), (1, 2)}
+
+    new = ShardSet(shard_urls, PoolSettings(pool_size=2))
+    try:
+        async with new.sessions() as sessions:
+            repo = ShardedUserRepository(sessions)
+            for tg in users:
+                assert await repo.get_queue(tg) == [tg * 10 + k for k in range(4)]
+                assert await repo.get_current_vk_id(tg) == tg * 10 + 1
+                assert await repo.list_favorites(tg) == [3, 1, 2]
+        for tg in expected:
+            assert [await _count(new, s, "users", tg) for s in range(3)] == [0, 0, 1]
+    finally:
+        await new.dispose()
+
+    # повторный запуск ничего не переносит
+    assert (await rebalance(shard_urls)).moved == 0
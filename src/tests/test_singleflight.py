@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from src.infrastructure.db.repositories.coalescing_repo import CoalescingUserRepository
+from src.infrastructure.db.repositories.delegating_repo import DelegatingUserRepository
+from src.infrastructure.db.repositories.memory_repo import InMemoryUserRepository
+from src.infrastructure.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_load():
+    flight = SingleFlight()
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return loads
+
+    results = await asyncio.gather(*(flight.do("k", load) for _ in range(5)))
+    assert results == [1] * 5
+    assert flight.stats()["deduplicated"] == 4
+
+    # загрузка закончилась - следующий вызов идёт заново
+    assert await flight.do("k", load) == 2
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_error_is_shared_and_forget_detaches():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def failing():
+        started.set()
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    leader = asyncio.ensure_future(flight.do("k", failing))
+    await started.wait()
+    follower = asyncio.ensure_future(flight.do("k", failing))
+    with pytest.raises(RuntimeError):
+        await leader
+    with pytest.raises(RuntimeError):
+        await follower
+
+    async def slow():
+        await asyncio.sleep(0.01)
+        return "old"
+
+    async def fresh():
+        return "new"
+
+    first = asyncio.ensure_future(flight.do("k", slow))
+    await asyncio.sleep(0)
+    flight.forget()
+    assert await flight.do("k", fresh) == "new"
+    assert await first == "old"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_fail_followers():
+    flight = SingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    leader = asyncio.ensure_future(flight.do("k", load))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do("k", load))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    # ведущего отменили - ожидающий сам загружает значение
+    assert await follower == 2
+    assert leader.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_forget_matching_keys_only():
+    flight = SingleFlight()
+
+    async def slow(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    a = asyncio.ensure_future(flight.do(("cursor", 1), lambda: slow("a")))
+    b = asyncio.ensure_future(flight.do(("cursor", 2), lambda: slow("b")))
+    await asyncio.sleep(0)
+    flight.forget(lambda key: key[1] == 1)
+
+    assert len(flight) == 1
+    assert await flight.do(("cursor", 2), lambda: slow("other")) == "b"
+    assert await flight.do(("cursor", 1), lambda: slow("fresh")) == "fresh"
+    assert (await a, await b) == ("a", "b")
+
+
+class SlowCursorRepository(DelegatingUserRepository):
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.loads = 0
+
+    async def get_cursor(self, tg_user_id):
+        self.loads += 1
+        cursor = await self.inner.get_cursor(tg_user_id)
+        await asyncio.sleep(0.01)
+        return cursor
+
+
+@pytest.mark.asyncio
+async def test_write_detaches_only_its_user():
+    inner = SlowCursorRepository(InMemoryUserRepository())
+    await inner.set_queue(1, [10, 20])
+    await inner.set_queue(2, [30, 40])
+    repo = CoalescingUserRepository(inner)
+
+    first = asyncio.ensure_future(repo.get_cursor(2))
+    await asyncio.sleep(0)
+    # свайп пользователя 1 не мешает объединить чтения пользователя 2
+    await repo.move_next(1)
+    assert await asyncio.gather(first, repo.get_cursor(2)) == [0, 0]
+    assert inner.loads == 1
+
+    first = asyncio.ensure_future(repo.get_cursor(2))
+    await asyncio.sleep(0)
+    async with repo.transaction():
+        await repo.move_next(2)
+    # чтение, начатое до записи, её не видит - новый вызов читает заново
+    assert await repo.get_cursor(2) == 1
+    assert await first == 0
+    assert inner.loads == 3
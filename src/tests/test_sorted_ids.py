@@ -0,0 +1,28 @@
+import random
+
+from src.infrastructure.sorted_ids import SCAN_RATIO, SortedIdSet
+
+
+def test_add_discard_update_keep_order():
+    ids = SortedIdSet([5, 1, 3, 3])
+    ids.add(4)
+    ids.add(1)
+    ids.discard(3)
+    ids.discard(99)
+    assert list(ids) == [1, 4, 5]
+    assert 4 in ids and 3 not in ids and 0 not in ids and 6 not in ids
+
+    ids.update([2, 4])
+    ids.update(range(100, 140))
+    assert list(ids) == [1, 2, 4, 5, *range(100, 140)]
+    assert ids.nbytes == 8 * len(ids)
+
+
+def test_intersection_matches_set_on_both_paths():
+    rnd = random.Random(7)
+    stored = rnd.sample(range(10_000), 3_000)
+    ids = SortedIdSet(stored)
+    # короткий список кандидатов - bisect, длинный - проход по массиву
+    for size in (3_000 // SCAN_RATIO - 10, 1_000):
+        candidates = set(rnd.sample(range(10_000), size))
+        assert ids.intersection(candidates) == candidates & set(stored)